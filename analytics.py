@@ -0,0 +1,944 @@
+import json
+import math
+import time
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import select, func, case, extract, event, update, insert, delete, and_, or_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session, joinedload, attributes
+
+from models import (
+    db, User, Barangay, AgriculturalProduct, Farmer, FarmerChild,
+    FarmerExperience, ResearchProject, SurveyQuestionnaire, ActivityLog,
+    DashboardSummary, DailyRollup, FarmerMetricSketch
+)
+from sketches import TDigest
+
+# ============ Dashboard Analytics ============
+# The dashboard used to issue one query per metric (14+ round trips to the
+# remote MySQL host). It now costs three statements per request, and reads
+# never write: the drift check below runs from the scheduler (or once at
+# boot when the scheduler is disabled):
+#   1. one SELECT of scalar subqueries for the non-farmer counts
+#   2. one GROUP BY over the dashboard_summary buckets (farmer/child metrics)
+#   3. the recent activity list (users joined in, no lazy loads)
+#
+# dashboard_summary holds counts, sums and sums of squares per
+# (barangay, education level, month). It is kept current from a session
+# after_flush hook and reconciled against the raw tables periodically, so
+# reads are O(groups) no matter how many farmers are registered.
+#
+# daily_rollups holds, per calendar day, the farmers/experiences/projects
+# created that day and attribute sums of those farmers. Arbitrary from/to
+# ranges (and the comparison period) are answered from at most a few hundred
+# rollup rows instead of the raw tables.
+#
+# farmer_metric_sketches keeps a mergeable quantile sketch (t-digest) of age,
+# income and farm size per barangay, per creation month and per (barangay,
+# month), so medians, p10/p90 and histograms of any month range, barangay or
+# barangay over a month range are merged from a handful of sketches instead
+# of sorting the farmers table.
+
+RANGE_DAYS = {'month': 30, 'year': 365}
+
+# Seconds between drift checks of dashboard_summary against the raw tables.
+_settings = {'reconcile_interval': 900}
+_last_reconciled = {'at': None}
+
+
+def range_start(time_range):
+    """Translate the dashboard ?range= value into a created_at lower bound."""
+    days = RANGE_DAYS.get(time_range)
+    if days is None:
+        return None
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def month_start(value):
+    """First day of the month containing value (the summary bucket key)."""
+    value = value or datetime.utcnow()
+    return date(value.year, value.month, 1)
+
+
+def _scalar(stmt):
+    return stmt.scalar_subquery()
+
+
+def _metrics_statement(start_date):
+    def since(model):
+        return [model.created_at >= start_date] if start_date else []
+
+    return select(
+        _scalar(select(func.count(Barangay.id))).label('total_barangays'),
+        _scalar(select(func.count(AgriculturalProduct.id))).label('total_products'),
+        _scalar(select(func.count(FarmerExperience.id)).where(*since(FarmerExperience))).label('total_experiences'),
+        _scalar(select(func.count(ResearchProject.id)).where(*since(ResearchProject))).label('total_projects'),
+        _scalar(select(func.count(User.id))).label('total_users'),
+        _scalar(select(func.count(SurveyQuestionnaire.id))).label('total_surveys'),
+    )
+
+
+def _summary_statement(start_month, end_month=None):
+    """Per (barangay, education level) totals; children are never range-filtered."""
+    S = DashboardSummary
+
+    def in_range(col):
+        bounds = []
+        if start_month is not None:
+            bounds.append(S.month >= start_month)
+        if end_month is not None:
+            bounds.append(S.month <= end_month)
+        if not bounds:
+            return func.sum(col)
+        return func.sum(case((and_(*bounds), col), else_=0))
+
+    return select(
+        S.barangay_id,
+        Barangay.name,
+        S.education_level,
+        in_range(S.farmer_count).label('farmer_count'),
+        in_range(S.age_sum).label('age_sum'),
+        in_range(S.age_sq_sum).label('age_sq_sum'),
+        in_range(S.income_count).label('income_count'),
+        in_range(S.income_sum).label('income_sum'),
+        in_range(S.income_sq_sum).label('income_sq_sum'),
+        in_range(S.land_count).label('land_count'),
+        in_range(S.land_sum).label('land_sum'),
+        in_range(S.land_sq_sum).label('land_sq_sum'),
+        func.sum(S.children_count).label('children_count'),
+        func.sum(S.children_farming).label('children_farming'),
+    ).outerjoin(Barangay, Barangay.id == S.barangay_id)\
+     .group_by(S.barangay_id, Barangay.name, S.education_level)
+
+
+def recent_activities(limit=10):
+    return ActivityLog.query.options(joinedload(ActivityLog.user))\
+        .order_by(ActivityLog.created_at.desc()).limit(limit).all()
+
+
+def _mean_and_std(n, total, sq_total):
+    if not n:
+        return 0.0, 0.0
+    mean = total / n
+    return mean, math.sqrt(max(0.0, sq_total / n - mean * mean))
+
+
+def compute_dashboard_stats(start_date=None, end_month=None):
+    """
+    Build the /api/dashboard/stats payload. Farmer metrics come from the
+    monthly summary buckets, so range filters have month granularity.
+    Medians, p10/p90 and histograms are served separately by
+    /api/dashboard/distributions (merged sketches) so this stays a few
+    aggregate reads.
+    """
+    start_month = month_start(start_date) if start_date else None
+
+    metrics = db.session.execute(_metrics_statement(start_date)).mappings().one()
+
+    totals = dict.fromkeys(_SUMMARY_COLUMNS, 0)
+    by_education = {}
+    by_barangay = {}
+    for row in db.session.execute(_summary_statement(start_month, end_month)).mappings():
+        for key in totals:
+            totals[key] += row[key] or 0
+        count = int(row['farmer_count'] or 0)
+        if count:
+            level = row['education_level'] or "Unknown"
+            by_education[level] = by_education.get(level, 0) + count
+            if row['name'] is not None:
+                by_barangay[row['name']] = by_barangay.get(row['name'], 0) + count
+
+    education_stats = [{'level': l, 'count': c} for l, c in by_education.items()]
+    product_stats = [{'barangay': n, 'count': c} for n, c in by_barangay.items()]
+    product_stats.sort(key=lambda x: x['count'], reverse=True)
+
+    top_edu = "N/A"
+    if education_stats:
+        top_edu = max(education_stats, key=lambda x: x['count'])['level']
+
+    top_brgy = "N/A"
+    if product_stats:
+        top_brgy = max(product_stats, key=lambda x: x['count'])['barangay']
+
+    avg_age, std_age = _mean_and_std(totals['farmer_count'], totals['age_sum'], totals['age_sq_sum'])
+    avg_income, std_income = _mean_and_std(totals['income_count'], totals['income_sum'], totals['income_sq_sum'])
+    avg_land, std_land = _mean_and_std(totals['land_count'], totals['land_sum'], totals['land_sq_sum'])
+
+    summary_analysis = {
+        "average_farmer_age": round(avg_age, 1),
+        "average_annual_income": round(avg_income, 2),
+        "average_land_size_ha": round(avg_land, 2),
+        "farmer_age_std_dev": round(std_age, 1),
+        "annual_income_std_dev": round(std_income, 2),
+        "land_size_std_dev_ha": round(std_land, 2),
+        "top_education_level": top_edu,
+        "most_populated_barangay": top_brgy,
+        "total_system_users": metrics['total_users'] or 0,
+        "total_active_surveys": metrics['total_surveys'] or 0
+    }
+
+    return {
+        'total_farmers': int(totals['farmer_count']),
+        'total_barangays': metrics['total_barangays'] or 0,
+        'total_products': metrics['total_products'] or 0,
+        'total_experiences': metrics['total_experiences'] or 0,
+        'total_projects': metrics['total_projects'] or 0,
+        'children_farming': int(totals['children_farming']),
+        'total_children': int(totals['children_count']),
+        'recent_activities': [log.to_dict() for log in recent_activities()],
+        'education_stats': education_stats,
+        'product_stats': product_stats,
+        'summary_analysis': summary_analysis
+    }
+
+
+# ============ Distributions (quantile sketches) ============
+
+SKETCH_METRICS = ('age', 'annual_income', 'farm_size_hectares')
+_SKETCH_SCOPE_ATTRS = ('barangay_id', 'created_at')
+
+
+def _month_key(value):
+    value = value or datetime.utcnow()
+    return f"{value.year:04d}-{value.month:02d}"
+
+
+def _sketch_scopes(barangay_id, created_at):
+    month = _month_key(created_at)
+    return [('barangay', str(barangay_id)), ('month', month), ('barangay_month', f"{barangay_id}:{month}")]
+
+
+def _barangay_filter(scope_key):
+    return Farmer.barangay_id.is_(None) if scope_key == 'None' else Farmer.barangay_id == int(scope_key)
+
+
+def _month_filter(scope_key):
+    year, month = (int(p) for p in scope_key.split('-'))
+    start = datetime(year, month, 1)
+    return and_(Farmer.created_at >= start, Farmer.created_at < _next_month(start))
+
+
+def _scope_filter(scope, scope_key):
+    """Farmers belonging to one sketch scope."""
+    if scope == 'barangay':
+        return _barangay_filter(scope_key)
+    if scope == 'month':
+        return _month_filter(scope_key)
+    barangay_key, month_key = scope_key.split(':')
+    return and_(_barangay_filter(barangay_key), _month_filter(month_key))
+
+
+def _next_month(value):
+    return datetime(value.year + (value.month == 12), value.month % 12 + 1, 1)
+
+
+def _digests_from_rows(rows):
+    digests = {metric: TDigest() for metric in SKETCH_METRICS}
+    for values in rows:
+        for metric, value in zip(SKETCH_METRICS, values):
+            digests[metric].add(value)
+    return digests
+
+
+def _metric_columns():
+    return [getattr(Farmer, metric) for metric in SKETCH_METRICS]
+
+
+def _scope_digests(scope, scope_key):
+    """Digests of one scope recomputed from its (small) farmer slice."""
+    return _digests_from_rows(
+        db.session.execute(select(*_metric_columns()).where(_scope_filter(scope, scope_key)))
+    )
+
+
+def rebuild_stale_sketches():
+    """Persist fresh digests for every stale sketch. Runs from the scheduler; reads never write."""
+    K = FarmerMetricSketch
+    scopes = db.session.execute(select(K.scope, K.scope_key).where(K.stale.is_(True)).distinct()).all()
+    for scope, scope_key in scopes:
+        for metric, digest in _scope_digests(scope, scope_key).items():
+            db.session.execute(
+                update(K).where(K.scope == scope, K.scope_key == scope_key, K.metric == metric)
+                .values(count=int(digest.count), digest=json.dumps(digest.to_dict()), stale=False)
+            )
+    db.session.commit()
+    return len(scopes)
+
+
+def metric_distributions(start_month=None, end_month=None, barangay_id=None, bins=10):
+    """
+    p10/median/p90, min/max and a histogram per metric. Month ranges merge
+    the per-month sketches, a barangay merges its own sketch, and a barangay
+    restricted to a month range merges its per-(barangay, month) sketches.
+    """
+    S = FarmerMetricSketch
+    if barangay_id is not None and (start_month or end_month):
+        # Keys are '<barangay id>:YYYY-MM', so one barangay's months sort together
+        query = S.query.filter(S.scope == 'barangay_month',
+                               S.scope_key >= f"{barangay_id}:{_month_key(start_month) if start_month else ''}",
+                               S.scope_key <= f"{barangay_id}:{_month_key(end_month) if end_month else '9999-12'}")
+    elif barangay_id is not None:
+        query = S.query.filter(S.scope == 'barangay', S.scope_key == str(barangay_id))
+    else:
+        query = S.query.filter(S.scope == 'month')
+        if start_month:
+            query = query.filter(S.scope_key >= _month_key(start_month))
+        if end_month:
+            query = query.filter(S.scope_key <= _month_key(end_month))
+    rows = query.all()
+
+    # Until the scheduler rebuilds a stale sketch, reads recompute its slice in memory
+    rebuilt = {scope: _scope_digests(*scope) for scope in {(r.scope, r.scope_key) for r in rows if r.stale}}
+    parts = {metric: [] for metric in SKETCH_METRICS}
+    for row in rows:
+        if row.metric not in parts:
+            continue
+        if row.stale:
+            parts[row.metric].append(rebuilt[(row.scope, row.scope_key)][row.metric])
+        elif row.digest:
+            parts[row.metric].append(TDigest.from_dict(json.loads(row.digest)))
+    return {metric: TDigest().merge_all(digests).summary(bins) for metric, digests in parts.items()}
+
+
+# ============ Date-Range Dashboard (daily rollups) ============
+
+_ROLLUP_TOTALS = ('farmers_created', 'experiences_created', 'projects_created')
+_ROLLUP_COLUMNS = _ROLLUP_TOTALS + (
+    'age_sum', 'age_sq_sum', 'income_count', 'income_sum', 'income_sq_sum',
+    'land_count', 'land_sum', 'land_sq_sum'
+)
+COMPARE_MODES = ('previous', 'year')
+
+
+def comparison_window(start_day, end_day, mode):
+    """The period a from/to range is compared against."""
+    if mode == 'year':
+        def shift(d):
+            try:
+                return d.replace(year=d.year - 1)
+            except ValueError:  # Feb 29
+                return d.replace(year=d.year - 1, day=28)
+        return shift(start_day), shift(end_day)
+    length = (end_day - start_day).days + 1
+    return start_day - timedelta(days=length), start_day - timedelta(days=1)
+
+
+def _summarize_rollups(rows, start_day, end_day):
+    totals = dict.fromkeys(_ROLLUP_COLUMNS, 0)
+    series = []
+    for row in rows:
+        if not (start_day <= row.day <= end_day):
+            continue
+        for key in _ROLLUP_COLUMNS:
+            totals[key] += getattr(row, key) or 0
+        series.append({
+            'date': row.day.isoformat(),
+            'farmers': row.farmers_created,
+            'experiences': row.experiences_created,
+            'projects': row.projects_created
+        })
+
+    avg_age, std_age = _mean_and_std(totals['farmers_created'], totals['age_sum'], totals['age_sq_sum'])
+    avg_income, std_income = _mean_and_std(totals['income_count'], totals['income_sum'], totals['income_sq_sum'])
+    avg_land, std_land = _mean_and_std(totals['land_count'], totals['land_sum'], totals['land_sq_sum'])
+    return {
+        'from': start_day.isoformat(),
+        'to': end_day.isoformat(),
+        'days': (end_day - start_day).days + 1,
+        'totals': {key: int(totals[key]) for key in _ROLLUP_TOTALS},
+        'averages': {
+            'farmer_age': round(avg_age, 1),
+            'annual_income': round(avg_income, 2),
+            'land_size_ha': round(avg_land, 2),
+            'farmer_age_std_dev': round(std_age, 1),
+            'annual_income_std_dev': round(std_income, 2),
+            'land_size_std_dev_ha': round(std_land, 2)
+        },
+        'series': series
+    }
+
+
+def _percent_change(current, previous):
+    if not previous:
+        return None
+    return round((current - previous) / previous * 100, 1)
+
+
+def compute_range_stats(start_day, end_day, compare=None):
+    """
+    Dashboard payload for an arbitrary inclusive [start_day, end_day] range.
+    Creation counts and averages are exact per day (daily_rollups); the
+    education/barangay breakdowns come from the monthly summary buckets that
+    overlap the range.
+    """
+    payload = compute_dashboard_stats(
+        start_date=datetime(start_day.year, start_day.month, start_day.day),
+        end_month=month_start(end_day)
+    )
+
+    lower = start_day
+    window = None
+    if compare:
+        window = comparison_window(start_day, end_day, compare)
+        lower = min(lower, window[0])
+    rows = DailyRollup.query.filter(DailyRollup.day >= lower, DailyRollup.day <= end_day)\
+        .order_by(DailyRollup.day).all()
+
+    period = _summarize_rollups(rows, start_day, end_day)
+    payload['total_farmers'] = period['totals']['farmers_created']
+    payload['total_experiences'] = period['totals']['experiences_created']
+    payload['total_projects'] = period['totals']['projects_created']
+    payload['summary_analysis'].update({
+        "average_farmer_age": period['averages']['farmer_age'],
+        "average_annual_income": period['averages']['annual_income'],
+        "average_land_size_ha": period['averages']['land_size_ha'],
+        "farmer_age_std_dev": period['averages']['farmer_age_std_dev'],
+        "annual_income_std_dev": period['averages']['annual_income_std_dev'],
+        "land_size_std_dev_ha": period['averages']['land_size_std_dev_ha'],
+    })
+    payload['period'] = period
+
+    if window:
+        previous = _summarize_rollups(rows, *window)
+        previous.pop('series')
+        change = {}
+        for group in ('totals', 'averages'):
+            for key, value in period[group].items():
+                before = previous[group][key]
+                change[key] = {'absolute': round(value - before, 2), 'percent': _percent_change(value, before)}
+        payload['comparison'] = {'mode': compare, **previous, 'change': change}
+
+    return payload
+
+
+# ============ Summary Maintenance ============
+
+_FARMER_BUCKET_ATTRS = ('barangay_id', 'education_level', 'created_at')
+_FARMER_METRIC_ATTRS = ('age', 'annual_income', 'farm_size_hectares')
+_SUMMARY_COLUMNS = (
+    'farmer_count', 'age_sum', 'age_sq_sum', 'income_count', 'income_sum', 'income_sq_sum',
+    'land_count', 'land_sum', 'land_sq_sum', 'children_count', 'children_farming'
+)
+
+
+def _old_value(obj, attr):
+    """Value of attr as it was before the current flush."""
+    hist = attributes.get_history(obj, attr)
+    if hist.deleted:
+        return hist.deleted[0]
+    if hist.unchanged:
+        return hist.unchanged[0]
+    return getattr(obj, attr)
+
+
+def _bucket(barangay_id, education_level, created_at):
+    return (barangay_id, education_level or '', month_start(created_at))
+
+
+def _farmer_bucket(farmer, old=False):
+    get = (lambda a: _old_value(farmer, a)) if old else (lambda a: getattr(farmer, a))
+    return _bucket(*[get(a) for a in _FARMER_BUCKET_ATTRS])
+
+
+def _farmer_metrics(farmer, sign, old=False):
+    get = (lambda a: _old_value(farmer, a)) if old else (lambda a: getattr(farmer, a))
+    age, income, land = [get(a) for a in _FARMER_METRIC_ATTRS]
+    age = float(age or 0)
+    delta = {'farmer_count': sign, 'age_sum': sign * age, 'age_sq_sum': sign * age * age}
+    if income is not None:
+        income = float(income)
+        delta.update(income_count=sign, income_sum=sign * income, income_sq_sum=sign * income * income)
+    if land is not None:
+        land = float(land)
+        delta.update(land_count=sign, land_sum=sign * land, land_sq_sum=sign * land * land)
+    return delta
+
+
+def _add(deltas, bucket, delta):
+    target = deltas.setdefault(bucket, dict.fromkeys(_SUMMARY_COLUMNS, 0))
+    for key, value in delta.items():
+        target[key] += value
+
+
+def _farmer_changed(farmer, attrs):
+    return any(attributes.get_history(farmer, a).has_changes() for a in attrs)
+
+
+def _child_stats(connection, farmer_ids):
+    if not farmer_ids:
+        return {}
+    rows = connection.execute(
+        select(
+            FarmerChild.farmer_id,
+            func.count(FarmerChild.id),
+            func.sum(case((FarmerChild.continues_farming.is_(True), 1), else_=0))
+        ).where(FarmerChild.farmer_id.in_(farmer_ids)).group_by(FarmerChild.farmer_id)
+    )
+    return {fid: (count, int(farming or 0)) for fid, count, farming in rows}
+
+
+def _collect_summary_deltas(session, connection):
+    deltas = {}
+    farmer_buckets = {}   # farmer_id -> current bucket (old bucket for deleted farmers)
+    moved = {}            # farmer_id -> (old bucket, new bucket)
+    child_deltas = {}     # farmer_id -> [count delta, farming delta] of this flush
+
+    for obj in session.new:
+        if isinstance(obj, Farmer):
+            _add(deltas, _farmer_bucket(obj), _farmer_metrics(obj, 1))
+            farmer_buckets[obj.id] = _farmer_bucket(obj)
+
+    for obj in session.deleted:
+        if isinstance(obj, Farmer):
+            _add(deltas, _farmer_bucket(obj, old=True), _farmer_metrics(obj, -1, old=True))
+            farmer_buckets[obj.id] = _farmer_bucket(obj, old=True)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Farmer) or not session.is_modified(obj):
+            continue
+        if not _farmer_changed(obj, _FARMER_BUCKET_ATTRS + _FARMER_METRIC_ATTRS):
+            farmer_buckets[obj.id] = _farmer_bucket(obj)
+            continue
+        old_bucket, new_bucket = _farmer_bucket(obj, old=True), _farmer_bucket(obj)
+        _add(deltas, old_bucket, _farmer_metrics(obj, -1, old=True))
+        _add(deltas, new_bucket, _farmer_metrics(obj, 1))
+        farmer_buckets[obj.id] = new_bucket
+        if old_bucket != new_bucket:
+            moved[obj.id] = (old_bucket, new_bucket)
+
+    def child_delta(child, count, farming):
+        entry = child_deltas.setdefault(child.farmer_id, [0, 0])
+        entry[0] += count
+        entry[1] += farming
+
+    for obj in session.new:
+        if isinstance(obj, FarmerChild):
+            child_delta(obj, 1, 1 if obj.continues_farming else 0)
+    for obj in session.deleted:
+        if isinstance(obj, FarmerChild):
+            child_delta(obj, -1, -1 if _old_value(obj, 'continues_farming') else 0)
+    for obj in session.dirty:
+        if isinstance(obj, FarmerChild) and attributes.get_history(obj, 'continues_farming').has_changes():
+            was, now = bool(_old_value(obj, 'continues_farming')), bool(obj.continues_farming)
+            child_delta(obj, 0, int(now) - int(was))
+
+    # Farmers that changed bucket take their pre-flush children with them
+    if moved:
+        post = _child_stats(connection, list(moved))
+        for fid, (old_bucket, new_bucket) in moved.items():
+            count, farming = post.get(fid, (0, 0))
+            dcount, dfarming = child_deltas.get(fid, (0, 0))
+            pre = {'children_count': count - dcount, 'children_farming': farming - dfarming}
+            _add(deltas, old_bucket, {k: -v for k, v in pre.items()})
+            _add(deltas, new_bucket, pre)
+
+    missing = [fid for fid in child_deltas if fid not in farmer_buckets and fid is not None]
+    if missing:
+        rows = connection.execute(
+            select(Farmer.id, Farmer.barangay_id, Farmer.education_level, Farmer.created_at)
+            .where(Farmer.id.in_(missing))
+        )
+        for fid, barangay_id, education_level, created_at in rows:
+            farmer_buckets[fid] = _bucket(barangay_id, education_level, created_at)
+
+    for fid, (dcount, dfarming) in child_deltas.items():
+        if fid in farmer_buckets and (dcount or dfarming):
+            _add(deltas, farmer_buckets[fid], {'children_count': dcount, 'children_farming': dfarming})
+
+    return deltas
+
+
+def _day(value):
+    value = value or datetime.utcnow()
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _rollup_farmer_metrics(farmer, sign, old=False):
+    delta = _farmer_metrics(farmer, sign, old=old)
+    delta['farmers_created'] = delta.pop('farmer_count')
+    return delta
+
+
+def _collect_rollup_deltas(session):
+    deltas = {}
+
+    def add(day, delta):
+        target = deltas.setdefault((day,), dict.fromkeys(_ROLLUP_COLUMNS, 0))
+        for key, value in delta.items():
+            target[key] += value
+
+    created = {FarmerExperience: 'experiences_created', ResearchProject: 'projects_created'}
+    for obj in session.new:
+        if isinstance(obj, Farmer):
+            add(_day(obj.created_at), _rollup_farmer_metrics(obj, 1))
+        elif type(obj) in created:
+            add(_day(obj.created_at), {created[type(obj)]: 1})
+
+    for obj in session.deleted:
+        if isinstance(obj, Farmer):
+            add(_day(_old_value(obj, 'created_at')), _rollup_farmer_metrics(obj, -1, old=True))
+        elif type(obj) in created:
+            add(_day(_old_value(obj, 'created_at')), {created[type(obj)]: -1})
+
+    for obj in session.dirty:
+        if isinstance(obj, Farmer) and session.is_modified(obj) \
+                and _farmer_changed(obj, ('created_at',) + _FARMER_METRIC_ATTRS):
+            add(_day(_old_value(obj, 'created_at')), _rollup_farmer_metrics(obj, -1, old=True))
+            add(_day(obj.created_at), _rollup_farmer_metrics(obj, 1))
+
+    return deltas
+
+
+def _upsert_increment(connection, T, key_columns, values, delta):
+    """
+    INSERT the row, or add delta to it when the key exists, in one statement.
+    Two writers creating the same bucket at once both succeed instead of one
+    hitting the unique key between an UPDATE that matched nothing and its INSERT.
+    """
+    dialect = connection.dialect.name
+    changed = [k for k, v in delta.items() if v]
+    if dialect == 'mysql':
+        stmt = mysql.insert(T).values(**values)
+        return stmt.on_duplicate_key_update({k: T.c[k] + stmt.inserted[k] for k in changed})
+    if dialect in ('postgresql', 'sqlite'):
+        stmt = (postgresql if dialect == 'postgresql' else sqlite).insert(T).values(**values)
+        return stmt.on_conflict_do_update(
+            index_elements=list(key_columns), set_={k: T.c[k] + stmt.excluded[k] for k in changed}
+        )
+    return None
+
+
+def _apply_deltas(connection, model, key_columns, deltas):
+    """Atomic col = col + delta per key; inserts the row when it does not exist yet."""
+    T = model.__table__
+    for key, delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        values = {**dict(zip(key_columns, key)), **delta}
+        upsert = _upsert_increment(connection, T, key_columns, values, delta)
+        if upsert is not None:
+            connection.execute(upsert)
+            continue
+        match = and_(*[T.c[name] == value for name, value in zip(key_columns, key)])
+        result = connection.execute(
+            update(T).where(match).values({T.c[k]: T.c[k] + v for k, v in delta.items() if v})
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(T).values(**values))
+
+
+def _apply_summary_deltas(connection, deltas):
+    _apply_deltas(connection, DashboardSummary, ('barangay_id', 'education_level', 'month'), deltas)
+
+
+def _collect_sketch_changes(session):
+    """New farmers are added to their sketches; any other change marks them stale."""
+    additions = {}
+    stale = set()
+
+    def mark_stale(barangay_id, created_at):
+        for scope in _sketch_scopes(barangay_id, created_at):
+            stale.update((*scope, metric) for metric in SKETCH_METRICS)
+
+    for obj in session.new:
+        if isinstance(obj, Farmer):
+            for scope in _sketch_scopes(obj.barangay_id, obj.created_at):
+                for metric in SKETCH_METRICS:
+                    value = getattr(obj, metric)
+                    if value is not None:
+                        additions.setdefault((*scope, metric), []).append(float(value))
+
+    for obj in session.deleted:
+        if isinstance(obj, Farmer):
+            mark_stale(*[_old_value(obj, a) for a in _SKETCH_SCOPE_ATTRS])
+
+    for obj in session.dirty:
+        if isinstance(obj, Farmer) and session.is_modified(obj) \
+                and _farmer_changed(obj, _SKETCH_SCOPE_ATTRS + SKETCH_METRICS):
+            mark_stale(*[_old_value(obj, a) for a in _SKETCH_SCOPE_ATTRS])
+            mark_stale(*[getattr(obj, a) for a in _SKETCH_SCOPE_ATTRS])
+
+    return additions, stale
+
+
+def _apply_sketch_changes(connection, additions, stale):
+    T = FarmerMetricSketch.__table__
+    keys = set(additions) | stale
+    if not keys:
+        return
+    existing = {
+        (r.scope, r.scope_key, r.metric): r
+        for r in connection.execute(
+            select(T).where(or_(*[
+                and_(T.c.scope == scope, T.c.scope_key == scope_key, T.c.metric == metric)
+                for scope, scope_key, metric in keys
+            ])).with_for_update()
+        )
+    }
+    now = datetime.utcnow()
+    for key in keys:
+        scope, scope_key, metric = key
+        row = existing.get(key)
+        if key in stale:
+            if row is None:
+                connection.execute(insert(T).values(scope=scope, scope_key=scope_key, metric=metric,
+                                                    count=0, stale=True, updated_at=now))
+            elif not row.stale:
+                connection.execute(update(T).where(T.c.id == row.id).values(stale=True, updated_at=now))
+            continue
+        if row is not None and row.stale:
+            continue  # rebuilt from scratch by rebuild_stale_sketches()
+        digest = TDigest.from_dict(json.loads(row.digest)) if row is not None and row.digest else TDigest()
+        for value in additions[key]:
+            digest.add(value)
+        values = dict(count=int(digest.count), digest=json.dumps(digest.to_dict()), updated_at=now)
+        if row is None:
+            connection.execute(insert(T).values(scope=scope, scope_key=scope_key, metric=metric, stale=False, **values))
+        else:
+            connection.execute(update(T).where(T.c.id == row.id).values(**values))
+
+
+@event.listens_for(Session, 'before_flush')
+def _load_deleted_state(session, flush_context, instances):
+    # Rows are gone by after_flush, so expired attributes of deleted
+    # farmers/children must be loaded while they still exist.
+    for obj in session.deleted:
+        if isinstance(obj, Farmer):
+            for attr in _FARMER_BUCKET_ATTRS + _FARMER_METRIC_ATTRS + _SKETCH_SCOPE_ATTRS:
+                getattr(obj, attr)
+        elif isinstance(obj, FarmerChild):
+            obj.farmer_id, obj.continues_farming
+        elif isinstance(obj, (FarmerExperience, ResearchProject)):
+            obj.created_at
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_dashboard_summary(session, flush_context):
+    changed = (*session.new, *session.dirty, *session.deleted)
+    connection = None
+    if any(isinstance(o, (Farmer, FarmerChild)) for o in changed):
+        connection = session.connection()
+        _apply_summary_deltas(connection, _collect_summary_deltas(session, connection))
+    if any(isinstance(o, (Farmer, FarmerExperience, ResearchProject)) for o in changed):
+        connection = connection or session.connection()
+        _apply_deltas(connection, DailyRollup, ('day',), _collect_rollup_deltas(session))
+    if any(isinstance(o, Farmer) for o in changed):
+        _apply_sketch_changes(connection, *_collect_sketch_changes(session))
+
+
+# ============ Set-Based Farmer Changes ============
+# Bulk UPDATE/DELETE statements (bulk.py) bypass the flush hooks above. The
+# caller reads the affected farmers' stored contribution before its
+# statement (sign -1) and, for updates, again after it (sign +1), and applies
+# both in the same transaction: the aggregates stay exact without a full
+# rebuild on the request path.
+
+def farmer_contributions(connection, farmer_ids, sign):
+    """(summary deltas, rollup deltas, sketch scopes) of the farmers as stored now, times sign."""
+    summary, rollups, scopes = {}, {}, set()
+    if not farmer_ids:
+        return summary, rollups, scopes
+
+    def add_rollup(day, delta):
+        target = rollups.setdefault((day,), dict.fromkeys(_ROLLUP_COLUMNS, 0))
+        for key, value in delta.items():
+            target[key] += value
+
+    children = _child_stats(connection, farmer_ids)
+    attrs = _FARMER_BUCKET_ATTRS + _FARMER_METRIC_ATTRS
+    rows = connection.execute(
+        select(Farmer.id, *[getattr(Farmer, a) for a in attrs]).where(Farmer.id.in_(farmer_ids))
+    )
+    for row in rows:
+        bucket = _bucket(row.barangay_id, row.education_level, row.created_at)
+        count, farming = children.get(row.id, (0, 0))
+        _add(summary, bucket, _farmer_metrics(row, sign))
+        _add(summary, bucket, {'children_count': sign * count, 'children_farming': sign * farming})
+        add_rollup(_day(row.created_at), _rollup_farmer_metrics(row, sign))
+        scopes.update(_sketch_scopes(row.barangay_id, row.created_at))
+
+    experiences = connection.execute(
+        select(FarmerExperience.created_at).where(FarmerExperience.farmer_id.in_(farmer_ids))
+    ).scalars()
+    for created_at in experiences:
+        add_rollup(_day(created_at), {'experiences_created': sign})
+    return summary, rollups, scopes
+
+
+def apply_farmer_contributions(connection, *contributions):
+    """Apply the sum of farmer_contributions() results; the touched sketches go stale."""
+    summary, rollups, scopes = {}, {}, set()
+    for farmer_summary, farmer_rollups, farmer_scopes in contributions:
+        for bucket, delta in farmer_summary.items():
+            _add(summary, bucket, delta)
+        for key, delta in farmer_rollups.items():
+            target = rollups.setdefault(key, dict.fromkeys(_ROLLUP_COLUMNS, 0))
+            for column, value in delta.items():
+                target[column] += value
+        scopes |= farmer_scopes
+    _apply_summary_deltas(connection, summary)
+    _apply_deltas(connection, DailyRollup, ('day',), rollups)
+    _apply_sketch_changes(connection, {}, {(*scope, metric) for scope in scopes for metric in SKETCH_METRICS})
+
+
+def _farmer_group_keys():
+    return (
+        Farmer.barangay_id, Farmer.education_level,
+        extract('year', Farmer.created_at).label('y'), extract('month', Farmer.created_at).label('m')
+    )
+
+
+def reconcile_dashboard_summary():
+    """Rebuild dashboard_summary from the raw farmers/farmer_children tables."""
+    keys = _farmer_group_keys()
+    income = func.coalesce(Farmer.annual_income, 0)
+    land = func.coalesce(Farmer.farm_size_hectares, 0)
+    farmer_rows = db.session.execute(
+        select(
+            *keys,
+            func.count(Farmer.id),
+            func.sum(Farmer.age), func.sum(Farmer.age * Farmer.age),
+            func.count(Farmer.annual_income), func.sum(income), func.sum(income * income),
+            func.count(Farmer.farm_size_hectares), func.sum(land), func.sum(land * land),
+        ).group_by(*keys)
+    ).all()
+    child_rows = db.session.execute(
+        select(
+            *keys,
+            func.count(FarmerChild.id),
+            func.sum(case((FarmerChild.continues_farming.is_(True), 1), else_=0))
+        ).join(Farmer, Farmer.id == FarmerChild.farmer_id).group_by(*keys)
+    ).all()
+
+    buckets = {}
+    for barangay_id, level, y, m, *values in farmer_rows:
+        month = date(int(y), int(m), 1) if y else month_start(None)
+        target = buckets.setdefault((barangay_id, level or '', month), dict.fromkeys(_SUMMARY_COLUMNS, 0))
+        for key, value in zip(_SUMMARY_COLUMNS[:9], values):
+            target[key] += float(value or 0) if 'sum' in key else int(value or 0)
+    for barangay_id, level, y, m, count, farming in child_rows:
+        month = date(int(y), int(m), 1) if y else month_start(None)
+        target = buckets.setdefault((barangay_id, level or '', month), dict.fromkeys(_SUMMARY_COLUMNS, 0))
+        target['children_count'] += int(count or 0)
+        target['children_farming'] += int(farming or 0)
+
+    db.session.execute(delete(DashboardSummary))
+    if buckets:
+        db.session.execute(insert(DashboardSummary), [
+            dict(barangay_id=b, education_level=l, month=mo, **values)
+            for (b, l, mo), values in buckets.items()
+        ])
+    db.session.commit()
+    _last_reconciled['at'] = time.monotonic()
+    print(f"📊 Dashboard summary reconciled: {len(buckets)} buckets")
+
+
+def _as_date(value):
+    if isinstance(value, str):  # SQLite returns DATE() as text
+        return date.fromisoformat(value[:10])
+    return _day(value)
+
+
+def reconcile_daily_rollups():
+    """Rebuild daily_rollups from the raw farmers/experiences/projects tables."""
+    farmer_day = func.date(Farmer.created_at)
+    income = func.coalesce(Farmer.annual_income, 0)
+    land = func.coalesce(Farmer.farm_size_hectares, 0)
+    days = {}
+
+    def row_for(value):
+        return days.setdefault(_as_date(value), dict.fromkeys(_ROLLUP_COLUMNS, 0))
+
+    for day, *values in db.session.execute(
+        select(
+            farmer_day,
+            func.count(Farmer.id),
+            func.sum(Farmer.age), func.sum(Farmer.age * Farmer.age),
+            func.count(Farmer.annual_income), func.sum(income), func.sum(income * income),
+            func.count(Farmer.farm_size_hectares), func.sum(land), func.sum(land * land),
+        ).group_by(farmer_day)
+    ):
+        target = row_for(day)
+        columns = ('farmers_created',) + _ROLLUP_COLUMNS[3:]
+        for key, value in zip(columns, values):
+            target[key] += float(value or 0) if 'sum' in key else int(value or 0)
+
+    for model, column in ((FarmerExperience, 'experiences_created'), (ResearchProject, 'projects_created')):
+        model_day = func.date(model.created_at)
+        for day, count in db.session.execute(select(model_day, func.count(model.id)).group_by(model_day)):
+            row_for(day)[column] += int(count or 0)
+
+    db.session.execute(delete(DailyRollup))
+    if days:
+        db.session.execute(insert(DailyRollup), [dict(day=d, **values) for d, values in days.items()])
+    db.session.commit()
+    print(f"📊 Daily rollups reconciled: {len(days)} days")
+
+
+def reconcile_metric_sketches():
+    """Rebuild every farmer_metric_sketches row with one pass over the farmers."""
+    digests = {}
+    rows = db.session.execute(
+        select(Farmer.barangay_id, Farmer.created_at, *_metric_columns()).execution_options(yield_per=1000)
+    )
+    for barangay_id, created_at, *values in rows:
+        for scope in _sketch_scopes(barangay_id, created_at):
+            for metric, value in zip(SKETCH_METRICS, values):
+                digest = digests.setdefault((*scope, metric), TDigest())
+                digest.add(value)
+
+    db.session.execute(delete(FarmerMetricSketch))
+    if digests:
+        now = datetime.utcnow()
+        db.session.execute(insert(FarmerMetricSketch), [
+            dict(scope=scope, scope_key=scope_key, metric=metric, count=int(d.count),
+                 digest=json.dumps(d.to_dict()), stale=False, updated_at=now)
+            for (scope, scope_key, metric), d in digests.items()
+        ])
+    db.session.commit()
+    print(f"📊 Metric sketches reconciled: {len(digests)} sketches")
+
+
+def reconcile_if_due(force=False):
+    """
+    Cheap drift check (raw row counts vs summary/rollup totals) at most every
+    reconcile interval per worker; rebuilds whichever table disagrees.
+    """
+    last = _last_reconciled['at']
+    if not force and last is not None and time.monotonic() - last < _settings['reconcile_interval']:
+        return
+    S, R = DashboardSummary, DailyRollup
+
+    def total(col):
+        return _scalar(select(func.coalesce(func.sum(col), 0)))
+
+    counts = db.session.execute(select(
+        _scalar(select(func.count(Farmer.id))),
+        _scalar(select(func.count(FarmerChild.id))),
+        _scalar(select(func.count(FarmerExperience.id))),
+        _scalar(select(func.count(ResearchProject.id))),
+        total(S.farmer_count), total(S.children_count),
+        total(R.farmers_created), total(R.experiences_created), total(R.projects_created),
+    )).one()
+    raw_farmers, raw_children, raw_experiences, raw_projects, *stored = [int(c or 0) for c in counts]
+
+    if force or (raw_farmers, raw_children) != tuple(stored[:2]):
+        reconcile_dashboard_summary()
+    if force or (raw_farmers, raw_experiences, raw_projects) != tuple(stored[2:]):
+        reconcile_daily_rollups()
+
+    # Sketches: refresh stale ones first, then every farmer must be in exactly
+    # one month sketch and one (barangay, month) sketch
+    K = FarmerMetricSketch
+    rebuild_stale_sketches()
+    sketched = dict(db.session.execute(
+        select(K.scope, func.coalesce(func.sum(K.count), 0))
+        .where(K.scope.in_(['month', 'barangay_month']), K.metric == 'age').group_by(K.scope)
+    ).all())
+    if force or any(raw_farmers != int(sketched.get(scope) or 0) for scope in ('month', 'barangay_month')):
+        reconcile_metric_sketches()
+    _last_reconciled['at'] = time.monotonic()
+
+
+def init_app(app):
+    _settings['reconcile_interval'] = app.config.get('DASHBOARD_SUMMARY_RECONCILE_SECONDS', 900)
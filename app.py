@@ -8,7 +8,11 @@ import io
 import csv
 import json
 import traceback
+import tempfile
+import threading
 from sqlalchemy import or_, func, desc, asc
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
 from flask_mail import Mail, Message
 import random
 
@@ -17,10 +21,42 @@ from models import (
     db, User, Organization, Barangay, AgriculturalProduct, Farmer, 
     FarmerProduct, FarmerChild, FarmerExperience, ResearchProject,
     SurveyQuestionnaire, ActivityLog, Notification, ExperienceComment,
-    TokenBlocklist # <--- ADD THIS HERE
+    TokenBlocklist, BackgroundJob # <--- ADD THIS HERE
 )
-
-def create_app(config_name='development'):
+import analytics
+from analytics import (
+    compute_dashboard_stats, compute_range_stats, metric_distributions, range_start, month_start, COMPARE_MODES
+)
+from cache import response_cache
+from scheduler import scheduler
+from versions import (
+    conditional_get, ensure_version_rows, current_versions, row_etag, if_match_fails, row_version_etag,
+    SharedTagVersions,
+)
+from pagination import (
+    COUNT_MODES, CursorError, encode_cursor, decode_cursor, keyset_after, count_cache
+)
+from search import search_index
+from filters import apply_farmer_filters, farmer_sort_column, FilterError
+from schema import (
+    create_tables, ensure_columns, ensure_indexes, backfill_sort_names, backfill_product_name_keys,
+    backfill_row_versions,
+)
+from product_names import product_names
+from farmer_products import sync_farmer_products
+from jobs import start_job
+from bulk import target_ids, update_values, bulk_update_farmers, bulk_delete_farmers, BulkError, BulkChunkError
+from importer import FarmerImporter, ImportFileError, import_format, read_rows, count_rows
+from projections import parse_projection, project, serialize_rows, ProjectionError
+from farmer_detail import load_farmer_aggregate, farmer_detail, farmer_tag, DETAIL_TAG
+from idempotency import idempotent, purge_expired_keys
+from sync import pull_changes, apply_push, fill_seqs, purge_change_log, SyncError
+
+def create_app(config_name='development', bootstrap=True):
+    """
+    bootstrap=False builds the app without touching the database schema or
+    starting the scheduler (read-only tools such as bench_dashboard.py).
+    """
     app = Flask(__name__, static_folder="./template/dist", static_url_path="/")
     app.config.from_object(config[config_name])
     
@@ -35,13 +71,21 @@ def create_app(config_name='development'):
 
     # Initialize extensions (SQLAlchemy)
     db.init_app(app)
+    analytics.init_app(app)
+    # Tag versions in data_versions, so every worker sees every invalidation
+    response_cache.init_app(app, tag_store=SharedTagVersions())
+    scheduler.init_app(app)
+    search_index.init_app(app)
+    count_cache.init_app(app)
     
     # Allow specific origin for CORS - Enhanced headers
     CORS(app, 
          resources={r"/api/*": {"origins": "*"}}, # Allowing '*' is easiest for ngrok
          supports_credentials=True,
          # MUST INCLUDE "ngrok-skip-browser-warning" in allow_headers
-         allow_headers=["Content-Type", "Authorization", "ngrok-skip-browser-warning"],
+         allow_headers=["Content-Type", "Authorization", "ngrok-skip-browser-warning", "If-Match", "Idempotency-Key"],
+         # ETag carries the farmer row_version a PUT sends back in If-Match
+         expose_headers=["ETag", "Idempotent-Replayed"],
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
     jwt = JWTManager(app)
 
@@ -72,7 +116,7 @@ def create_app(config_name='development'):
             res.headers.add("Access-Control-Allow-Origin", request.headers.get("Origin", "*"))
             res.headers.add("Access-Control-Allow-Methods", "GET,POST,PUT,DELETE,OPTIONS")
             # MUST INCLUDE "ngrok-skip-browser-warning" here as well
-            res.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization,ngrok-skip-browser-warning")
+            res.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization,ngrok-skip-browser-warning,If-Match,Idempotency-Key")
             return res, 200
     
     # Create upload folder immediately
@@ -84,13 +128,17 @@ def create_app(config_name='development'):
     
     # --- HELPER FUNCTIONS ---
 
-    def log_activity(action, entity_type=None, entity_id=None, details=None):
+    def log_activity(action, entity_type=None, entity_id=None, details=None, commit=True, user_id=None):
+        """
+        commit=False adds the log to the caller's transaction; the caller commits and invalidates 'dashboard'.
+        user_id attributes work done outside a request (background jobs) to the user who started it.
+        """
         try:
-            user_id = None
-            try:
-                user_id = get_jwt_identity()
-            except:
-                pass # Allow system/background logs if no JWT context exists
+            if user_id is None:
+                try:
+                    user_id = get_jwt_identity()
+                except:
+                    pass # Allow system/background logs if no JWT context exists
 
             if not user_id and request and hasattr(request, 'path') and 'login' not in request.path:
                 return 
@@ -135,11 +183,32 @@ def create_app(config_name='development'):
                 print(f"Auto-Notif Generation Error: {str(notif_e)}")
             # ---------------------------------------------
             
+            if not commit:
+                return
             db.session.commit()
+            # Recent activity feed is part of the dashboard payload
+            invalidate_cache('dashboard')
         except Exception as e:
             print(f"Logging error: {e}")
-            db.session.rollback()
-            pass
+            if commit:
+                db.session.rollback()
+
+    # Response cache tags, see cache.py. Call only after a successful commit.
+    def invalidate_cache(*tags):
+        try:
+            response_cache.invalidate(*tags)
+        except Exception as e:
+            print(f"Cache invalidation error: {e}")
+
+    # 412 for a farmer save based on an outdated row_version (see versions.py)
+    def stale_farmer_response(current_version):
+        res = jsonify({
+            'error': 'This farmer was changed by someone else since you loaded it. Reload and apply your changes again.',
+            'current_row_version': current_version,
+        })
+        if current_version is not None:
+            res.set_etag(row_etag(current_version))
+        return res, 412
 
     # ADDED: Notification Helper
     def broadcast_notification(title, message, target_user_id=None):
@@ -661,94 +730,31 @@ def create_app(config_name='development'):
     
     @app.route('/api/dashboard/stats', methods=['GET'])
     @jwt_required()
+    @response_cache.cached('dashboard', coalesce=True)
     def get_dashboard_stats():
         try:
-            # 1. Get the Time Filter
-            time_range = request.args.get('range', 'all')
-            start_date = None
-            if time_range == 'month':
-                start_date = datetime.utcnow() - timedelta(days=30)
-            elif time_range == 'year':
-                start_date = datetime.utcnow() - timedelta(days=365)
-
-            # 2. Helper to filter queries by date safely
-            def apply_date_filter(query, model):
-                if start_date and hasattr(model, 'created_at'):
-                    return query.filter(model.created_at >= start_date)
-                return query
-
-            # 3. Core Metrics with Null Handling
-            total_farmers = apply_date_filter(Farmer.query, Farmer).count()
-            total_barangays = Barangay.query.count() or 0
-            total_products = AgriculturalProduct.query.count() or 0
-            total_experiences = apply_date_filter(FarmerExperience.query, FarmerExperience).count() or 0
-            total_projects = apply_date_filter(ResearchProject.query, ResearchProject).count() or 0
-            
-            # Youth Succession Count
-            children_farming = FarmerChild.query.filter_by(continues_farming=True).count() or 0
-            total_children = FarmerChild.query.count() or 0
-            
-            # System Entities
-            total_users = User.query.count() or 0
-            total_surveys = SurveyQuestionnaire.query.count() or 0
-
-            # 4. Academic Profile Data
-            edu_query = db.session.query(Farmer.education_level, func.count(Farmer.id))
-            if start_date: 
-                edu_query = edu_query.filter(Farmer.created_at >= start_date)
-            education_stats_raw = edu_query.group_by(Farmer.education_level).all()
-            education_stats = [{'level': (l or "Unknown"), 'count': c} for l, c in education_stats_raw]
-
-            # 5. Territorial Density Data
-            prod_stats_query = db.session.query(
-                Barangay.name, 
-                func.count(Farmer.id)
-            ).join(Farmer, Barangay.id == Farmer.barangay_id)
-            
-            if start_date: 
-                prod_stats_query = prod_stats_query.filter(Farmer.created_at >= start_date)
-            
-            product_stats_raw = prod_stats_query.group_by(Barangay.name).order_by(func.count(Farmer.id).desc()).all()
-            product_stats = [{'barangay': n, 'count': c} for n, c in product_stats_raw]
-
-            # 6. EXECUTIVE SUMMARY ANALYSIS
-            raw_age = apply_date_filter(db.session.query(func.avg(Farmer.age)), Farmer).scalar() or 0
-            raw_income = apply_date_filter(db.session.query(func.avg(Farmer.annual_income)), Farmer).scalar() or 0
-            raw_land = apply_date_filter(db.session.query(func.avg(Farmer.farm_size_hectares)), Farmer).scalar() or 0
-
-            top_edu = "N/A"
-            if education_stats:
-                top_edu = max(education_stats, key=lambda x: x['count'])['level']
-            
-            top_brgy = "N/A"
-            if product_stats:
-                top_brgy = max(product_stats, key=lambda x: x['count'])['barangay']
-
-            summary_analysis = {
-                "average_farmer_age": round(float(raw_age), 1),
-                "average_annual_income": round(float(raw_income), 2),
-                "average_land_size_ha": round(float(raw_land), 2),
-                "top_education_level": top_edu,
-                "most_populated_barangay": top_brgy,
-                "total_system_users": total_users,
-                "total_active_surveys": total_surveys
-            }
+            # 1. Arbitrary ?from=YYYY-MM-DD&to=YYYY-MM-DD[&compare=previous|year] ranges
+            if request.args.get('from') or request.args.get('to'):
+                try:
+                    start_day = datetime.strptime(request.args['from'][:10], '%Y-%m-%d').date()
+                    end_day = datetime.strptime(request.args.get('to', date.today().isoformat())[:10], '%Y-%m-%d').date()
+                except (KeyError, ValueError):
+                    return jsonify({'error': 'Invalid range. Use from=YYYY-MM-DD and to=YYYY-MM-DD'}), 400
+                if start_day > end_day:
+                    return jsonify({'error': "'from' must be on or before 'to'"}), 400
 
-            recent_activities = ActivityLog.query.order_by(ActivityLog.created_at.desc()).limit(10).all()
+                compare = request.args.get('compare')
+                if compare and compare not in COMPARE_MODES:
+                    return jsonify({'error': f"compare must be one of: {', '.join(COMPARE_MODES)}"}), 400
 
-            return jsonify({
-                'total_farmers': total_farmers,
-                'total_barangays': total_barangays,
-                'total_products': total_products,
-                'total_experiences': total_experiences,
-                'total_projects': total_projects,
-                'children_farming': children_farming,
-                'total_children': total_children,
-                'recent_activities': [log.to_dict() for log in recent_activities],
-                'education_stats': education_stats,
-                'product_stats': product_stats,
-                'summary_analysis': summary_analysis
-            }), 200
+                return jsonify(compute_range_stats(start_day, end_day, compare)), 200
+
+            # 2. Get the Time Filter
+            time_range = request.args.get('range', 'all')
+            start_date = range_start(time_range)
+
+            # 3. All metrics in a handful of combined statements (see analytics.py)
+            return jsonify(compute_dashboard_stats(start_date)), 200
 
         except Exception as e:
             print(f"CRITICAL DASHBOARD ERROR: {str(e)}")
@@ -757,6 +763,42 @@ def create_app(config_name='development'):
                 'error': 'Analytics Engine Error',
                 'message': str(e)
             }), 500
+
+    @app.route('/api/dashboard/distributions', methods=['GET'])
+    @jwt_required()
+    @response_cache.cached('dashboard')
+    def get_dashboard_distributions():
+        """Median, p10/p90 and histogram of age, income and farm size, by barangay and/or month range."""
+        try:
+            start_month = end_month = None
+            try:
+                if request.args.get('from'):
+                    start_month = month_start(datetime.strptime(request.args['from'][:7], '%Y-%m'))
+                if request.args.get('to'):
+                    end_month = month_start(datetime.strptime(request.args['to'][:7], '%Y-%m'))
+                bins = int(request.args.get('bins', 10))
+            except ValueError:
+                return jsonify({'error': 'Invalid parameters. Use from/to=YYYY-MM and a numeric bins'}), 400
+            if not 1 <= bins <= 50:
+                return jsonify({'error': 'bins must be between 1 and 50'}), 400
+
+            barangay_id = request.args.get('barangay_id', type=int)
+            distributions = metric_distributions(start_month, end_month, barangay_id, bins)
+
+            metrics = request.args.get('metrics')
+            if metrics:
+                wanted = {m.strip() for m in metrics.split(',')}
+                distributions = {k: v for k, v in distributions.items() if k in wanted}
+
+            return jsonify({
+                'barangay_id': barangay_id,
+                'from': start_month.strftime('%Y-%m') if start_month else None,
+                'to': end_month.strftime('%Y-%m') if end_month else None,
+                'distributions': distributions
+            }), 200
+        except Exception as e:
+            print(f"Distribution Error: {e}")
+            return jsonify({'error': str(e)}), 500
     
     # ============ Notification Routes ============
     
@@ -821,20 +863,37 @@ def create_app(config_name='development'):
 
     # ============ Farmer Routes ============
 
+    # Tables the farmer list depends on: the rows, their joined barangay and
+    # organization, and the products/children the product_id and
+    # has_successor filters look at
+    FARMER_LIST_TABLES = ('farmers', 'barangays', 'organizations', 'farmer_products', 'farmer_children')
+    FARMER_COUNT_TABLES = ('farmers', 'farmer_products', 'farmer_children')
+
     @app.route('/api/farmers', methods=['GET'])
     @jwt_required()
+    @conditional_get(*FARMER_LIST_TABLES)
     def get_farmers():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', app.config.get('ITEMS_PER_PAGE', 20), type=int)
         search = request.args.get('search', '')
-        barangay_id = request.args.get('barangay_id')
         
-        sort_by = request.args.get('sort_by', 'created_at')
+        # ?cursor= (empty for the first page) switches to keyset pagination, see pagination.py
+        cursor_mode = 'cursor' in request.args
+        count_mode = request.args.get('count', 'none' if cursor_mode else 'exact')
+        if count_mode not in COUNT_MODES:
+            return jsonify({'error': f"count must be one of: {', '.join(COUNT_MODES)}"}), 400
+        
+        # With a search term and no explicit sort, results come back by relevance
+        sort_by = request.args.get('sort_by', 'relevance' if search else 'created_at')
         sort_order = request.args.get('sort_order', 'desc')
         
         query = Farmer.query
+        ranked_ids = None
         
-        if search:
+        if search and search_index.enabled:
+            # Every match, best first; the filters and paging below work on the whole list
+            ranked_ids = search_index.search(search)
+        elif search:
             search_term = f"%{search}%"
             query = query.filter(
                 or_(
@@ -844,45 +903,255 @@ def create_app(config_name='development'):
                 )
             )
         
-        if barangay_id:
-            query = query.filter(Farmer.barangay_id == barangay_id)
+        # gender, education, ranges, product, successor... (see filters.py)
+        try:
+            query = apply_farmer_filters(query, request.args)
+            fields = parse_projection(request.args)
+        except (FilterError, ProjectionError) as e:
+            return jsonify({'error': str(e)}), 400
         
-        if hasattr(Farmer, sort_by):
-            col = getattr(Farmer, sort_by)
-            if sort_order == 'asc':
-                query = query.order_by(col.asc())
+        if ranked_ids is not None:
+            # The matches that pass the filters, still best first: their number is the real total
+            ranked_ids = filter_ranked_ids(query, ranked_ids)
+            total = len(ranked_ids) if count_mode != 'none' else None
+        else:
+            # Totals per filter signature (everything except paging/sorting/projection args)
+            signature = tuple(sorted(
+                (k, v) for k, v in request.args.items(multi=True)
+                if k not in ('page', 'per_page', 'cursor', 'count', 'sort_by', 'sort_order', 'fields', 'view')
+            ))
+            if count_mode != 'none':
+                versions = current_versions(FARMER_COUNT_TABLES)
+                version = tuple(versions[t] for t in FARMER_COUNT_TABLES)
             else:
-                query = query.order_by(col.desc())
+                version = None
+            total = count_cache.get(signature, version, count_mode, lambda: query.order_by(None).count())
+        
+        col = None
+        descending = sort_order == 'desc'
+        if sort_by == 'relevance' and ranked_ids is not None:
+            rank = {fid: i for i, fid in enumerate(ranked_ids)}
+            sort_key = lambda farmer: rank[farmer.id]
         else:
-            query = query.order_by(Farmer.created_at.desc())
-
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            if sort_by == 'relevance':
+                sort_by = 'created_at'  # nothing to rank without a search term
+            try:
+                col = farmer_sort_column(sort_by, sort_order)
+            except FilterError as e:
+                return jsonify({'error': str(e)}), 400
+            # id breaks ties so pages never overlap or skip rows; (col, id) is indexed
+            query = query.order_by(col.desc(), Farmer.id.desc()) if descending else query.order_by(col.asc(), Farmer.id.asc())
+            sort_key = lambda farmer: getattr(farmer, col.key)
+        
+        last = None
+        if cursor_mode:
+            try:
+                last = decode_cursor(request.args.get('cursor'), sort_by, sort_order)
+            except CursorError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        # Search results are paged by id: the page's ids are picked first (from the
+        # ranked list, or from an id-only scan in column order for large match sets)
+        # and only those rows are loaded. Small match sets sorted by a column just
+        # filter on the ids in SQL.
+        page_ids = None
+        skip = 0 if cursor_mode else max(page - 1, 0) * per_page
+        if ranked_ids is not None and col is None:
+            start = last[0] + 1 if last is not None else skip
+            page_ids = ranked_ids[start:start + per_page + 1]
+        elif ranked_ids is not None and len(ranked_ids) > app.config.get('SEARCH_IN_LIST_MAX', 500):
+            page_ids = ids_in_sort_order(query, ranked_ids, col, last, descending, skip, per_page + 1)
+        elif ranked_ids is not None:
+            query = query.filter(Farmer.id.in_(ranked_ids))
+        
+        if fields is None:
+            # Barangay and organization come back in the same statement (no per-row lazy loads)
+            query = query.options(joinedload(Farmer.barangay), joinedload(Farmer.organization))
+            memo = {}
+            serialize = lambda rows: [farmer.to_dict(include_relations=True, memo=memo) for farmer in rows]
+        else:
+            # Only the columns the requested fields need (plus the sort key for cursors)
+            query = project(query, fields, extra_columns=[col] if col is not None else [])
+            serialize = lambda rows: serialize_rows(rows, fields)
+        
+        if page_ids is not None:
+            rows = query.filter(Farmer.id.in_(page_ids)).order_by(None).all() if page_ids else []
+            position = {fid: i for i, fid in enumerate(page_ids)}
+            rows.sort(key=lambda row: position[row.id])
+        elif not cursor_mode:
+            rows = query.paginate(page=page, per_page=per_page, error_out=False, count=False).items
+        else:
+            if last is not None:
+                query = query.filter(keyset_after(col, Farmer.id, last[0], last[1], descending))
+            rows = query.limit(per_page + 1).all()
+        
+        if not cursor_mode:
+            return jsonify({
+                'farmers': serialize(rows[:per_page]),
+                'total': total,
+                'pages': -(-total // per_page) if total is not None and per_page else None,
+                'current_page': page
+            }), 200
+        
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(sort_by, sort_order, sort_key(rows[-1]), rows[-1].id) if has_more else None
         
         return jsonify({
-            'farmers': [farmer.to_dict(include_relations=True) for farmer in pagination.items],
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'current_page': page
+            'farmers': serialize(rows),
+            'total': total,
+            'next_cursor': next_cursor,
+            'has_more': has_more
         }), 200
     
-    @app.route('/api/farmers/<int:id>', methods=['GET'])
+    def filter_ranked_ids(query, ranked_ids):
+        """The ids in ranked_ids that also match the filters on query, in ranked order."""
+        if query.whereclause is None or not ranked_ids:
+            return ranked_ids
+        ids = query.with_entities(Farmer.id).order_by(None)
+        if len(ranked_ids) <= app.config.get('SEARCH_IN_LIST_MAX', 500):
+            ids = ids.filter(Farmer.id.in_(ranked_ids))
+        # Otherwise read the ids passing the filters (one narrow column) instead of a huge IN list
+        keep = {fid for fid, in ids}
+        return [fid for fid in ranked_ids if fid in keep]
+    
+    def ids_in_sort_order(query, ranked_ids, col, last, descending, skip, take):
+        """Up to take ids of ranked_ids in the query's column order, after skip of them (or the cursor)."""
+        wanted = set(ranked_ids)
+        ids = query.with_entities(Farmer.id)
+        if last is not None:
+            ids = ids.filter(keyset_after(col, Farmer.id, last[0], last[1], descending))
+        page_ids = []
+        for fid, in ids.yield_per(2000):
+            if fid not in wanted:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            page_ids.append(fid)
+            if len(page_ids) == take:
+                break
+        return page_ids
+    
+    @app.route('/api/farmers/import', methods=['POST'])
     @jwt_required()
-    def get_farmer(id):
-        farmer = Farmer.query.get_or_404(id)
-        
-        products = FarmerProduct.query.filter_by(farmer_id=id).all()
-        children = FarmerChild.query.filter_by(farmer_id=id).all()
-        experiences = FarmerExperience.query.filter_by(farmer_id=id).all()
+    def import_farmers():
+        """Start a background import of a CSV/XLSX sheet of farmers (see importer.py); poll /api/jobs/<id>."""
+        current_user = User.query.get(get_jwt_identity())
+        if current_user.role not in ['admin', 'researcher', 'data_encoder']:
+            return jsonify({'error': 'Unauthorized'}), 403
         
-        data = farmer.to_dict(include_relations=True)
-        data['products'] = [p.to_dict() for p in products]
-        data['children'] = [c.to_dict() for c in children]
-        data['experiences'] = [e.to_dict() for e in experiences]
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'error': 'No file uploaded'}), 400
+        try:
+            fmt = import_format(upload.filename)
+        except ImportFileError as e:
+            return jsonify({'error': str(e)}), 400
+        batch_size = request.form.get('batch_size', app.config.get('IMPORT_BATCH_SIZE', 200), type=int)
+        batch_size = min(max(batch_size, 1), app.config.get('IMPORT_MAX_BATCH_SIZE', 1000))
+        
+        # The job reads the file after this request has returned
+        fd, path = tempfile.mkstemp(prefix='farmer-import-', suffix=f'.{fmt}')
+        os.close(fd)
+        upload.save(path)
+        job = start_job(app, 'farmer_import', current_user.id, run_farmer_import, path, fmt, batch_size,
+                        filename=secure_filename(upload.filename))
+        return jsonify({'message': 'Import started', 'job': job.to_dict()}), 202
+    
+    def run_farmer_import(reporter, path, fmt, batch_size):
+        job = reporter.job
+        try:
+            reporter.total = count_rows(path, fmt)
+            imported, failed = FarmerImporter(job.created_by, batch_size).run(read_rows(path, fmt), reporter)
+        finally:
+            os.remove(path)
+        if imported:
+            invalidate_cache('dashboard', 'mapping', 'products')
+        # One summarized entry (and notification) for the whole file
+        log_activity('FARMERS IMPORTED', 'Farmer', None,
+                     f"Imported {imported} farmers from {job.filename} ({failed} rows rejected)", user_id=job.created_by)
+        return f"Imported {imported} farmers, {failed} rows rejected"
+    
+    @app.route('/api/farmers/batch-get', methods=['POST'])
+    @jwt_required()
+    def batch_get_farmers():
+        """
+        Many farmers in one request: {"ids": [...], "view"/"fields": ..., "include": ["products", "children"]}.
+        One IN query (plus one per included relation); results follow the order of ids.
+        """
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return jsonify({'error': 'ids must be a non-empty list'}), 400
+        try:
+            ids = list(dict.fromkeys(int(i) for i in ids))
+        except (ValueError, TypeError):
+            return jsonify({'error': 'ids must be integers'}), 400
+        limit = app.config.get('FARMER_BATCH_MAX', 500)
+        if len(ids) > limit:
+            return jsonify({'error': f'At most {limit} ids per request'}), 400
+        
+        fields = data.get('fields', '')
+        if isinstance(fields, list):
+            fields = ','.join(str(f) for f in fields)
+        include = data.get('include') or []
+        if isinstance(include, str):
+            include = [i.strip() for i in include.split(',') if i.strip()]
+        relations = {'products': Farmer.products, 'children': Farmer.children}
+        unknown = [i for i in include if i not in relations]
+        if unknown:
+            return jsonify({'error': f"include must be any of: {', '.join(relations)}"}), 400
+        try:
+            fields = parse_projection({'fields': fields, 'view': data.get('view', '')})
+        except ProjectionError as e:
+            return jsonify({'error': str(e)}), 400
+        if include and fields is not None:
+            return jsonify({'error': 'include is only available with the full view'}), 400
+        
+        query = Farmer.query.filter(Farmer.id.in_(ids))
+        if fields is None:
+            options = [joinedload(Farmer.barangay), joinedload(Farmer.organization)]
+            if 'products' in include:
+                options.append(selectinload(Farmer.products).joinedload(FarmerProduct.product))
+            if 'children' in include:
+                options.append(selectinload(Farmer.children))
+            memo = {}
+            found = {}
+            for farmer in query.options(*options).all():
+                item = farmer.to_dict(include_relations=True, memo=memo)
+                for name in include:
+                    item[name] = [r.to_dict() for r in sorted(getattr(farmer, name), key=lambda r: r.id)]
+                found[farmer.id] = item
+        else:
+            found = {item['id']: item for item in serialize_rows(project(query, fields).all(), fields)}
         
-        return jsonify(data), 200
+        return jsonify({
+            'farmers': [found[i] for i in ids if i in found],
+            'missing': [i for i in ids if i not in found]
+        }), 200
+    
+    @app.route('/api/farmers/suggest', methods=['GET'])
+    @jwt_required()
+    def suggest_farmers():
+        """Typeahead: ids and display names of farmers whose name or code starts with ?q."""
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 25)
+        return jsonify(search_index.suggest(request.args.get('q', ''), limit)), 200
+
+    @app.route('/api/farmers/<int:id>', methods=['GET'])
+    @jwt_required()
+    @row_version_etag
+    @response_cache.cached(farmer_tag, DETAIL_TAG)
+    def get_farmer(id):
+        # Whole profile in a fixed number of queries, see farmer_detail.py
+        farmer = load_farmer_aggregate(id)
+        if farmer is None:
+            return jsonify({'error': 'Farmer not found'}), 404
+        return jsonify(farmer_detail(farmer)), 200
     
     @app.route('/api/farmers', methods=['POST'])
     @jwt_required()
+    @idempotent
     def create_farmer():
         current_user = User.query.get(get_jwt_identity())
         if current_user.role not in ['admin', 'researcher', 'data_encoder']:
@@ -896,7 +1165,7 @@ def create_app(config_name='development'):
                 if val in ['', 'null', 'undefined', None]: return default
                 if type_cast:
                     try: return type_cast(val)
-                    except: return default
+                    except (ValueError, TypeError): return default
                 return val
 
             profile_image = save_profile_image(request.files['profile_image']) if 'profile_image' in request.files else None
@@ -916,6 +1185,30 @@ def create_app(config_name='development'):
             if age_val is None:
                 age_val = 0
 
+            # Nested rows of a full enrollment: JSON lists in the form fields
+            try:
+                products_data = [p for p in json.loads(data.get('products') or '[]') if p.get('product_name')]
+                children_data = [c for c in json.loads(data.get('children') or '[]') if c.get('name')]
+            except (ValueError, TypeError, AttributeError):
+                return jsonify({'error': 'products and children must be JSON lists of objects'}), 400
+
+            # All product names in one lookup; unknown ones are created in a single INSERT
+            # (a name that cannot be saved raises ProductNameError -> 400)
+            product_ids = product_names.resolve((p['product_name'], p.get('category', 'Others')) for p in products_data)
+            products = []
+            for p in products_data:
+                product_id = product_ids.get(AgriculturalProduct.make_name_key(p['product_name']))
+                if product_id is None: continue  # blank name
+                products.append(FarmerProduct(product_id=product_id, production_volume=p.get('production_volume', 0), unit=p.get('unit', 'kg'), is_primary=p.get('is_primary', False)))
+            children = [
+                FarmerChild(
+                    name=c.get('name'), age=c.get('age'), gender=c.get('gender'), education_level=c.get('education_level'),
+                    continues_farming=c.get('continues_farming', False), involvement_level=c.get('involvement_level', 'None'),
+                    current_occupation=c.get('current_occupation'), notes=c.get('notes')
+                )
+                for c in children_data
+            ]
+
             farmer = Farmer(
                 farmer_code=data.get('farmer_code'), first_name=data.get('first_name'), middle_name=get_val('middle_name'),
                 last_name=data.get('last_name'), suffix=get_val('extension_name'), # MAPPED from frontend
@@ -928,29 +1221,20 @@ def create_app(config_name='development'):
                 organization_id=get_val('organization_id', int), data_encoder_id=current_user.id, address=data.get('address'),
                 contact_number=data.get('contact_number'), education_level=data.get('education_level', 'Elementary'),
                 annual_income=get_val('annual_income', float), income_source=data.get('income_source'),
-                number_of_children=get_val('number_of_children', int, 0),
+                number_of_children=get_val('number_of_children', int, len(children_data)),
                 children_farming_involvement=data.get('children_farming_involvement') in ['true', True, '1'],
                 primary_occupation=data.get('primary_occupation'), secondary_occupation=data.get('secondary_occupation'),
                 farm_size_hectares=get_val('farm_size_hectares', float, 0), land_ownership=data.get('land_ownership', 'Owner'),
-                years_farming=get_val('years_farming', int)
+                years_farming=get_val('years_farming', int),
+                products=products, children=children
             )
+            # One unit of work: a single flush inserts the farmer, then its products and children
             db.session.add(farmer)
-            db.session.commit()
+            db.session.flush()
 
-            if data.get('products'):
-                try:
-                    for p in json.loads(data['products']):
-                        if not p.get('product_name'): continue
-                        prod = AgriculturalProduct.query.filter(func.lower(AgriculturalProduct.name) == func.lower(p['product_name'].strip())).first()
-                        if not prod:
-                            prod = AgriculturalProduct(name=p['product_name'].strip(), category=p.get('category', 'Others'))
-                            db.session.add(prod)
-                            db.session.commit()
-                        db.session.add(FarmerProduct(farmer_id=farmer.id, product_id=prod.id, production_volume=p.get('production_volume', 0), unit=p.get('unit', 'kg'), is_primary=p.get('is_primary', False)))
-                    db.session.commit()
-                except: pass
-
-            log_activity('FARMER CREATED', 'Farmer', farmer.id, f"Created: {farmer.first_name} {farmer.last_name}")
+            log_activity('FARMER CREATED', 'Farmer', farmer.id, f"Created: {farmer.first_name} {farmer.last_name}", commit=False)
+            db.session.commit()
+            invalidate_cache('dashboard', 'mapping', 'products')
             return jsonify({'message': 'Success', 'farmer': farmer.to_dict()}), 201
         except Exception as e:
             db.session.rollback()
@@ -975,6 +1259,7 @@ def create_app(config_name='development'):
             )
             db.session.add(org)
             db.session.commit()
+            invalidate_cache('organizations')
             log_activity('ORGANIZATION CREATED', 'Organization', org.id, f"Registered: {org.name}")
             return jsonify({'message': 'Success', 'organization': org.to_dict()}), 201
         except Exception as e: 
@@ -996,6 +1281,7 @@ def create_app(config_name='development'):
                     setattr(org, k, v)
             
             db.session.commit()
+            invalidate_cache('organizations')
             return jsonify({'message': 'Updated', 'organization': org.to_dict()}), 200
         except Exception as e: 
             return jsonify({'error': str(e)}), 400
@@ -1007,6 +1293,7 @@ def create_app(config_name='development'):
         try:
             db.session.delete(Organization.query.get_or_404(id))
             db.session.commit()
+            invalidate_cache('organizations')
             return jsonify({'message': 'Deleted'}), 200
         except: return jsonify({'error': 'Cannot delete active organization'}), 400
     
@@ -1024,6 +1311,13 @@ def create_app(config_name='development'):
         try:
             data = request.form.to_dict()
 
+            # Optimistic concurrency: the ETag from GET (or the row_version it returned)
+            expected = data.get('row_version')
+            if if_match_fails(farmer.row_version) or (
+                not request.if_match and expected not in (None, '') and expected != str(farmer.row_version)
+            ):
+                return stale_farmer_response(farmer.row_version)
+
             if 'profile_image' in request.files:
                 file = request.files['profile_image']
                 new_filename = save_profile_image(file)
@@ -1040,13 +1334,13 @@ def create_app(config_name='development'):
                 'id', 'created_at', 'updated_at', 'data_encoder_id', 'profile_image', 
                 'products', 'children', 'experiences', 
                 'barangay', 'organization', 'data_encoder',
-                'full_name'
+                'full_name', 'row_version'
             ]
 
             for key, value in data.items():
                 db_key = key_mapping.get(key, key)
 
-                if hasattr(farmer, db_key) and db_key not in excluded_keys:
+                if db_key not in excluded_keys and hasattr(farmer, db_key):
                     
                     if db_key == 'birth_date':
                         if value and value != 'null' and value != '':
@@ -1082,43 +1376,44 @@ def create_app(config_name='development'):
                     else:
                         setattr(farmer, db_key, value)
 
+            # Every save moves row_version, also when only the products changed. Set
+            # before the product lookups below autoflush the farmer, so the row is
+            # written (and its version bumped) exactly once
+            farmer.updated_at = datetime.utcnow()
+
             products_json = data.get('products')
             if products_json:
                 try:
-                    FarmerProduct.query.filter_by(farmer_id=farmer.id).delete()
-                    products_list = json.loads(products_json)
+                    products_list = [p for p in json.loads(products_json) if p.get('product_name')]
+                    # All names in one lookup; unknown ones are created in a single INSERT
+                    # (a name that cannot be saved raises ProductNameError -> 400)
+                    product_ids = product_names.resolve((p['product_name'], 'Crop') for p in products_list)
+                    submitted = []
                     for prod_data in products_list:
-                        if not prod_data.get('product_name'):
-                            continue
-
-                        prod_name = prod_data['product_name'].strip()
-                        agri_product = AgriculturalProduct.query.filter(
-                            func.lower(AgriculturalProduct.name) == func.lower(prod_name)
-                        ).first()
-
-                        if not agri_product:
-                            agri_product = AgriculturalProduct(name=prod_name, category='Crop')
-                            db.session.add(agri_product)
-                            db.session.commit()
-
-                        farmer_product = FarmerProduct(
-                            farmer_id=farmer.id,
-                            product_id=agri_product.id,
-                            production_volume=prod_data.get('production_volume', 0),
-                            unit=prod_data.get('unit', 'kg'),
-                            is_primary=prod_data.get('is_primary', False)
-                        )
-                        db.session.add(farmer_product)
+                        product_id = product_ids.get(AgriculturalProduct.make_name_key(prod_data['product_name']))
+                        if product_id is None:
+                            continue  # blank name
+                        submitted.append((product_id, prod_data.get('production_volume', 0), prod_data.get('unit', 'kg'), prod_data.get('is_primary', False)))
+                    # Only changed rows are written, see farmer_products.py
+                    sync_farmer_products(farmer.id, submitted)
                         
                 except json.JSONDecodeError:
                     print("Error decoding products JSON during update")
             
             db.session.commit()
+            invalidate_cache('dashboard', 'mapping', 'products')
             
             log_activity('FARMER UPDATED', 'Farmer', farmer.id, f"Updated farmer: {farmer.first_name} {farmer.last_name}")
             
-            return jsonify({'message': 'Farmer updated successfully', 'farmer': farmer.to_dict()}), 200
+            res = jsonify({'message': 'Farmer updated successfully', 'farmer': farmer.to_dict()})
+            res.set_etag(row_etag(farmer.row_version))
+            return res, 200
             
+        except StaleDataError:
+            # Someone saved between our read and our UPDATE ... WHERE row_version = ?
+            db.session.rollback()
+            current = db.session.query(Farmer.row_version).filter(Farmer.id == id).scalar()
+            return stale_farmer_response(current)
         except Exception as e:
             db.session.rollback()
             print(f"❌ UPDATE ERROR: {e}")
@@ -1138,8 +1433,8 @@ def create_app(config_name='development'):
         farmer = Farmer.query.get_or_404(id)
         
         FarmerProduct.query.filter_by(farmer_id=id).delete()
-        FarmerChild.query.filter_by(farmer_id=id).delete()
-        FarmerExperience.query.filter_by(farmer_id=id).delete()
+        # Children and experiences go through the ORM cascade so the
+        # dashboard summary and daily rollups see them
         
         if farmer.profile_image:
             delete_profile_image(farmer.profile_image)
@@ -1148,13 +1443,92 @@ def create_app(config_name='development'):
         
         db.session.delete(farmer)
         db.session.commit()
+        invalidate_cache('dashboard', 'mapping')
         
         return jsonify({'message': 'Farmer deleted successfully'}), 200
     
+    @app.route('/api/farmers/bulk-update', methods=['POST'])
+    @jwt_required()
+    def bulk_update_farmers_route():
+        """{"ids": [...] or "filters": {...}, "set": {"organization_id": 3, ...}}; see bulk.py."""
+        current_user = User.query.get(get_jwt_identity())
+        if current_user.role not in ['admin', 'researcher']:
+            return jsonify({'error': 'Unauthorized'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        try:
+            values = update_values(data.get('set'))
+            ids = target_ids(data, app.config.get('BULK_MAX_FARMERS', 10000))
+        except BulkError as e:
+            return jsonify({'error': str(e)}), 400
+        if not ids:
+            return jsonify({'message': 'No farmers matched', 'updated': 0}), 200
+        
+        changes = ', '.join(f'{k}={v}' for k, v in values.items())
+
+        def audit(chunk, count):
+            # Committed with its chunk, so the log matches what was applied
+            log_activity('FARMERS BULK UPDATED', 'Farmer', None,
+                         f"Updated {count} farmers (ids {chunk[0]}..{chunk[-1]}): {changes}", commit=False)
+
+        try:
+            updated = bulk_update_farmers(ids, values, app.config.get('BULK_CHUNK_SIZE', 1000), on_chunk=audit)
+        except BulkChunkError as e:
+            print(f"❌ BULK UPDATE ERROR: {e}")
+            invalidate_cache('dashboard', 'mapping')
+            return jsonify({
+                'error': f'Bulk update failed: {str(e)}', 'updated': e.count,
+                'committed_ids': e.committed_ids, 'remaining_ids': ids[len(e.committed_ids):],
+            }), 500
+        
+        invalidate_cache('dashboard', 'mapping')
+        return jsonify({'message': 'Farmers updated', 'updated': updated}), 200
+    
+    @app.route('/api/farmers/bulk-delete', methods=['POST'])
+    @jwt_required()
+    def bulk_delete_farmers_route():
+        """{"ids": [...]} or {"filters": {...}}; deletes the farmers with their products, children and experiences."""
+        current_user = User.query.get(get_jwt_identity())
+        if current_user.role not in ['admin']:
+            return jsonify({'error': 'Unauthorized'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        try:
+            ids = target_ids(data, app.config.get('BULK_MAX_FARMERS', 10000))
+        except BulkError as e:
+            return jsonify({'error': str(e)}), 400
+        if not ids:
+            return jsonify({'message': 'No farmers matched', 'deleted': 0}), 200
+        
+        def audit(chunk, count):
+            # Committed with its chunk, so the log matches what was applied
+            log_activity('FARMERS BULK DELETED', 'Farmer', None,
+                         f"Deleted {count} farmers (ids {chunk[0]}..{chunk[-1]})", commit=False)
+
+        def cleanup(deleted_ids, images):
+            search_index.apply(deletes=deleted_ids)
+            invalidate_cache('dashboard', 'mapping')
+            # Unlinking files is slow on network storage; the response does not wait for it
+            threading.Thread(target=lambda: [delete_profile_image(name) for name in images], daemon=True).start()
+
+        try:
+            deleted, images = bulk_delete_farmers(ids, app.config.get('BULK_CHUNK_SIZE', 1000), on_chunk=audit)
+        except BulkChunkError as e:
+            print(f"❌ BULK DELETE ERROR: {e}")
+            cleanup(e.committed_ids, e.images)
+            return jsonify({
+                'error': f'Bulk delete failed: {str(e)}', 'deleted': e.count,
+                'committed_ids': e.committed_ids, 'remaining_ids': ids[len(e.committed_ids):],
+            }), 500
+        
+        cleanup(ids, images)
+        return jsonify({'message': 'Farmers deleted', 'deleted': deleted}), 200
+    
     # ============ Survey Questionnaires Routes ============
     
     @app.route('/api/surveys', methods=['GET'])
     @jwt_required()
+    @conditional_get('survey_questionnaires')
     def get_surveys():
         surveys = SurveyQuestionnaire.query.order_by(SurveyQuestionnaire.created_at.desc()).all()
         return jsonify([s.to_dict() for s in surveys]), 200
@@ -1227,6 +1601,7 @@ def create_app(config_name='development'):
             survey = SurveyQuestionnaire.query.get_or_404(id)
             db.session.delete(survey)
             db.session.commit()
+            invalidate_cache('dashboard')
             return jsonify({'message': 'Survey deleted'}), 200
         except Exception as e:
             db.session.rollback()
@@ -1256,6 +1631,7 @@ def create_app(config_name='development'):
         
         db.session.add(product)
         db.session.commit()
+        invalidate_cache('mapping')
         log_activity('COMMODITY ADDED', 'Farmer', farmer_id, f"Appended new crop yield profile to registry")
         return jsonify({'message': 'Product added successfully', 'product': product.to_dict()}), 201
     
@@ -1263,6 +1639,7 @@ def create_app(config_name='development'):
     
     @app.route('/api/farmers/<int:farmer_id>/children', methods=['POST'])
     @jwt_required()
+    @idempotent
     def add_farmer_child(farmer_id):
         current_user_id = get_jwt_identity()
         current_user = User.query.get(current_user_id)
@@ -1390,6 +1767,7 @@ def create_app(config_name='development'):
         
     @app.route('/api/experiences', methods=['POST'])
     @jwt_required()
+    @idempotent
     def create_experience():
         current_user_id = get_jwt_identity()
         current_user = User.query.get(current_user_id)
@@ -1588,10 +1966,75 @@ def create_app(config_name='development'):
         }), 200
 
     
+    # ============ Background Jobs ============
+
+    @app.route('/api/jobs/<int:id>', methods=['GET'])
+    @jwt_required()
+    def get_job(id):
+        current_user = User.query.get(get_jwt_identity())
+        job = db.session.get(BackgroundJob, id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        if job.created_by != current_user.id and current_user.role != 'admin':
+            return jsonify({'error': 'Unauthorized'}), 403
+        return jsonify(job.to_dict(include_errors=True)), 200
+
+    # ============ Offline Sync Routes ============
+    # Delta sync for field devices, see sync.py
+
+    @app.route('/api/sync/pull', methods=['GET'])
+    @jwt_required()
+    def sync_pull():
+        """Changes after ?since=<seq>, optionally only for ?tables=a,b; follow next_since while has_more."""
+        since = request.args.get('since', 0, type=int)
+        limit = min(max(request.args.get('limit', app.config.get('SYNC_PULL_LIMIT', 500), type=int), 1),
+                    app.config.get('SYNC_PULL_MAX', 2000))
+        tables = [t.strip() for t in request.args.get('tables', '').split(',') if t.strip()]
+        try:
+            return jsonify(pull_changes(since, limit, tables)), 200
+        except SyncError as e:
+            return jsonify({'error': str(e)}), 400
+
+    @app.route('/api/sync/push', methods=['POST'])
+    @jwt_required()
+    @idempotent
+    def sync_push():
+        """
+        {"changes": [{"ref", "table", "op": "create"|"update"|"delete", "id", "base_seq", "data"}]}.
+        Applied in order in one transaction; each change answers applied, conflict or error.
+        """
+        current_user = User.query.get(get_jwt_identity())
+        if current_user.role not in ['admin', 'researcher', 'data_encoder']:
+            return jsonify({'error': 'Unauthorized'}), 403
+        
+        changes = (request.get_json(silent=True) or {}).get('changes')
+        if not isinstance(changes, list) or not changes:
+            return jsonify({'error': 'changes must be a non-empty list'}), 400
+        limit = app.config.get('SYNC_PUSH_MAX', 200)
+        if len(changes) > limit:
+            return jsonify({'error': f'At most {limit} changes per push'}), 400
+        
+        try:
+            results = apply_push(changes, current_user)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ SYNC PUSH ERROR: {e}")
+            return jsonify({'error': f'Push failed: {str(e)}'}), 500
+        fill_seqs(results)
+        
+        applied = sum(1 for r in results if r['status'] == 'applied')
+        if applied:
+            invalidate_cache('dashboard', 'mapping', 'products')
+            log_activity('SYNC PUSH', 'Farmer', None, f"Synced {applied} of {len(results)} offline changes")
+        return jsonify({'results': results}), 200
+
+    
     # ============ Research Projects Routes ============
     
     @app.route('/api/projects', methods=['GET'])
     @jwt_required()
+    @conditional_get('research_projects', 'users', 'organizations')
     def get_projects():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', app.config.get('ITEMS_PER_PAGE', 20), type=int)
@@ -1652,6 +2095,8 @@ def create_app(config_name='development'):
     
     @app.route('/api/barangays', methods=['GET', 'POST'])
     @jwt_required()
+    @conditional_get('barangays')
+    @response_cache.cached('barangays')
     def manage_barangays():
         if request.method == 'GET':
             barangays = Barangay.query.order_by(Barangay.name).all()
@@ -1678,6 +2123,7 @@ def create_app(config_name='development'):
         
         db.session.add(barangay)
         db.session.commit()
+        invalidate_cache('barangays', 'mapping')
         
         log_activity('BARANGAY CREATED', 'Barangay', barangay.id, f"Added territory: {barangay.name}")
         broadcast_notification("Geographic Registry", f"New territory '{barangay.name}' added to mapping.")
@@ -1685,6 +2131,7 @@ def create_app(config_name='development'):
     
     @app.route('/api/mapping/demographics', methods=['GET'])
     @jwt_required()
+    @response_cache.cached('mapping', coalesce=True)
     def get_map_demographics():
         try:
             # Safely get all barangays
@@ -1746,6 +2193,7 @@ def create_app(config_name='development'):
     
     @app.route('/api/organizations', methods=['GET'])
     @jwt_required()
+    @response_cache.cached('organizations')
     def get_organizations():
         organizations = Organization.query.order_by(Organization.name).all()
         return jsonify([o.to_dict() for o in organizations]), 200
@@ -1754,6 +2202,8 @@ def create_app(config_name='development'):
     
     @app.route('/api/products', methods=['GET'])
     @jwt_required()
+    @conditional_get('agricultural_products')
+    @response_cache.cached('products')
     def get_products():
         products = AgriculturalProduct.query.order_by(AgriculturalProduct.name).all()
         return jsonify([p.to_dict() for p in products]), 200
@@ -1777,6 +2227,7 @@ def create_app(config_name='development'):
         
         db.session.add(product)
         db.session.commit()
+        invalidate_cache('products')
         log_activity('PRODUCT CREATED', 'Agricultural Product', product.id, f"Added commodity: {product.name}")
         return jsonify({'message': 'Product created successfully', 'product': product.to_dict()}), 201
     
@@ -1796,7 +2247,10 @@ def create_app(config_name='development'):
         try:
             # Check for duplicate name if name is changing
             if 'name' in data and data['name'] != product.name:
-                if AgriculturalProduct.query.filter(func.lower(AgriculturalProduct.name) == func.lower(data['name'])).first():
+                if AgriculturalProduct.query.filter(
+                    AgriculturalProduct.name_key == AgriculturalProduct.make_name_key(data['name']),
+                    AgriculturalProduct.id != product.id
+                ).first():
                     return jsonify({'error': 'Product name already exists'}), 400
 
             if 'name' in data: product.name = data['name']
@@ -1804,6 +2258,7 @@ def create_app(config_name='development'):
             if 'description' in data: product.description = data['description']
             
             db.session.commit()
+            invalidate_cache('products', 'mapping')
             return jsonify({'message': 'Product updated successfully', 'product': product.to_dict()}), 200
         except Exception as e:
             db.session.rollback()
@@ -1822,6 +2277,7 @@ def create_app(config_name='development'):
             product = AgriculturalProduct.query.get_or_404(id)
             db.session.delete(product)
             db.session.commit()
+            invalidate_cache('products', 'dashboard', 'mapping')
             return jsonify({'message': 'Product deleted successfully'}), 200
         except Exception as e:
             db.session.rollback()
@@ -1834,7 +2290,11 @@ def create_app(config_name='development'):
     @jwt_required()
     def export_farmers():
         try:
-            farmers = Farmer.query.all()
+            # Same filters as the farmer list, so analysts can export just the slice they need
+            try:
+                farmers = apply_farmer_filters(Farmer.query, request.args).options(joinedload(Farmer.barangay)).all()
+            except FilterError as e:
+                return jsonify({'error': str(e)}), 400
             
             output = io.StringIO()
             writer = csv.writer(output)
@@ -1988,9 +2448,70 @@ def create_app(config_name='development'):
             'current_page': page
         }), 200
     
+    # ============ Cache Metrics Routes ============
+
+    @app.route('/api/cache/stats', methods=['GET'])
+    @jwt_required()
+    def get_cache_stats():
+        current_user = User.query.get(get_jwt_identity())
+        if current_user.role not in ['admin']:
+            return jsonify({'error': 'Unauthorized'}), 403
+        return jsonify(response_cache.stats()), 200
+
+    @app.route('/api/scheduler/stats', methods=['GET'])
+    @jwt_required()
+    def get_scheduler_stats():
+        current_user = User.query.get(get_jwt_identity())
+        if current_user.role not in ['admin']:
+            return jsonify({'error': 'Unauthorized'}), 403
+        return jsonify(scheduler.stats()), 200
+
+    # ============ Background Jobs ============
+
+    refresh = app.config.get('SCHEDULER_REFRESH_SECONDS', 50)
+
+    # With a shared cache directory the warmed entries serve every worker and
+    # only what a write invalidated (or what is about to expire) is
+    # recomputed; without one each run refreshes the scheduler worker's own
+    # LRU in full (the only worker with the default single-worker gunicorn)
+    min_ttl = refresh + app.config.get('SCHEDULER_JITTER_SECONDS', 5) if response_cache.shared_dir else None
+
+    def warm(*paths):
+        for path in paths:
+            response_cache.warm(app, path, min_ttl=min_ttl)
+
+    scheduler.add_job('reconcile_analytics', analytics.reconcile_if_due,
+                      interval=app.config.get('DASHBOARD_SUMMARY_RECONCILE_SECONDS', 900))
+    # Sketches marked stale by updates/deletes are rebuilt here, never from a GET
+    scheduler.add_job('rebuild_sketches', analytics.rebuild_stale_sketches, interval=refresh)
+    scheduler.add_job('warm_dashboard', lambda: warm(
+        '/api/dashboard/stats?range=all', '/api/dashboard/stats?range=month', '/api/dashboard/stats?range=year'
+    ), interval=refresh)
+    scheduler.add_job('warm_mapping', lambda: warm('/api/mapping/demographics'), interval=refresh)
+    scheduler.add_job('warm_reference', lambda: warm(
+        '/api/barangays', '/api/organizations', '/api/products'
+    ), interval=refresh)
+    scheduler.add_job('purge_idempotency_keys', purge_expired_keys,
+                      interval=app.config.get('IDEMPOTENCY_PURGE_INTERVAL_SECONDS', 3600))
+    scheduler.add_job('purge_change_log', purge_change_log, interval=86400)
+
+    if not bootstrap:
+        return app
+
     # Initialize DB tables if they don't exist
     with app.app_context():
-        db.create_all()
+        create_tables()
+        ensure_columns()
+        ensure_indexes()
+        backfill_sort_names()
+        backfill_product_name_keys()
+        backfill_row_versions()
+        ensure_version_rows()
+        # Reads never reconcile; without the scheduler the drift check runs once here
+        if not scheduler.enabled:
+            analytics.reconcile_if_due()
+
+    scheduler.start()
 
     return app
 
@@ -0,0 +1,152 @@
+"""
+Dashboard benchmark: round trips and p50/p99 latency of /api/dashboard/stats,
+legacy per-metric queries vs the combined aggregation in analytics.py.
+
+Usage:
+    python bench_dashboard.py --sqlite 5000       # throwaway SQLite with 5000 farmers
+    python bench_dashboard.py --sqlite 5000 --latency-ms 40   # emulate a remote DB
+    python bench_dashboard.py --database-url mysql+pymysql://user:pw@host/db
+
+An existing database is only read: the app is built without creating or
+altering tables, without backfills and without starting the scheduler, and
+it must be named explicitly (never the configured default).
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--sqlite', type=int, metavar='N', help='seed a temporary SQLite database with N farmers')
+parser.add_argument('--database-url', help='benchmark an existing database (read only)')
+parser.add_argument('--latency-ms', type=float, default=0.0, help='artificial delay added to every round trip')
+parser.add_argument('--iterations', type=int, default=50)
+parser.add_argument('--range', dest='time_range', default='all', choices=['all', 'month', 'year'])
+args = parser.parse_args()
+if bool(args.sqlite) == bool(args.database_url):
+    parser.error('pass exactly one of --sqlite N or --database-url URL')
+
+if args.sqlite:
+    os.environ['DEV_DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+else:
+    os.environ['DEV_DATABASE_URL'] = args.database_url
+
+from app import create_app
+from analytics import compute_dashboard_stats, range_start
+from models import (
+    db, User, Barangay, AgriculturalProduct, Farmer, FarmerChild,
+    FarmerExperience, ResearchProject, SurveyQuestionnaire, ActivityLog
+)
+
+app = create_app(bootstrap=False)
+
+
+def legacy_dashboard_stats(start_date=None):
+    """The pre-aggregation implementation, kept here as the baseline."""
+    def apply_date_filter(query, model):
+        if start_date and hasattr(model, 'created_at'):
+            return query.filter(model.created_at >= start_date)
+        return query
+
+    total_farmers = apply_date_filter(Farmer.query, Farmer).count()
+    total_barangays = Barangay.query.count() or 0
+    total_products = AgriculturalProduct.query.count() or 0
+    total_experiences = apply_date_filter(FarmerExperience.query, FarmerExperience).count() or 0
+    total_projects = apply_date_filter(ResearchProject.query, ResearchProject).count() or 0
+    children_farming = FarmerChild.query.filter_by(continues_farming=True).count() or 0
+    total_children = FarmerChild.query.count() or 0
+    total_users = User.query.count() or 0
+    total_surveys = SurveyQuestionnaire.query.count() or 0
+
+    edu_query = db.session.query(Farmer.education_level, func.count(Farmer.id))
+    if start_date:
+        edu_query = edu_query.filter(Farmer.created_at >= start_date)
+    education_stats = [{'level': (l or "Unknown"), 'count': c} for l, c in edu_query.group_by(Farmer.education_level).all()]
+
+    prod_stats_query = db.session.query(Barangay.name, func.count(Farmer.id)).join(Farmer, Barangay.id == Farmer.barangay_id)
+    if start_date:
+        prod_stats_query = prod_stats_query.filter(Farmer.created_at >= start_date)
+    product_stats = [{'barangay': n, 'count': c} for n, c in prod_stats_query.group_by(Barangay.name).order_by(func.count(Farmer.id).desc()).all()]
+
+    apply_date_filter(db.session.query(func.avg(Farmer.age)), Farmer).scalar()
+    apply_date_filter(db.session.query(func.avg(Farmer.annual_income)), Farmer).scalar()
+    apply_date_filter(db.session.query(func.avg(Farmer.farm_size_hectares)), Farmer).scalar()
+
+    recent = ActivityLog.query.order_by(ActivityLog.created_at.desc()).limit(10).all()
+    return [log.to_dict() for log in recent], total_farmers, total_barangays, total_products, \
+        total_experiences, total_projects, children_farming, total_children, education_stats, product_stats
+
+
+def seed(n):
+    print(f"🌱 Seeding {n} synthetic farmers...")
+    db.create_all()
+    levels = ['Elementary', 'High School', 'College', 'Vocational', 'None']
+    user = User(username='bench', email='bench@example.com', full_name='Bench User', role='admin')
+    user.set_password('bench')
+    db.session.add(user)
+    barangays = [Barangay(name=f'Barangay {i}', municipality='San Pablo', province='Laguna', region='IV-A') for i in range(40)]
+    db.session.add_all(barangays)
+    db.session.flush()
+    now = datetime.utcnow()
+    for i in range(n):
+        farmer = Farmer(
+            farmer_code=f'B-{i:06d}', first_name=f'First{i}', last_name=f'Last{i}', age=random.randint(18, 85),
+            gender=random.choice(['Male', 'Female']), barangay_id=random.choice(barangays).id,
+            education_level=random.choice(levels), annual_income=random.randint(10000, 500000),
+            farm_size_hectares=round(random.uniform(0.1, 10), 2), years_farming=random.randint(0, 60),
+            created_at=now - timedelta(days=random.randint(0, 1000))
+        )
+        db.session.add(farmer)
+        if i % 3 == 0:
+            farmer.children.append(FarmerChild(name=f'Child{i}', continues_farming=random.random() < 0.3))
+    for i in range(30):
+        db.session.add(ActivityLog(user_id=user.id, action='BENCH', entity_type='Farmer', entity_id=str(i)))
+    db.session.commit()
+
+
+def measure(label, fn):
+    engine = db.engine
+    counter = {'n': 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['n'] += 1
+        if args.latency_ms:
+            time.sleep(args.latency_ms / 1000.0)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        timings = []
+        round_trips = []
+        for _ in range(args.iterations):
+            db.session.expire_all()
+            counter['n'] = 0
+            t0 = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - t0) * 1000)
+            round_trips.append(counter['n'])
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    timings.sort()
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(round(0.99 * (len(timings) - 1))))]
+    # Steady state; the first call can add one-off work (e.g. the inline drift check)
+    trips = int(statistics.median(round_trips))
+    print(f"{label:<12} round trips: {trips:>3} (max {max(round_trips)})   p50: {p50:8.2f} ms   p99: {p99:8.2f} ms")
+    return p50
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if args.sqlite:
+            seed(args.sqlite)
+        start_date = range_start(args.time_range)
+        print(f"📊 /api/dashboard/stats range={args.time_range}, {args.iterations} iterations, +{args.latency_ms} ms/round trip")
+        before = measure('legacy', lambda: legacy_dashboard_stats(start_date))
+        after = measure('combined', lambda: compute_dashboard_stats(start_date))
+        print(f"speedup (p50): {before / after:.1f}x")
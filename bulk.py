@@ -0,0 +1,180 @@
+from datetime import datetime
+
+from sqlalchemy import select, update, delete
+from werkzeug.datastructures import MultiDict
+
+from analytics import farmer_contributions, apply_farmer_contributions
+from models import (
+    db, Barangay, Organization, Farmer, FarmerProduct, FarmerChild, FarmerExperience, ExperienceComment,
+    experience_likes, comment_likes,
+)
+from filters import apply_farmer_filters, FILTER_ARGS, FilterError
+
+# ============ Bulk Farmer Operations ============
+# Reassigning or purging many farmers used to take one PUT/DELETE request per
+# farmer. The bulk endpoints pick their targets by explicit ids or by the
+# farmer-list filters (filters.py), then run set-based UPDATE/DELETE
+# statements over chunks of BULK_CHUNK_SIZE ids, committing each chunk so row
+# locks stay short. Each chunk commits together with its own audit entry
+# (on_chunk); if a chunk fails, BulkChunkError reports the ids the earlier
+# chunks already committed, so the caller can resubmit just the rest.
+#
+# These statements bypass the ORM flush hooks. Data versions (and therefore
+# ETags and the profile cache) are still bumped by the do_orm_execute hook;
+# each chunk moves the dashboard summary, rollups and sketches by the
+# affected farmers' before/after contribution (analytics.py) in its own
+# transaction.
+
+# Columns a bulk update may set -> validator for the new value
+BULK_UPDATE_FIELDS = {
+    'barangay_id': Barangay,
+    'organization_id': Organization,
+    'land_ownership': None,
+    'primary_occupation': None,
+    'secondary_occupation': None,
+    'income_source': None,
+}
+
+
+class BulkError(ValueError):
+    pass
+
+
+class BulkChunkError(Exception):
+    """A chunk failed; the chunks before it stay committed."""
+
+    def __init__(self, cause, committed_ids, count, images=()):
+        super().__init__(str(cause))
+        self.committed_ids = committed_ids
+        self.count = count
+        self.images = list(images)
+
+
+def target_ids(data, limit):
+    """Farmer ids selected by {"ids": [...]} or {"filters": {...}} (never the whole table by accident)."""
+    ids = data.get('ids')
+    filters = data.get('filters')
+    if bool(ids) == bool(filters):
+        raise BulkError('Provide either ids or filters')
+    if ids:
+        if not isinstance(ids, list):
+            raise BulkError('ids must be a list')
+        try:
+            ids = sorted({int(i) for i in ids})
+        except (ValueError, TypeError):
+            raise BulkError('ids must be integers')
+        found = list(db.session.execute(select(Farmer.id).where(Farmer.id.in_(ids))).scalars()) if ids else []
+    else:
+        if not isinstance(filters, dict):
+            raise BulkError('filters must be an object')
+        unknown = [k for k in filters if k not in FILTER_ARGS]
+        if unknown:
+            raise BulkError(f"Unknown filters: {', '.join(unknown)}")
+        args = MultiDict([(k, ','.join(map(str, v)) if isinstance(v, list) else str(v)) for k, v in filters.items()])
+        try:
+            query = apply_farmer_filters(Farmer.query, args)
+        except FilterError as e:
+            raise BulkError(str(e))
+        found = [farmer_id for (farmer_id,) in query.with_entities(Farmer.id).all()]
+    if len(found) > limit:
+        raise BulkError(f'{len(found)} farmers match; at most {limit} per request')
+    return sorted(found)
+
+
+def update_values(changes):
+    """Validated {column: value} for a bulk update."""
+    if not isinstance(changes, dict) or not changes:
+        raise BulkError('set must be a non-empty object')
+    unknown = [k for k in changes if k not in BULK_UPDATE_FIELDS]
+    if unknown:
+        raise BulkError(f"Cannot bulk-update: {', '.join(unknown)}. Allowed: {', '.join(BULK_UPDATE_FIELDS)}")
+    values = {}
+    for column, value in changes.items():
+        model = BULK_UPDATE_FIELDS[column]
+        if model is not None and value is not None:
+            try:
+                value = int(value)
+            except (ValueError, TypeError):
+                raise BulkError(f'{column} must be an id')
+            if db.session.get(model, value) is None:
+                raise BulkError(f'{column} {value} does not exist')
+        if column == 'barangay_id' and value is None:
+            raise BulkError('barangay_id is required')
+        values[column] = value
+    return values
+
+
+def _chunks(ids, size):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def bulk_update_farmers(ids, values, chunk_size=1000, on_chunk=None):
+    """
+    UPDATE farmers SET ... WHERE id IN (chunk), one commit per chunk; returns
+    rows updated. on_chunk(chunk, rowcount) runs in each chunk's transaction.
+    """
+    updated = 0
+    committed = []
+    for chunk in _chunks(ids, chunk_size):
+        try:
+            connection = db.session.connection()
+            before = farmer_contributions(connection, chunk, -1)
+            result = db.session.execute(
+                update(Farmer).where(Farmer.id.in_(chunk))
+                .values(**values, updated_at=datetime.utcnow(), row_version=Farmer.row_version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            apply_farmer_contributions(connection, before, farmer_contributions(connection, chunk, 1))
+            if on_chunk is not None:
+                on_chunk(chunk, result.rowcount)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise BulkChunkError(e, committed, updated) from e
+        updated += result.rowcount
+        committed.extend(chunk)
+    return updated
+
+
+def bulk_delete_farmers(ids, chunk_size=1000, on_chunk=None):
+    """
+    Delete farmers and everything hanging off them, one commit per chunk.
+    Returns (rows deleted, profile image filenames to remove). on_chunk(chunk,
+    rowcount) runs in each chunk's transaction.
+    """
+    deleted = 0
+    images = []
+    committed = []
+    for chunk in _chunks(ids, chunk_size):
+        try:
+            chunk_images = list(db.session.execute(
+                select(Farmer.profile_image).where(Farmer.id.in_(chunk), Farmer.profile_image.isnot(None))
+            ).scalars())
+            before = farmer_contributions(db.session.connection(), chunk, -1)
+            experiences = select(FarmerExperience.id).where(FarmerExperience.farmer_id.in_(chunk))
+            comments = select(ExperienceComment.id).where(ExperienceComment.experience_id.in_(experiences))
+            # Children first: the ON DELETE CASCADE keys are not enforced on every backend (SQLite)
+            for stmt in (
+                delete(comment_likes).where(comment_likes.c.comment_id.in_(comments)),
+                delete(ExperienceComment).where(ExperienceComment.experience_id.in_(experiences)),
+                delete(experience_likes).where(experience_likes.c.experience_id.in_(experiences)),
+                delete(FarmerExperience).where(FarmerExperience.farmer_id.in_(chunk)),
+                delete(FarmerChild).where(FarmerChild.farmer_id.in_(chunk)),
+                delete(FarmerProduct).where(FarmerProduct.farmer_id.in_(chunk)),
+            ):
+                db.session.execute(stmt.execution_options(synchronize_session=False))
+            result = db.session.execute(
+                delete(Farmer).where(Farmer.id.in_(chunk)).execution_options(synchronize_session=False)
+            )
+            apply_farmer_contributions(db.session.connection(), before)
+            if on_chunk is not None:
+                on_chunk(chunk, result.rowcount)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise BulkChunkError(e, committed, deleted, images) from e
+        deleted += result.rowcount
+        committed.extend(chunk)
+        images.extend(chunk_images)
+    return deleted, images
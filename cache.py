@@ -0,0 +1,408 @@
+import os
+import time
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import request, current_app, Response
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: cross-worker locking degrades to per-worker
+    fcntl = None
+
+# ============ Response Cache ============
+# Reference data and dashboard aggregates are identical for every user until
+# somebody writes. Responses are cached per worker in an LRU with a TTL and,
+# optionally, in a directory shared by all workers on the host
+# (RESPONSE_CACHE_DIR). Every entry remembers the version of each tag it
+# depends on; write handlers call invalidate('<tag>') which bumps the tag so
+# dependent entries stop matching in every worker.
+#
+# Tag versions must be visible to every worker and every instance, or the
+# workers that did not make the write keep serving stale entries until the
+# TTL. The app passes a tag_store that keeps them in the database (see
+# versions.SharedTagVersions); without one they live in RESPONSE_CACHE_DIR,
+# or in process memory, which is only correct with a single worker.
+#
+# Expensive views can also opt into request coalescing (coalesce=True): on a
+# miss, concurrent identical requests inside a worker share one computation
+# (SingleFlight), and across workers a file lock lets one worker recompute
+# while the others serve the stale entry or wait for the fresh one.
+
+
+class SingleFlight:
+    """Concurrent calls with the same key within this process share one result."""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Returns (result, shared) where shared is True for callers that waited on another."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+
+class FileLock:
+    """Advisory lock on a local file, shared by every worker process on the host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = None
+
+    def acquire(self, blocking=True, timeout=None):
+        if fcntl is None:
+            return True
+        self._fh = open(self.path, 'a')
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(self._fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                    self._fh.close()
+                    self._fh = None
+                    return False
+                time.sleep(0.05)
+
+    def release(self):
+        if self._fh is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+
+
+class ResponseCache:
+    def __init__(self, app=None):
+        self.ttl = 60
+        self.max_entries = 256
+        self.shared_dir = None
+        self.lock_dir = None
+        self.lock_wait = 30
+        self._flight = SingleFlight()
+        self._entries = OrderedDict()
+        self._tag_versions = {}
+        self.tag_store = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0,
+            'coalesced': 0, 'stale_served': 0, 'lock_waits': 0
+        }
+        self._endpoint_stats = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, tag_store=None):
+        """tag_store: object with versions(tags) -> {tag: version} and bump(tags), shared by all workers."""
+        self.tag_store = tag_store
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+        self.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', self.max_entries)
+        self.shared_dir = app.config.get('RESPONSE_CACHE_DIR') or None
+        if self.shared_dir:
+            os.makedirs(os.path.join(self.shared_dir, 'entries'), exist_ok=True)
+            os.makedirs(os.path.join(self.shared_dir, 'tags'), exist_ok=True)
+        if app.config.get('SINGLE_FLIGHT_CROSS_WORKER', True):
+            self.lock_dir = app.config.get('SINGLE_FLIGHT_LOCK_DIR') or \
+                os.path.join(self.shared_dir or tempfile.gettempdir(), 'agridata-locks')
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self.lock_wait = app.config.get('SINGLE_FLIGHT_WAIT_SECONDS', self.lock_wait)
+        app.extensions['response_cache'] = self
+
+    # --- Keys & tags ---
+
+    @staticmethod
+    def make_key(endpoint, args):
+        """Endpoint plus query args, sorted so ?a=1&b=2 and ?b=2&a=1 share an entry."""
+        items = sorted((k, v) for k, values in args.lists() for v in values) if hasattr(args, 'lists') \
+            else sorted(args.items())
+        return f"{endpoint}?{urlencode(items)}"
+
+    def _tag_path(self, tag):
+        return os.path.join(self.shared_dir, 'tags', hashlib.sha1(tag.encode()).hexdigest())
+
+    def _entry_path(self, key):
+        return os.path.join(self.shared_dir, 'entries', hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def tag_version(self, tag):
+        if self.tag_store is not None:
+            return self.tag_store.versions([tag])[tag]
+        if self.shared_dir:
+            try:
+                with open(self._tag_path(tag)) as fh:
+                    return fh.read().strip() or '0'
+            except FileNotFoundError:
+                return '0'
+        return str(self._tag_versions.get(tag, 0))
+
+    def _snapshot(self, tags):
+        if self.tag_store is not None:
+            return self.tag_store.versions(tags) if tags else {}
+        return {tag: self.tag_version(tag) for tag in tags}
+
+    def invalidate(self, *tags):
+        """Bump the given tags; every entry depending on one of them goes stale."""
+        if self.tag_store is not None and tags:
+            self.tag_store.bump(tags)
+        for tag in tags:
+            if self.shared_dir and self.tag_store is None:
+                path = self._tag_path(tag)
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+                with open(tmp, 'w') as fh:
+                    fh.write(str(time.time_ns()))
+                os.replace(tmp, path)
+            with self._lock:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+                self._stats['invalidations'] += 1
+
+    # --- Entries ---
+
+    def _valid(self, entry):
+        return entry['expires'] > time.time() and entry['tags'] == self._snapshot(entry['tags'])
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None and self._valid(entry):
+            return entry
+
+        if self.shared_dir:
+            try:
+                with open(self._entry_path(key)) as fh:
+                    entry = json.load(fh)
+            except (FileNotFoundError, ValueError):
+                entry = None
+            if entry is not None and entry.get('key') == key and self._valid(entry):
+                self._store_local(key, entry)
+                return entry
+        return None
+
+    def get_stale(self, key):
+        """Most recent entry for key even if expired or invalidated, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.shared_dir:
+            try:
+                with open(self._entry_path(key)) as fh:
+                    entry = json.load(fh)
+            except (FileNotFoundError, ValueError):
+                entry = None
+            if entry is not None and entry.get('key') != key:
+                entry = None
+        return entry
+
+    def _store_local(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set(self, key, tags, body, status=200, mimetype='application/json', ttl=None, tag_versions=None):
+        entry = {
+            'key': key,
+            'expires': time.time() + (ttl or self.ttl),
+            'tags': tag_versions if tag_versions is not None else self._snapshot(tags),
+            'status': status,
+            'mimetype': mimetype,
+            'body': body,
+        }
+        self._store_local(key, entry)
+        if self.shared_dir:
+            path = self._entry_path(key)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+            with open(tmp, 'w') as fh:
+                json.dump(entry, fh)
+            os.replace(tmp, path)
+        with self._lock:
+            self._stats['stores'] += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # --- Metrics ---
+
+    def _count(self, endpoint, outcome):
+        with self._lock:
+            self._stats[outcome] += 1
+            per = self._endpoint_stats.setdefault(endpoint, {'hits': 0, 'misses': 0})
+            per[outcome] = per.get(outcome, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_ratio': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'shared_backend': bool(self.shared_dir),
+                'endpoints': {k: dict(v) for k, v in self._endpoint_stats.items()},
+            }
+
+    # --- View decorator ---
+
+    @staticmethod
+    def _response(entry, outcome):
+        res = Response(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+        res.headers['X-Cache'] = outcome
+        return res
+
+    def _lock_for(self, key):
+        if not self.lock_dir:
+            return None
+        return FileLock(os.path.join(self.lock_dir, hashlib.sha1(key.encode()).hexdigest() + '.lock'))
+
+    @staticmethod
+    def _resolve(tags, kwargs):
+        """Tags may be callables of the view arguments, e.g. lambda id: f'farmer:{id}'."""
+        return tuple(tag(**kwargs) if callable(tag) else tag for tag in tags)
+
+    # Set by versions.conditional_get when it wraps a cached view. Keying the
+    # entry by the ETag means a body is only ever served with the ETag of the
+    # data versions it was built from, never with a newer one.
+    ETAG_ENVIRON_KEY = 'response_cache.etag'
+
+    @classmethod
+    def request_key(cls):
+        key = cls.make_key(request.endpoint, request.args)
+        if request.view_args:
+            key += '|' + urlencode(sorted(request.view_args.items()))
+        etag = request.environ.get(cls.ETAG_ENVIRON_KEY)
+        if etag:
+            key += '|etag=' + etag
+        return key
+
+    def _compute(self, key, tags, ttl, fn, args, kwargs):
+        tags = self._resolve(tags, kwargs)
+        versions = self._snapshot(tags)
+        res = current_app.make_response(fn(*args, **kwargs))
+        entry = {'status': res.status_code, 'mimetype': res.mimetype, 'body': res.get_data(as_text=True)}
+        if res.status_code == 200 and res.mimetype == 'application/json':
+            entry = self.set(key, tags, entry['body'], ttl=ttl, tag_versions=versions)
+        return entry, 'MISS'
+
+    def _compute_across_workers(self, key, tags, ttl, fn, args, kwargs):
+        """One worker recomputes; the others serve stale data or wait for its result."""
+        lock = self._lock_for(key)
+        if lock is None:
+            return self._compute(key, tags, ttl, fn, args, kwargs)
+
+        if not lock.acquire(blocking=False):
+            stale = self.get_stale(key)
+            if stale is not None:
+                self._count(request.endpoint, 'stale_served')
+                return stale, 'STALE'
+            self._count(request.endpoint, 'lock_waits')
+            acquired = lock.acquire(timeout=self.lock_wait)
+        else:
+            acquired = True
+
+        try:
+            # Another worker may have finished the same computation meanwhile
+            entry = self.get(key)
+            if entry is not None:
+                return entry, 'HIT'
+            return self._compute(key, tags, ttl, fn, args, kwargs)
+        finally:
+            if acquired:
+                lock.release()
+
+    def cached(self, *tags, ttl=None, coalesce=False):
+        """
+        Cache successful GET responses of a view under the given tags.
+        A tag can be a callable of the view's URL arguments for per-object entries.
+        Place it below @jwt_required() so authentication still runs.
+        coalesce=True adds single-flight recomputation for expensive views.
+        """
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return fn(*args, **kwargs)
+
+                key = self.request_key()
+                entry = self.get(key)
+                if entry is not None:
+                    self._count(request.endpoint, 'hits')
+                    return self._response(entry, 'HIT')
+
+                self._count(request.endpoint, 'misses')
+                if not coalesce:
+                    entry, outcome = self._compute(key, tags, ttl, fn, args, kwargs)
+                    return self._response(entry, outcome)
+
+                (entry, outcome), shared = self._flight.do(
+                    key, lambda: self._compute_across_workers(key, tags, ttl, fn, args, kwargs)
+                )
+                if shared:
+                    self._count(request.endpoint, 'coalesced')
+                    outcome = 'COALESCED'
+                return self._response(entry, outcome)
+
+            def refresh(*args, **kwargs):
+                """Recompute and store the entry for the current request (cache warmup)."""
+                key = self.request_key()
+                entry, _ = self._compute(key, tags, ttl, fn, args, kwargs)
+                return entry
+
+            wrapper.refresh = refresh
+            return wrapper
+        return decorator
+
+    def warm(self, app, path, min_ttl=None):
+        """
+        Recompute the cached GET response for path outside of a real request.
+        With min_ttl, an entry still valid for more than min_ttl seconds is
+        left as it is.
+        """
+        with app.test_request_context(path, method='GET'):
+            view = app.view_functions[request.endpoint]
+            while not hasattr(view, 'refresh'):
+                view = view.__wrapped__  # step through @jwt_required() and friends
+            if hasattr(view, 'prepare_refresh'):
+                view.prepare_refresh()  # @conditional_get keys the entry by its ETag
+            if min_ttl is not None:
+                entry = self.get(self.request_key())
+                if entry is not None and entry['expires'] - time.time() > min_ttl:
+                    return entry
+            return view.refresh(**(request.view_args or {}))
+
+
+response_cache = ResponseCache()
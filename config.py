@@ -28,6 +28,79 @@ class Config:
     # Pagination
     ITEMS_PER_PAGE = 20
 
+    # Dashboard summary table: seconds between drift checks against raw tables
+    DASHBOARD_SUMMARY_RECONCILE_SECONDS = int(os.environ.get('DASHBOARD_SUMMARY_RECONCILE_SECONDS', 900))
+
+    # Response cache (cache.py): per-worker LRU with TTL, plus an optional
+    # directory shared by all workers on the host for entries. Tag versions
+    # are always kept in the database (data_versions)
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 256))
+    RESPONSE_CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR')
+
+    # Single-flight recomputation of expensive cached views: one worker holds
+    # a file lock while it recomputes, the others serve stale data or wait
+    SINGLE_FLIGHT_CROSS_WORKER = os.environ.get('SINGLE_FLIGHT_CROSS_WORKER', 'true').lower() == 'true'
+    SINGLE_FLIGHT_LOCK_DIR = os.environ.get('SINGLE_FLIGHT_LOCK_DIR')
+    SINGLE_FLIGHT_WAIT_SECONDS = int(os.environ.get('SINGLE_FLIGHT_WAIT_SECONDS', 30))
+
+    # Background scheduler (scheduler.py): one worker per host warms the
+    # dashboard, mapping and reference caches at boot and every
+    # SCHEDULER_REFRESH_SECONDS, and runs the analytics drift check and
+    # sketch rebuilds. Keep the refresh below RESPONSE_CACHE_TTL so warm
+    # entries never expire. With RESPONSE_CACHE_DIR set every worker serves
+    # what the scheduler warmed, and only invalidated or expiring entries are
+    # recomputed; without it only the scheduler's worker is warmed.
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+    SCHEDULER_REFRESH_SECONDS = int(os.environ.get('SCHEDULER_REFRESH_SECONDS', 50))
+    SCHEDULER_JITTER_SECONDS = int(os.environ.get('SCHEDULER_JITTER_SECONDS', 5))
+    SCHEDULER_LOCK_FILE = os.environ.get('SCHEDULER_LOCK_FILE')
+
+    # In-process farmer search index (search.py). Each search checks the
+    # 'farmers' data version at most every SEARCH_INDEX_SYNC_SECONDS to pick
+    # up other workers' writes; 0 checks every time, which keeps results in
+    # step with the /api/farmers ETag
+    SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX_ENABLED', 'true').lower() == 'true'
+    SEARCH_INDEX_SYNC_SECONDS = int(os.environ.get('SEARCH_INDEX_SYNC_SECONDS', 0))
+    # Searches matching up to this many farmers filter on their ids in SQL
+    # (IN list); larger ones are paged from the ranked list in Python
+    SEARCH_IN_LIST_MAX = int(os.environ.get('SEARCH_IN_LIST_MAX', 500))
+    # /api/farmers/suggest answers from memory and re-checks the data version
+    # (one primary-key lookup) at most this often
+    SUGGEST_SYNC_SECONDS = int(os.environ.get('SUGGEST_SYNC_SECONDS', 10))
+
+    # /api/farmers?count=approx may reuse a cached total this many seconds old
+    COUNT_CACHE_SECONDS = int(os.environ.get('COUNT_CACHE_SECONDS', 60))
+
+    # Most ids accepted by one POST /api/farmers/batch-get
+    FARMER_BATCH_MAX = int(os.environ.get('FARMER_BATCH_MAX', 500))
+
+    # POST /api/farmers/import: rows inserted per transaction (a form field can
+    # pick another size up to the max) and rejected rows kept in the job report
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 200))
+    IMPORT_MAX_BATCH_SIZE = int(os.environ.get('IMPORT_MAX_BATCH_SIZE', 1000))
+    JOB_MAX_ERRORS = int(os.environ.get('JOB_MAX_ERRORS', 500))
+
+    # /api/farmers/bulk-update and bulk-delete: most farmers per request and
+    # ids per UPDATE/DELETE statement (each chunk is its own transaction)
+    BULK_MAX_FARMERS = int(os.environ.get('BULK_MAX_FARMERS', 10000))
+    BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 1000))
+
+    # Idempotency-Key on create endpoints: how long a stored response is
+    # replayed, how long an unfinished claim may go without a heartbeat
+    # before it is taken over, and how often expired records are purged
+    IDEMPOTENCY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', 24))
+    IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 60))
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS = int(os.environ.get('IDEMPOTENCY_PURGE_INTERVAL_SECONDS', 3600))
+
+    # /api/sync: default and largest pull page (change log entries), most
+    # changes per push, and how long the change log is kept (clients further
+    # behind are told to re-download)
+    SYNC_PULL_LIMIT = int(os.environ.get('SYNC_PULL_LIMIT', 500))
+    SYNC_PULL_MAX = int(os.environ.get('SYNC_PULL_MAX', 2000))
+    SYNC_PUSH_MAX = int(os.environ.get('SYNC_PUSH_MAX', 200))
+    SYNC_RETENTION_DAYS = int(os.environ.get('SYNC_RETENTION_DAYS', 90))
+
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
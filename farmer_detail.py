@@ -0,0 +1,132 @@
+from itertools import chain
+
+from sqlalchemy import select, event, inspect
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from cache import response_cache
+from models import (
+    User, Barangay, Organization, AgriculturalProduct, Farmer, FarmerProduct, FarmerChild,
+    FarmerExperience, ExperienceComment,
+)
+
+# ============ Farmer Detail ============
+# The profile page needs the farmer plus products, children and experiences
+# with their likes and comments. Lazy loading that graph costs one query per
+# product, experience and comment; load_farmer_aggregate() fetches it with a
+# fixed set of queries (farmer + barangay + organization in one join, then one
+# SELECT ... IN per collection) however large the profile is.
+#
+# The serialized profile is cached per farmer (tag 'farmer:<id>'). Writes to
+# the farmer, its products, children, experiences or comments invalidate that
+# farmer's tag after their transaction commits. Changes to shared rows that
+# appear in every profile (users, barangays, organizations, products) and
+# bulk UPDATE/DELETE statements invalidate all profiles ('farmer_details').
+
+DETAIL_TAG = 'farmer_details'
+# Shared rows -> attributes shown in a profile (None: any column)
+_SHARED = {User: ('full_name',), Barangay: None, Organization: None, AgriculturalProduct: ('name',)}
+_AGGREGATE_TABLES = {
+    m.__tablename__ for m in (Farmer, FarmerProduct, FarmerChild, FarmerExperience, ExperienceComment)
+} | {'experience_likes', 'comment_likes'}
+
+
+def farmer_tag(id):
+    return f'farmer:{id}'
+
+
+def load_farmer_aggregate(id):
+    return Farmer.query.options(
+        joinedload(Farmer.barangay),
+        joinedload(Farmer.organization),
+        selectinload(Farmer.products).joinedload(FarmerProduct.product),
+        selectinload(Farmer.children),
+        selectinload(Farmer.experiences).options(
+            selectinload(FarmerExperience.liked_by),
+            selectinload(FarmerExperience.comments).options(
+                joinedload(ExperienceComment.user),
+                selectinload(ExperienceComment.liked_by),
+            ),
+        ),
+    ).filter(Farmer.id == id).first()
+
+
+def farmer_detail(farmer):
+    """Profile payload: farmer with relations plus products, children and experiences."""
+    data = farmer.to_dict(include_relations=True)
+    data['products'] = [p.to_dict() for p in sorted(farmer.products, key=lambda p: p.id)]
+    data['children'] = [c.to_dict() for c in sorted(farmer.children, key=lambda c: c.id)]
+    data['experiences'] = [e.to_dict() for e in sorted(farmer.experiences, key=lambda e: e.id)]
+    return data
+
+
+# --- Invalidation: collected per flush, applied after commit ---
+
+def _shared_change(session, obj):
+    shown = _SHARED.get(type(obj), ())
+    if obj in session.new or shown == ():
+        return False
+    if obj in session.deleted or shown is None:
+        return True
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in shown)
+
+
+def _farmer_ids(session, objs):
+    ids = set()
+    experience_ids = set()
+    for obj in objs:
+        if isinstance(obj, Farmer):
+            ids.add(obj.id)
+        elif isinstance(obj, (FarmerProduct, FarmerChild, FarmerExperience)):
+            ids.add(obj.farmer_id)
+            # Re-parented rows leave the old farmer's profile too
+            history = inspect(obj).attrs.farmer_id.history
+            ids.update(history.deleted or ())
+        elif isinstance(obj, ExperienceComment):
+            experience_ids.add(obj.experience_id)
+    experience_ids.discard(None)
+    if experience_ids:
+        ids.update(session.connection().execute(
+            select(FarmerExperience.farmer_id).where(FarmerExperience.id.in_(experience_ids))
+        ).scalars())
+    ids.discard(None)
+    return ids
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_detail_changes(session, flush_context):
+    objs = [
+        obj for obj in chain(session.new, session.dirty, session.deleted)
+        if obj not in session.dirty or session.is_modified(obj)
+    ]
+    if not objs:
+        return
+    pending = session.info.setdefault('detail_tags', set())
+    if any(_shared_change(session, obj) for obj in objs):
+        pending.add(DETAIL_TAG)
+    pending.update(farmer_tag(i) for i in _farmer_ids(session, objs))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changes(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement.table, 'name', None)
+        if table in _AGGREGATE_TABLES:
+            orm_execute_state.session.info.setdefault('detail_tags', set()).add(DETAIL_TAG)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_details(session):
+    tags = session.info.pop('detail_tags', None)
+    if tags:
+        try:
+            response_cache.invalidate(*tags)
+        except Exception as e:
+            print(f"Cache invalidation error: {e}")
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_detail_changes(session, previous_transaction):
+    # A savepoint (or failed flush) rollback keeps the outer transaction's changes
+    if previous_transaction.parent is None:
+        session.info.pop('detail_tags', None)
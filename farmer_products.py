@@ -0,0 +1,67 @@
+from decimal import Decimal, InvalidOperation
+
+from models import db, FarmerProduct
+
+# ============ Farmer Product Sync ============
+# update_farmer receives the farmer's complete product list on every save,
+# usually unchanged. Instead of deleting and re-inserting every row, the
+# submitted list is diffed against the stored rows by product id: changed
+# rows are updated in place, new products inserted and dropped ones deleted,
+# all in the caller's flush (which batches each kind per table). When the
+# submitted set equals the stored set nothing is written at all, so row ids,
+# and anything referring to them, stay stable.
+
+_CENT = Decimal('0.01')
+
+
+def _volume(value):
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value)).quantize(_CENT)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _values(production_volume, unit, is_primary):
+    """Comparable form of the columns a product entry sets (matches what the DB stores)."""
+    return (_volume(production_volume), unit or None, is_primary in (True, 'true', 1, '1'))
+
+
+def sync_farmer_products(farmer_id, submitted):
+    """
+    submitted: [(product_id, production_volume, unit, is_primary)], the full list
+    for the farmer (later duplicates of a product win). Returns the number of
+    rows inserted, updated and deleted; nothing is committed.
+    """
+    wanted = {pid: _values(vol, unit, primary) for pid, vol, unit, primary in submitted}
+
+    stored = {}
+    extra = []   # duplicate rows of a product, left over from earlier delete/re-insert saves
+    for row in FarmerProduct.query.filter_by(farmer_id=farmer_id).order_by(FarmerProduct.id):
+        if row.product_id in stored:
+            extra.append(row)
+        else:
+            stored[row.product_id] = row
+    current = {pid: _values(row.production_volume, row.unit, row.is_primary) for pid, row in stored.items()}
+
+    if not extra and wanted == current:
+        return {'inserted': 0, 'updated': 0, 'deleted': 0}
+
+    counts = {'inserted': 0, 'updated': 0, 'deleted': len(extra)}
+    for row in extra:
+        db.session.delete(row)
+    for pid, row in stored.items():
+        if pid not in wanted:
+            db.session.delete(row)
+            counts['deleted'] += 1
+        elif wanted[pid] != current[pid]:
+            row.production_volume, row.unit, row.is_primary = wanted[pid]
+            counts['updated'] += 1
+    new_rows = [
+        FarmerProduct(farmer_id=farmer_id, product_id=pid, production_volume=vol, unit=unit, is_primary=primary)
+        for pid, (vol, unit, primary) in wanted.items() if pid not in stored
+    ]
+    db.session.add_all(new_rows)
+    counts['inserted'] = len(new_rows)
+    return counts
@@ -0,0 +1,132 @@
+from sqlalchemy import exists, and_
+
+from models import Farmer, FarmerProduct, FarmerChild
+
+# ============ Farmer Filters & Sorting ============
+# Server-side filters shared by the farmer listing and the CSV export.
+#
+#   ?gender=Female&education_level=College,Vocational   exact match, comma = any of
+#   ?barangay_id=3&organization_id=1,2                    ids, comma = any of
+#   ?age_min=30&age_max=50&income_min=&farm_size_max=     inclusive ranges
+#   ?product_id=4                                         grows any of the products
+#   ?has_successor=true                                   a child continues farming
+#
+# Each filter is backed by an index declared on the model (Farmer and
+# FarmerProduct/FarmerChild __table_args__); schema.ensure_indexes() adds them
+# to databases created before they existed.
+
+CHOICE_FILTERS = {
+    'gender': Farmer.gender,
+    'education_level': Farmer.education_level,
+    'civil_status': Farmer.civil_status,
+    'land_ownership': Farmer.land_ownership,
+}
+ID_FILTERS = {
+    'barangay_id': Farmer.barangay_id,
+    'organization_id': Farmer.organization_id,
+}
+RANGE_FILTERS = {
+    'age': (Farmer.age, int),
+    'income': (Farmer.annual_income, float),
+    'farm_size': (Farmer.farm_size_hectares, float),
+    'years_farming': (Farmer.years_farming, int),
+}
+FILTER_ARGS = (
+    tuple(CHOICE_FILTERS) + tuple(ID_FILTERS)
+    + tuple(f'{name}_{bound}' for name in RANGE_FILTERS for bound in ('min', 'max'))
+    + ('product_id', 'has_successor')
+)
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _values(args, name):
+    return [v.strip() for raw in args.getlist(name) for v in raw.split(',') if v.strip()]
+
+
+def _ids(args, name):
+    try:
+        return [int(v) for v in _values(args, name)]
+    except ValueError:
+        raise FilterError(f"{name} must be a comma-separated list of ids")
+
+
+def _flag(args, name):
+    value = args.get(name, '').strip().lower()
+    if not value:
+        return None
+    if value in ('true', '1', 'yes'):
+        return True
+    if value in ('false', '0', 'no'):
+        return False
+    raise FilterError(f"{name} must be true or false")
+
+
+def apply_farmer_filters(query, args):
+    """Narrow a Farmer query by the filter args; raises FilterError on malformed values."""
+    for name, col in CHOICE_FILTERS.items():
+        values = _values(args, name)
+        if values:
+            query = query.filter(col.in_(values))
+
+    for name, col in ID_FILTERS.items():
+        ids = _ids(args, name)
+        if ids:
+            query = query.filter(col.in_(ids))
+
+    for name, (col, cast) in RANGE_FILTERS.items():
+        for bound in ('min', 'max'):
+            raw = args.get(f'{name}_{bound}', '').strip()
+            if not raw:
+                continue
+            try:
+                value = cast(raw)
+            except ValueError:
+                raise FilterError(f"{name}_{bound} must be a number")
+            query = query.filter(col >= value if bound == 'min' else col <= value)
+
+    product_ids = _ids(args, 'product_id')
+    if product_ids:
+        query = query.filter(exists().where(and_(
+            FarmerProduct.farmer_id == Farmer.id, FarmerProduct.product_id.in_(product_ids)
+        )))
+
+    has_successor = _flag(args, 'has_successor')
+    if has_successor is not None:
+        successor = exists().where(and_(
+            FarmerChild.farmer_id == Farmer.id, FarmerChild.continues_farming.is_(True)
+        ))
+        query = query.filter(successor if has_successor else ~successor)
+
+    return query
+
+
+# Sortable fields of the farmer list. Each maps to a column with a (column, id)
+# index on Farmer, so ORDER BY col, id (and the keyset cursor built on it)
+# walks an index instead of sorting the table. Name sorts use the computed
+# sort_name column ("last first middle suffix").
+SORT_FIELDS = {
+    'created_at': Farmer.created_at,
+    'updated_at': Farmer.updated_at,
+    'name': Farmer.sort_name,
+    'full_name': Farmer.sort_name,
+    'last_name': Farmer.sort_name,
+    'first_name': Farmer.first_name,
+    'farmer_code': Farmer.farmer_code,
+    'age': Farmer.age,
+    'annual_income': Farmer.annual_income,
+    'farm_size_hectares': Farmer.farm_size_hectares,
+    'years_farming': Farmer.years_farming,
+}
+SORT_ORDERS = ('asc', 'desc')
+
+
+def farmer_sort_column(sort_by, sort_order):
+    """Column for a whitelisted sort; raises FilterError otherwise."""
+    if sort_by not in SORT_FIELDS:
+        raise FilterError(f"sort_by must be one of: {', '.join(('relevance',) + tuple(SORT_FIELDS))}")
+    if sort_order not in SORT_ORDERS:
+        raise FilterError("sort_order must be asc or desc")
+    return SORT_FIELDS[sort_by]
@@ -0,0 +1,201 @@
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import request, current_app, jsonify
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+
+from models import db, IdempotencyRecord
+
+# ============ Idempotency Keys ============
+# Field devices on weak connections retry a POST when the response is lost,
+# which used to create the record twice (and fan out its notifications
+# twice). A client may send an Idempotency-Key header with a create request;
+# the first request with a key claims it by inserting an in-progress row
+# (unique on a hash of user, method, path and key) before the view runs, and
+# stores the response when the view succeeds. Retries with the same key then
+# get that stored response back, marked with Idempotent-Replayed: true,
+# without running the view again:
+#
+#   - same key while the first request is still running -> 409, retry later
+#   - same key with a different payload                  -> 422
+#   - the first request failed (non-2xx or an exception)  -> key released,
+#     the retry runs normally
+#
+# Records live for IDEMPOTENCY_TTL_HOURS and are purged by a scheduler job.
+# While the view runs, a heartbeat thread bumps the claim's created_at every
+# third of IDEMPOTENCY_LOCK_SECONDS, so a slow request keeps answering its
+# retries with 409. Only a claim whose heartbeat stopped for longer than
+# IDEMPOTENCY_LOCK_SECONDS (its worker died) is taken over.
+
+MAX_KEY_LENGTH = 255
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def request_fingerprint():
+    """Hash of the request payload (args, form fields and files, or the raw body)."""
+    parts = [request.method, request.path, sorted(request.args.items(multi=True))]
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        parts.append(sorted(request.form.items(multi=True)))
+        for name, storage in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            parts.extend([name, storage.filename, hashlib.sha256(storage.read()).hexdigest()])
+            storage.seek(0)
+    else:
+        # Cached, so the view can still read the body
+        parts.append(request.get_data(cache=True))
+    return _digest(*parts)
+
+
+def _claim(key_hash, request_hash):
+    """Claim the key for this request. Returns None when claimed, else the record holding it."""
+    T = IdempotencyRecord.__table__
+    now = datetime.utcnow()
+    expires_at = now + timedelta(hours=current_app.config.get('IDEMPOTENCY_TTL_HOURS', 24))
+    abandoned_before = now - timedelta(seconds=current_app.config.get('IDEMPOTENCY_LOCK_SECONDS', 60))
+
+    for _ in range(3):
+        db.session.add(IdempotencyRecord(
+            key_hash=key_hash, request_hash=request_hash, created_at=now, expires_at=expires_at
+        ))
+        try:
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+
+        record = db.session.execute(select(IdempotencyRecord).where(IdempotencyRecord.key_hash == key_hash)).scalar()
+        if record is None:
+            continue  # released meanwhile
+        if record.expires_at > now and not (record.status_code is None and record.created_at < abandoned_before):
+            return record
+        # Expired, or its request never finished: take it over unless someone else just did
+        taken = db.session.execute(
+            update(T).where(T.c.id == record.id, T.c.created_at == record.created_at)
+            .values(request_hash=request_hash, status_code=None, mimetype=None, response_body=None,
+                    created_at=now, expires_at=expires_at)
+        ).rowcount
+        db.session.commit()
+        if taken:
+            return None
+    return db.session.execute(select(IdempotencyRecord).where(IdempotencyRecord.key_hash == key_hash)).scalar()
+
+
+class _Heartbeat:
+    """Keeps a claim fresh on its own connection while the view holds it."""
+
+    def __init__(self, key_hash, interval):
+        self.key_hash = key_hash
+        self.interval = interval
+        self.engine = db.engine
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='idempotency-heartbeat', daemon=True)
+
+    def _run(self):
+        T = IdempotencyRecord.__table__
+        while not self._stop.wait(self.interval):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(update(T).where(T.c.key_hash == self.key_hash, T.c.status_code.is_(None))
+                                 .values(created_at=datetime.utcnow()))
+            except Exception as e:
+                print(f"❌ Could not refresh idempotency claim: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _store(key_hash, res):
+    T = IdempotencyRecord.__table__
+    try:
+        db.session.execute(update(T).where(T.c.key_hash == key_hash).values(
+            status_code=res.status_code, mimetype=res.mimetype, response_body=res.get_data(as_text=True)
+        ))
+        db.session.commit()
+    except Exception as e:
+        # The write itself succeeded; the claim is taken over after the lock timeout
+        db.session.rollback()
+        print(f"❌ Could not store idempotent response: {e}")
+
+
+def _release(key_hash):
+    T = IdempotencyRecord.__table__
+    try:
+        db.session.rollback()
+        db.session.execute(delete(T).where(T.c.key_hash == key_hash))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Could not release idempotency key: {e}")
+
+
+def _existing_response(record, request_hash):
+    if record is not None and record.request_hash != request_hash:
+        return jsonify({'error': 'This Idempotency-Key was already used for a different request'}), 422
+    if record is None or record.status_code is None:
+        res = jsonify({'error': 'A request with this Idempotency-Key is still being processed'})
+        res.status_code = 409
+        res.headers['Retry-After'] = '2'
+        return res
+    res = current_app.response_class(record.response_body, status=record.status_code, mimetype=record.mimetype)
+    res.headers[REPLAY_HEADER] = 'true'
+    return res
+
+
+def idempotent(fn):
+    """
+    Replay the stored response for a repeated Idempotency-Key instead of running
+    the view again. Requests without the header are unaffected. Place it below
+    @jwt_required(): keys are scoped to the user.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key', '').strip()
+        if not key:
+            return fn(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        key_hash = _digest(get_jwt_identity(), request.method, request.path, key)
+        request_hash = request_fingerprint()
+        record = _claim(key_hash, request_hash)
+        if record is not None:
+            return _existing_response(record, request_hash)
+
+        heartbeat = _Heartbeat(key_hash, current_app.config.get('IDEMPOTENCY_LOCK_SECONDS', 60) / 3)
+        try:
+            with heartbeat:
+                res = current_app.make_response(fn(*args, **kwargs))
+        except Exception:
+            _release(key_hash)
+            raise
+        if 200 <= res.status_code < 300:
+            _store(key_hash, res)
+        else:
+            _release(key_hash)
+        return res
+    return wrapper
+
+
+def purge_expired_keys():
+    T = IdempotencyRecord.__table__
+    removed = db.session.execute(delete(T).where(T.c.expires_at <= datetime.utcnow())).rowcount
+    db.session.commit()
+    if removed:
+        print(f"🧹 Purged {removed} expired idempotency keys")
+    return removed
@@ -0,0 +1,312 @@
+import csv
+from datetime import datetime, date
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Barangay, Organization, AgriculturalProduct, Farmer, FarmerProduct
+from product_names import product_names
+
+try:
+    import openpyxl
+except ImportError:  # listed in requirements.txt; only a bare local checkout lacks it (CSV still works)
+    openpyxl = None
+
+# ============ Bulk Farmer Import ============
+# POST /api/farmers/import takes a CSV or XLSX sheet with one farmer per row
+# and imports it in a background job (see jobs.py). The file is streamed row
+# by row and processed in batches of IMPORT_BATCH_SIZE:
+#
+#   1. every column of the batch is converted and checked in one pass
+#      (numbers, dates, required fields, farmer_code unique within the file
+#      and against the table with one IN query);
+#   2. barangay / organization names resolve through maps loaded once per
+#      import, product names through product_names.resolve() once per batch;
+#   3. valid rows are inserted in one flush and committed together with the
+#      job's progress counters.
+#
+# Invalid rows are skipped and reported with their line number. Headers are
+# the Farmer field names (plus a few aliases, see COLUMN_ALIASES); barangay
+# and organization accept a name or an id, products is a ';'-separated list.
+
+TEXT_FIELDS = (
+    'farmer_code', 'first_name', 'middle_name', 'last_name', 'suffix', 'gender', 'civil_status', 'address',
+    'contact_number', 'education_level', 'income_source', 'primary_occupation', 'secondary_occupation',
+    'land_ownership',
+)
+INT_FIELDS = ('age', 'number_of_children', 'years_farming')
+DECIMAL_FIELDS = ('annual_income', 'farm_size_hectares')
+REQUIRED_FIELDS = ('first_name', 'last_name', 'barangay')
+# Same defaults as POST /api/farmers
+DEFAULTS = {
+    'gender': 'Male', 'civil_status': 'Single', 'education_level': 'Elementary', 'land_ownership': 'Owner',
+    'farm_size_hectares': 0, 'number_of_children': 0,
+}
+COLUMN_ALIASES = {
+    'extension_name': 'suffix',
+    'barangay_id': 'barangay',
+    'barangay_name': 'barangay',
+    'organization_id': 'organization',
+    'organization_name': 'organization',
+    'product_names': 'products',
+}
+IMPORT_FORMATS = ('csv', 'xlsx')
+
+
+class ImportFileError(ValueError):
+    pass
+
+
+def import_format(filename):
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext not in IMPORT_FORMATS:
+        raise ImportFileError(f"File must be one of: {', '.join(IMPORT_FORMATS)}")
+    if ext == 'xlsx' and openpyxl is None:
+        raise ImportFileError('XLSX import needs openpyxl (pip install -r requirements.txt); upload a CSV instead')
+    return ext
+
+
+def _header(name):
+    key = '_'.join(str(name or '').strip().lower().split())
+    return COLUMN_ALIASES.get(key, key)
+
+
+def read_rows(path, fmt):
+    """Yields (line number, {field: raw value}) without loading the whole file."""
+    if fmt == 'xlsx':
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            headers = [_header(h) for h in next(rows, ())]
+            for line, values in enumerate(rows, start=2):
+                if any(v not in (None, '') for v in values):
+                    yield line, dict(zip(headers, values))
+        finally:
+            workbook.close()
+        return
+
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        reader = csv.reader(fh)
+        headers = [_header(h) for h in next(reader, [])]
+        for values in reader:
+            if any(v.strip() for v in values):
+                yield reader.line_num, dict(zip(headers, values))
+
+
+def count_rows(path, fmt):
+    if fmt == 'xlsx':
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            return max((workbook.active.max_row or 1) - 1, 0)
+        finally:
+            workbook.close()
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        return max(sum(1 for _ in csv.reader(fh)) - 1, 0)
+
+
+# --- Column converters: raw cell -> value, ValueError with a message when invalid ---
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _int(value):
+    value = _text(value)
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        raise ValueError('must be a whole number')
+
+
+def _decimal(value):
+    value = _text(value)
+    if value is None:
+        return None
+    try:
+        return float(value.replace(',', ''))
+    except ValueError:
+        raise ValueError('must be a number')
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = _text(value)
+    if value is None:
+        return None
+    for pattern in ('%Y-%m-%d', '%m/%d/%Y'):
+        try:
+            return datetime.strptime(value[:10], pattern).date()
+        except ValueError:
+            continue
+    raise ValueError('must be a date (YYYY-MM-DD)')
+
+
+def _flag(value):
+    value = _text(value)
+    return value is not None and value.lower() in ('true', '1', 'yes', 'y')
+
+
+CONVERTERS = {name: _text for name in TEXT_FIELDS}
+CONVERTERS.update({name: _int for name in INT_FIELDS})
+CONVERTERS.update({name: _decimal for name in DECIMAL_FIELDS})
+CONVERTERS.update({'birth_date': _date, 'children_farming_involvement': _flag,
+                   'barangay': _text, 'organization': _text, 'products': _text})
+
+
+def _key(name):
+    return ' '.join(str(name or '').split()).lower()
+
+
+def _age(birth_date):
+    today = date.today()
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+class FarmerImporter:
+    def __init__(self, encoder_id, batch_size=200):
+        self.encoder_id = encoder_id
+        self.batch_size = max(int(batch_size), 1)
+        self._codes_seen = set()
+        self.barangays = self._lookup(Barangay)
+        self.organizations = self._lookup(Organization)
+
+    @staticmethod
+    def _lookup(model):
+        """({normalized name: {ids}}, {ids}) for resolving a name-or-id cell."""
+        by_name = {}
+        ids = set()
+        for row_id, name in db.session.execute(select(model.id, model.name)):
+            by_name.setdefault(_key(name), set()).add(row_id)
+            ids.add(row_id)
+        return by_name, ids
+
+    @staticmethod
+    def _resolve(lookup, raw, label):
+        by_name, ids = lookup
+        if raw.isdigit() and int(raw) in ids:
+            return int(raw)
+        matches = by_name.get(_key(raw), set())
+        if len(matches) == 1:
+            return next(iter(matches))
+        raise ValueError(f"{label} '{raw}' is ambiguous" if matches else f"unknown {label} '{raw}'")
+
+    def validate(self, batch):
+        """Column-wise checks over a batch; returns ([(line, values)], [(line, [errors])])."""
+        values = [{} for _ in batch]
+        errors = [[] for _ in batch]
+        for field, convert in CONVERTERS.items():
+            for i, (_, raw) in enumerate(batch):
+                try:
+                    values[i][field] = convert(raw.get(field))
+                except ValueError as e:
+                    errors[i].append(f'{field} {e}')
+
+        for field in REQUIRED_FIELDS:
+            for i, row in enumerate(values):
+                if field in row and row[field] is None:
+                    errors[i].append(f'{field} is required')
+
+        for field, lookup in (('barangay', self.barangays), ('organization', self.organizations)):
+            for i, row in enumerate(values):
+                if row.get(field):
+                    try:
+                        row[f'{field}_id'] = self._resolve(lookup, row[field], field)
+                    except ValueError as e:
+                        errors[i].append(str(e))
+
+        codes = {row['farmer_code'] for row in values if row.get('farmer_code')}
+        taken = set(db.session.execute(
+            select(Farmer.farmer_code).where(Farmer.farmer_code.in_(codes))
+        ).scalars()) if codes else set()
+        for i, row in enumerate(values):
+            code = row.get('farmer_code')
+            if not code:
+                continue
+            if code in taken:
+                errors[i].append(f"farmer_code '{code}' already exists")
+            elif code in self._codes_seen:
+                errors[i].append(f"farmer_code '{code}' appears twice in the file")
+            self._codes_seen.add(code)
+
+        good = [(line, row) for (line, _), row, errs in zip(batch, values, errors) if not errs]
+        bad = [(line, errs) for (line, _), errs in zip(batch, errors) if errs]
+        return good, bad
+
+    def build(self, row, product_ids):
+        fields = {name: row[name] for name in TEXT_FIELDS + INT_FIELDS + DECIMAL_FIELDS if row.get(name) is not None}
+        for name, default in DEFAULTS.items():
+            fields.setdefault(name, default)
+        if fields.get('age') is None:
+            fields['age'] = _age(row['birth_date']) if row.get('birth_date') else 0
+        farmer = Farmer(
+            **fields,
+            birth_date=row.get('birth_date'),
+            barangay_id=row['barangay_id'],
+            organization_id=row.get('organization_id'),
+            children_farming_involvement=row['children_farming_involvement'],
+            data_encoder_id=self.encoder_id,
+        )
+        for key in dict.fromkeys(self._product_keys(row)):
+            if key in product_ids:
+                farmer.products.append(FarmerProduct(product_id=product_ids[key], unit='kg', is_primary=False))
+        return farmer
+
+    @staticmethod
+    def _product_names(row):
+        return [name.strip() for name in (row.get('products') or '').split(';') if name.strip()]
+
+    def _product_keys(self, row):
+        return [AgriculturalProduct.make_name_key(name) for name in self._product_names(row)]
+
+    def _resolve_products(self, good):
+        return product_names.resolve((name, 'Others') for _, row in good for name in self._product_names(row))
+
+    def insert(self, good, reporter):
+        """Insert a validated batch in one flush (row by row in savepoints if that hits a constraint)."""
+        try:
+            product_ids = self._resolve_products(good)
+            db.session.add_all([self.build(row, product_ids) for _, row in good])
+            db.session.flush()
+            reporter.row_ok(len(good))
+            return
+        except IntegrityError:
+            # A concurrent write took a farmer_code: retry row by row to isolate it
+            db.session.rollback()
+        product_ids = self._resolve_products(good)
+        for line, row in good:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(self.build(row, product_ids))
+                reporter.row_ok()
+            except IntegrityError as e:
+                reporter.row_failed(line, [str(e.orig)])
+
+    def run(self, rows, reporter):
+        """Import every (line, raw) row; returns (imported, failed)."""
+        batch = []
+        for item in rows:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._process(batch, reporter)
+                batch = []
+        if batch:
+            self._process(batch, reporter)
+        return reporter.succeeded, reporter.failed
+
+    def _process(self, batch, reporter):
+        good, bad = self.validate(batch)
+        if good:
+            self.insert(good, reporter)
+        for line, errs in bad:
+            reporter.row_failed(line, errs)
+        # Rows and progress become visible together
+        reporter.save()
+        db.session.commit()
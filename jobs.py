@@ -0,0 +1,76 @@
+import json
+import threading
+import traceback
+from datetime import datetime
+
+from models import db, BackgroundJob
+
+# ============ Background Jobs ============
+# Work too long for a request (bulk imports, ...) runs in a daemon thread
+# with its own app context and therefore its own database session. The
+# request creates a BackgroundJob row and answers 202 with its id right away;
+# the thread records progress on that row (committed with each batch of
+# work, see JobReporter) and the client polls GET /api/jobs/<id>.
+
+
+class JobReporter:
+    """Progress counters of a running job; save() copies them onto the job row before a commit."""
+
+    def __init__(self, job, max_errors=500):
+        self.job = job
+        self.max_errors = max_errors
+        self.total = None
+        self.succeeded = 0
+        self.failed = 0
+        self.errors = []
+
+    def row_ok(self, count=1):
+        self.succeeded += count
+
+    def row_failed(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def save(self):
+        self.job.total_rows = self.total
+        self.job.succeeded_rows = self.succeeded
+        self.job.failed_rows = self.failed
+        self.job.processed_rows = self.succeeded + self.failed
+        self.job.errors = json.dumps(self.errors) if self.errors else None
+
+
+def start_job(app, kind, user_id, target, *args, filename=None):
+    """Create the job row and run target(reporter, *args) in a background thread."""
+    job = BackgroundJob(kind=kind, status='queued', created_by=user_id, filename=filename)
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.id
+    thread = threading.Thread(target=_run, args=(app, job_id, target, args), name=f'job-{kind}-{job_id}', daemon=True)
+    thread.start()
+    return job
+
+
+def _run(app, job_id, target, args):
+    with app.app_context():
+        job = db.session.get(BackgroundJob, job_id)
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+        reporter = JobReporter(job, app.config.get('JOB_MAX_ERRORS', 500))
+        try:
+            message = target(reporter, *args)
+            reporter.save()
+            job.status = 'completed'
+            job.message = message
+        except Exception as e:
+            traceback.print_exc()
+            db.session.rollback()
+            job = db.session.get(BackgroundJob, job_id)  # progress stays at the last committed batch
+            job.status = 'failed'
+            job.message = str(e)
+            print(f"❌ Job {job_id} ({job.kind}) failed: {e}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            db.session.remove()
@@ -1,4 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
+import json
+from sqlalchemy import event
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -17,6 +19,17 @@ comment_likes = db.Table('comment_likes',
     db.Column('comment_id', db.Integer, db.ForeignKey('experience_comments.id', ondelete='CASCADE'), primary_key=True)
 )
 
+def related_dict(obj, memo=None):
+    """to_dict() of a related row, reused from memo when the same row was already serialized."""
+    if obj is None:
+        return None
+    if memo is None:
+        return obj.to_dict()
+    key = (obj.__tablename__, obj.id)
+    if key not in memo:
+        memo[key] = obj.to_dict()
+    return memo[key]
+
 # --- MODELS ---
 
 class User(db.Model):
@@ -117,9 +130,14 @@ class Barangay(db.Model):
 
 class AgriculturalProduct(db.Model):
     __tablename__ = 'agricultural_products'
+    __table_args__ = (
+        db.Index('ux_agricultural_products_name_key', 'name_key', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), unique=True, nullable=False)
+    # Whitespace-collapsed lowercase name for case-insensitive lookups; kept current by a mapper event below
+    name_key = db.Column(db.String(255))
     category = db.Column(db.String(50), nullable=False)
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -132,8 +150,35 @@ class AgriculturalProduct(db.Model):
             'description': self.description
         }
 
+    @staticmethod
+    def make_name_key(name):
+        return " ".join((name or "").split()).lower()[:255]
+
+@event.listens_for(AgriculturalProduct, 'before_insert')
+@event.listens_for(AgriculturalProduct, 'before_update')
+def _set_product_name_key(mapper, connection, target):
+    target.name_key = AgriculturalProduct.make_name_key(target.name)
+
 class Farmer(db.Model):
     __tablename__ = 'farmers'
+    # Back the list filters and sorts in filters.py (barangay_id/organization_id are
+    # FK-indexed by MySQL). Sortable columns carry id so ORDER BY col, id is index-ordered.
+    __table_args__ = (
+        db.Index('ix_farmers_barangay_gender', 'barangay_id', 'gender'),
+        db.Index('ix_farmers_gender_age', 'gender', 'age'),
+        db.Index('ix_farmers_age', 'age', 'id'),
+        db.Index('ix_farmers_education_level', 'education_level'),
+        db.Index('ix_farmers_civil_status', 'civil_status'),
+        db.Index('ix_farmers_land_ownership', 'land_ownership'),
+        db.Index('ix_farmers_annual_income', 'annual_income', 'id'),
+        db.Index('ix_farmers_farm_size', 'farm_size_hectares', 'id'),
+        db.Index('ix_farmers_years_farming', 'years_farming', 'id'),
+        db.Index('ix_farmers_created_at', 'created_at', 'id'),
+        db.Index('ix_farmers_updated_at', 'updated_at', 'id'),
+        db.Index('ix_farmers_sort_name', 'sort_name', 'id'),
+        db.Index('ix_farmers_first_name', 'first_name', 'id'),
+        db.Index('ix_farmers_farmer_code', 'farmer_code', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     farmer_code = db.Column(db.String(50), unique=True)
@@ -141,6 +186,8 @@ class Farmer(db.Model):
     middle_name = db.Column(db.String(100))
     last_name = db.Column(db.String(100), nullable=False)
     suffix = db.Column(db.String(20))
+    # "last first middle suffix", lowercased; kept current by a mapper event below
+    sort_name = db.Column(db.String(255))
     age = db.Column(db.Integer, nullable=False)
     gender = db.Column(db.String(20), nullable=False)
     profile_image = db.Column(db.String(500))
@@ -171,19 +218,30 @@ class Farmer(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     civil_status = db.Column(db.String(20), default='Single')
+    # Optimistic locking: every UPDATE checks and increments it (StaleDataError on mismatch).
+    # Nullable only so schema.ensure_columns can add it; backfilled to 1 at startup.
+    row_version = db.Column(db.Integer, default=1)
+
+    __mapper_args__ = {'version_id_col': row_version}
 
     @property
     def full_name(self):
         parts = [self.first_name, self.middle_name, self.last_name, self.suffix]
         return " ".join([p for p in parts if p]).strip()
 
+    @staticmethod
+    def make_sort_name(first_name, middle_name, last_name, suffix):
+        parts = [last_name, first_name, middle_name, suffix]
+        return " ".join(" ".join([p for p in parts if p]).split()).lower()[:255]
+
     def get_image_url(self):
         if not self.profile_image: return None
         if self.profile_image.startswith(('http://', 'https://')): return self.profile_image
         if self.profile_image.startswith('/'): return self.profile_image
         return f"/uploads/{self.profile_image}"
 
-    def to_dict(self, include_relations=False):
+    def to_dict(self, include_relations=False, memo=None):
+        """memo: optional dict shared across a listing so each barangay/organization is serialized once."""
         data = {
             'id': self.id,
             'farmer_code': self.farmer_code,
@@ -212,17 +270,26 @@ class Farmer(db.Model):
             'land_ownership': self.land_ownership,
             'years_farming': self.years_farming,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'row_version': self.row_version
         }
         
         if include_relations:
-            data['barangay'] = self.barangay.to_dict() if self.barangay else None
-            data['organization'] = self.organization.to_dict() if self.organization else None
+            data['barangay'] = related_dict(self.barangay, memo)
+            data['organization'] = related_dict(self.organization, memo)
             
         return data
 
+@event.listens_for(Farmer, 'before_insert')
+@event.listens_for(Farmer, 'before_update')
+def _set_farmer_sort_name(mapper, connection, target):
+    target.sort_name = Farmer.make_sort_name(target.first_name, target.middle_name, target.last_name, target.suffix)
+
 class FarmerProduct(db.Model):
     __tablename__ = 'farmer_products'
+    __table_args__ = (
+        db.Index('ix_farmer_products_product_farmer', 'product_id', 'farmer_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     farmer_id = db.Column(db.Integer, db.ForeignKey('farmers.id', ondelete='CASCADE'), nullable=False)
     farmer = db.relationship('Farmer', backref=db.backref('products', cascade='all, delete-orphan'))
@@ -247,6 +314,9 @@ class FarmerProduct(db.Model):
 
 class FarmerChild(db.Model):
     __tablename__ = 'farmer_children'
+    __table_args__ = (
+        db.Index('ix_farmer_children_farmer_successor', 'farmer_id', 'continues_farming'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     farmer_id = db.Column(db.Integer, db.ForeignKey('farmers.id', ondelete='CASCADE'), nullable=False)
     farmer = db.relationship('Farmer', backref=db.backref('children', cascade='all, delete-orphan'))
@@ -479,4 +549,153 @@ class TokenBlocklist(db.Model):
             "id": self.id,
             "jti": self.jti,
             "created_at": self.created_at.isoformat()
-        }
\ No newline at end of file
+        }
+class DashboardSummary(db.Model):
+    """
+    Pre-aggregated farmer/child metrics per (barangay, education level, month).
+    Maintained incrementally on every flush (see analytics.py) and reconciled
+    against the raw tables periodically. Sums of squares allow variance.
+    """
+    __tablename__ = 'dashboard_summary'
+    __table_args__ = (
+        db.UniqueConstraint('barangay_id', 'education_level', 'month', name='uq_dashboard_summary_bucket'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    barangay_id = db.Column(db.Integer, nullable=False)
+    education_level = db.Column(db.String(50), nullable=False, default='')
+    month = db.Column(db.Date, nullable=False, index=True)
+
+    farmer_count = db.Column(db.Integer, nullable=False, default=0)
+    age_sum = db.Column(db.Double, nullable=False, default=0)
+    age_sq_sum = db.Column(db.Double, nullable=False, default=0)
+    income_count = db.Column(db.Integer, nullable=False, default=0)
+    income_sum = db.Column(db.Double, nullable=False, default=0)
+    income_sq_sum = db.Column(db.Double, nullable=False, default=0)
+    land_count = db.Column(db.Integer, nullable=False, default=0)
+    land_sum = db.Column(db.Double, nullable=False, default=0)
+    land_sq_sum = db.Column(db.Double, nullable=False, default=0)
+    children_count = db.Column(db.Integer, nullable=False, default=0)
+    children_farming = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyRollup(db.Model):
+    """
+    One row per calendar day: farmers, experiences and projects created that
+    day plus attribute sums of the farmers created that day. Backs arbitrary
+    from/to dashboard ranges (see analytics.py).
+    """
+    __tablename__ = 'daily_rollups'
+    day = db.Column(db.Date, primary_key=True)
+
+    farmers_created = db.Column(db.Integer, nullable=False, default=0)
+    experiences_created = db.Column(db.Integer, nullable=False, default=0)
+    projects_created = db.Column(db.Integer, nullable=False, default=0)
+    age_sum = db.Column(db.Double, nullable=False, default=0)
+    age_sq_sum = db.Column(db.Double, nullable=False, default=0)
+    income_count = db.Column(db.Integer, nullable=False, default=0)
+    income_sum = db.Column(db.Double, nullable=False, default=0)
+    income_sq_sum = db.Column(db.Double, nullable=False, default=0)
+    land_count = db.Column(db.Integer, nullable=False, default=0)
+    land_sum = db.Column(db.Double, nullable=False, default=0)
+    land_sq_sum = db.Column(db.Double, nullable=False, default=0)
+
+class FarmerMetricSketch(db.Model):
+    """
+    Serialized quantile sketch (sketches.TDigest) of one farmer metric for one
+    scope: a barangay ('barangay', '<id>'), a creation month ('month',
+    'YYYY-MM') or both ('barangay_month', '<id>:YYYY-MM'). Inserts are folded in incrementally; updates and deletes mark
+    the sketch stale; the scheduler rebuilds it from its slice (reads recompute
+    it in memory until then).
+    """
+    __tablename__ = 'farmer_metric_sketches'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'scope_key', 'metric', name='uq_farmer_metric_sketch'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)
+    scope_key = db.Column(db.String(20), nullable=False)
+    metric = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    digest = db.Column(db.Text)
+    stale = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DataVersion(db.Model):
+    """
+    Monotonic write counter per table, bumped in the same transaction as
+    every ORM write (see versions.py). Read endpoints derive ETags from it.
+    """
+    __tablename__ = 'data_versions'
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+class BackgroundJob(db.Model):
+    """
+    A long-running task (e.g. a farmer import) executed in a worker thread.
+    The thread commits progress counters as it goes so clients can poll it.
+    """
+    __tablename__ = 'background_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    filename = db.Column(db.String(255))
+    total_rows = db.Column(db.Integer)
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    succeeded_rows = db.Column(db.Integer, nullable=False, default=0)
+    failed_rows = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text)      # JSON list of {row, errors}, capped
+    message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self, include_errors=False):
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_by': self.created_by,
+            'filename': self.filename,
+            'total_rows': self.total_rows,
+            'processed_rows': self.processed_rows,
+            'succeeded_rows': self.succeeded_rows,
+            'failed_rows': self.failed_rows,
+            'message': self.message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if include_errors:
+            data['errors'] = json.loads(self.errors) if self.errors else []
+        return data
+
+
+class IdempotencyRecord(db.Model):
+    """
+    The outcome of a POST sent with an Idempotency-Key, kept until expires_at
+    so a retry of the same request gets the same response (see idempotency.py).
+    """
+    __tablename__ = 'idempotency_records'
+    id = db.Column(db.Integer, primary_key=True)
+    key_hash = db.Column(db.String(64), nullable=False, unique=True)      # sha256 of user, method, path, key
+    request_hash = db.Column(db.String(64), nullable=False)               # sha256 of the request payload
+    status_code = db.Column(db.Integer)                                   # NULL while the first request runs
+    mimetype = db.Column(db.String(100))
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class ChangeLog(db.Model):
+    """
+    One row per committed write to a synced table, numbered by a gap-free
+    sequence (see sync.py). Offline clients pull the rows after their last seq.
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_row', 'table_name', 'row_id', 'seq'),
+    )
+    seq = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    table_name = db.Column(db.String(64), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
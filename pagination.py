@@ -0,0 +1,112 @@
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, date
+from decimal import Decimal
+
+from sqlalchemy import and_, or_
+
+# ============ Keyset Pagination ============
+# OFFSET pages get slower the deeper they go and paginate() adds a COUNT(*)
+# to every page. In cursor mode the client gets an opaque token holding the
+# sort value and id of the last row it saw, and the next page continues with
+# WHERE (col, id) > (value, id), so every page costs the same single query.
+#
+# NULLs sort as the smallest value (the MySQL/SQLite default), so ascending
+# pages see them first and descending pages see them last.
+#
+# Totals are optional: count=exact counts (reusing a cached count while the
+# table's data version is unchanged), count=approx accepts a cached count up
+# to COUNT_CACHE_SECONDS old, and count=none skips it.
+
+COUNT_MODES = ('exact', 'approx', 'none')
+
+
+class CursorError(ValueError):
+    pass
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        if 'dec' in value:
+            return Decimal(value['dec'])
+    return value
+
+
+def encode_cursor(sort_by, sort_order, value, row_id):
+    payload = json.dumps({'s': sort_by, 'o': sort_order, 'v': _dump(value), 'id': row_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, sort_by, sort_order):
+    """(value, id) of the last row seen, or None for the first page."""
+    if not token:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        value, row_id = _load(data['v']), data['id']
+    except (ValueError, KeyError, TypeError):
+        raise CursorError('Invalid cursor')
+    if data.get('s') != sort_by or data.get('o') != sort_order:
+        raise CursorError('Cursor does not match sort_by/sort_order')
+    return value, row_id
+
+
+def keyset_after(col, id_col, value, row_id, descending):
+    """Rows strictly after (value, row_id) in ORDER BY col, id (both asc or both desc)."""
+    if descending:
+        if value is None:
+            return and_(col.is_(None), id_col < row_id)
+        return or_(col < value, and_(col == value, id_col < row_id), col.is_(None))
+    if value is None:
+        return or_(and_(col.is_(None), id_col > row_id), col.isnot(None))
+    return or_(col > value, and_(col == value, id_col > row_id))
+
+
+class CountCache:
+    """Per-worker LRU of filtered row counts keyed by filter signature."""
+
+    def __init__(self, max_entries=512):
+        self.ttl = 60
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # signature -> (version, counted_at, count)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('COUNT_CACHE_SECONDS', self.ttl)
+
+    def get(self, signature, version, mode, count_fn):
+        if mode == 'none':
+            return None
+        with self._lock:
+            cached = self._entries.get(signature)
+        if cached is not None:
+            cached_version, counted_at, count = cached
+            if cached_version == version or (mode == 'approx' and time.monotonic() - counted_at < self.ttl):
+                return count
+        count = count_fn()
+        with self._lock:
+            self._entries[signature] = (version, time.monotonic(), count)
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return count
+
+
+count_cache = CountCache()
@@ -0,0 +1,120 @@
+import threading
+from datetime import datetime
+
+from sqlalchemy import select, insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from models import db, AgriculturalProduct
+from versions import current_versions, queue_version_bumps
+from sync import record_changes
+
+# ============ Product Name Resolution ============
+# Farmer create/update receive products by name. Names are matched on
+# AgriculturalProduct.name_key (collapsed whitespace, lowercase), which has a
+# unique index, through a per-worker name_key -> id map. The map is dropped
+# whenever the agricultural_products data version moves, so renames and
+# deletes made by any worker are seen on the next save.
+#
+# resolve() costs a fixed number of statements however many products a
+# farmer has: the version check, one SELECT ... IN for names not in the map,
+# and for names that do not exist yet one multi-row INSERT that leaves rows
+# another request created concurrently alone, followed by one locking
+# SELECT ... IN for their ids. The locking read sees rows committed after
+# this transaction's snapshot (REPEATABLE READ on MySQL), so a name created
+# by a concurrent request is found rather than dropped; a name that still
+# cannot be resolved raises ProductNameError.
+
+
+class ProductNameError(ValueError):
+    pass
+
+
+class ProductNameCache:
+    def __init__(self):
+        self._ids = {}          # name_key -> product id
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _fetch(self, keys, locking=False):
+        stmt = (
+            select(AgriculturalProduct.name_key, AgriculturalProduct.id)
+            .where(AgriculturalProduct.name_key.in_(keys))
+        )
+        if locking:
+            stmt = stmt.with_for_update(read=True)
+        return {key: product_id for key, product_id in db.session.execute(stmt)}
+
+    def _insert_missing(self, entries):
+        """
+        Multi-row INSERT that leaves names created meanwhile by someone else
+        alone. Only duplicate keys are skipped (unlike INSERT IGNORE, which
+        also downgrades truncation and other errors to warnings).
+        """
+        T = AgriculturalProduct.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'mysql':
+            stmt = mysql.insert(T).on_duplicate_key_update(id=T.c.id)
+        elif dialect == 'postgresql':
+            stmt = postgresql.insert(T).on_conflict_do_nothing()
+        elif dialect == 'sqlite':
+            stmt = sqlite.insert(T).on_conflict_do_nothing()
+        else:
+            stmt = insert(T)
+        now = datetime.utcnow()
+        result = db.session.execute(stmt, [
+            {'name': name, 'name_key': key, 'category': category, 'created_at': now}
+            for key, (name, category) in entries.items()
+        ])
+        # Core INSERTs skip the flush listeners, so queue the table version bump
+        # here (resolve() queues the new rows for the change log)
+        if result.rowcount:
+            queue_version_bumps(db.session, ['agricultural_products'])
+
+    def resolve(self, products):
+        """
+        products: iterable of (name, category). Returns {name_key: product id},
+        creating missing products in the current transaction. Raises
+        ProductNameError for a name that can be neither created nor found.
+        """
+        wanted = {}
+        for name, category in products:
+            key = AgriculturalProduct.make_name_key(name)
+            if key:
+                wanted.setdefault(key, (" ".join(name.split()), category or 'Others'))
+        if not wanted:
+            return {}
+
+        version = current_versions(['agricultural_products'])['agricultural_products']
+        with self._lock:
+            if version != self._version:
+                self._ids = {}
+                self._version = version
+            found = {key: self._ids[key] for key in wanted if key in self._ids}
+
+        missing = [key for key in wanted if key not in found]
+        if missing:
+            fetched = self._fetch(missing)
+            with self._lock:
+                if version == self._version:
+                    self._ids.update(fetched)
+            found.update(fetched)
+
+        created = {key: wanted[key] for key in wanted if key not in found}
+        if created:
+            # New ids are not cached: the version bump above drops the map anyway
+            self._insert_missing(created)
+            new_ids = self._fetch(list(created), locking=True)
+            unresolved = [wanted[key][0] for key in created if key not in new_ids]
+            if unresolved:
+                raise ProductNameError(f"Could not save products: {', '.join(unresolved)}")
+            record_changes(db.session, 'agricultural_products', new_ids.values())
+            found.update(new_ids)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._ids = {}
+            self._version = None
+
+
+product_names = ProductNameCache()
@@ -0,0 +1,125 @@
+from models import Farmer, Barangay, Organization, related_dict
+
+# ============ Farmer Projections ============
+# List views rarely need all ~30 fields plus nested barangay/organization
+# objects. ?view=summary or ?fields=id,full_name,age,... makes get_farmers
+# select only the columns those fields need and serialize straight from the
+# result tuples, skipping ORM identity-map work. view=full (the default) keeps
+# the complete Farmer.to_dict(include_relations=True) shape.
+
+
+def _number(name):
+    return lambda row: float(getattr(row, name)) if getattr(row, name) else None
+
+
+def _isoformat(name):
+    return lambda row: getattr(row, name).isoformat() if getattr(row, name) else None
+
+
+def _column(name):
+    return lambda row: getattr(row, name)
+
+
+def _full_name(row):
+    parts = [row.first_name, row.middle_name, row.last_name, row.suffix]
+    return " ".join([p for p in parts if p]).strip()
+
+
+def _image_url(row):
+    image = row.profile_image
+    if not image:
+        return None
+    if image.startswith(('http://', 'https://', '/')):
+        return image
+    return f"/uploads/{image}"
+
+
+_NAME_COLUMNS = (Farmer.first_name, Farmer.middle_name, Farmer.last_name, Farmer.suffix)
+_PLAIN = (
+    'id', 'farmer_code', 'first_name', 'middle_name', 'last_name', 'suffix', 'age', 'gender',
+    'civil_status', 'barangay_id', 'organization_id', 'address', 'contact_number', 'education_level',
+    'income_source', 'number_of_children', 'children_farming_involvement', 'primary_occupation',
+    'secondary_occupation', 'land_ownership', 'years_farming', 'row_version',
+)
+
+# field -> (columns it needs, value from a result row); names match Farmer.to_dict()
+FARMER_FIELDS = {name: ((getattr(Farmer, name),), _column(name)) for name in _PLAIN}
+FARMER_FIELDS.update({
+    'full_name': (_NAME_COLUMNS, _full_name),
+    'profile_image': ((Farmer.profile_image,), _image_url),
+    'birth_date': ((Farmer.birth_date,), _isoformat('birth_date')),
+    'annual_income': ((Farmer.annual_income,), _number('annual_income')),
+    'farm_size_hectares': ((Farmer.farm_size_hectares,), _number('farm_size_hectares')),
+    'created_at': ((Farmer.created_at,), _isoformat('created_at')),
+    'updated_at': ((Farmer.updated_at,), _isoformat('updated_at')),
+    # Flat names come from an outer join; nested objects from one extra query per relation
+    'barangay_name': ((Barangay.name.label('barangay_name'),), _column('barangay_name')),
+    'organization_name': ((Organization.name.label('organization_name'),), _column('organization_name')),
+    'barangay': ((Farmer.barangay_id,), None),
+    'organization': ((Farmer.organization_id,), None),
+})
+
+PROJECTIONS = {
+    'summary': (
+        'id', 'farmer_code', 'first_name', 'middle_name', 'last_name', 'suffix', 'full_name', 'age',
+        'gender', 'profile_image', 'barangay_id', 'barangay_name', 'annual_income', 'farm_size_hectares',
+        'created_at',
+    ),
+    'full': None,
+}
+
+
+class ProjectionError(ValueError):
+    pass
+
+
+def parse_projection(args):
+    """Requested field list, or None for the full to_dict() shape."""
+    fields = args.get('fields', '').strip()
+    view = args.get('view', '').strip()
+    if fields:
+        names = list(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+        unknown = [n for n in names if n not in FARMER_FIELDS]
+        if unknown:
+            raise ProjectionError(f"Unknown fields: {', '.join(unknown)}")
+        return ['id'] + [n for n in names if n != 'id']
+    if view:
+        if view not in PROJECTIONS:
+            raise ProjectionError(f"view must be one of: {', '.join(PROJECTIONS)}")
+        projection = PROJECTIONS[view]
+        return list(projection) if projection is not None else None
+    return None
+
+
+def project(query, fields, extra_columns=()):
+    """Turn a Farmer query into a column query for fields (plus extra columns, e.g. the sort key)."""
+    columns = {}
+    for name in fields:
+        for col in FARMER_FIELDS[name][0]:
+            columns.setdefault(col.key, col)
+    for col in extra_columns:
+        columns.setdefault(col.key, col)
+    if 'barangay_name' in columns:
+        query = query.outerjoin(Barangay, Barangay.id == Farmer.barangay_id)
+    if 'organization_name' in columns:
+        query = query.outerjoin(Organization, Organization.id == Farmer.organization_id)
+    return query.with_entities(*columns.values())
+
+
+def serialize_rows(rows, fields):
+    nested = {}
+    for name, model, key in (('barangay', Barangay, 'barangay_id'), ('organization', Organization, 'organization_id')):
+        if name in fields:
+            ids = {getattr(row, key) for row in rows} - {None}
+            objs = model.query.filter(model.id.in_(ids)).all() if ids else []
+            memo = {}
+            nested[name] = (key, {obj.id: related_dict(obj, memo) for obj in objs})
+
+    getters = [(name, FARMER_FIELDS[name][1]) for name in fields if name not in nested]
+    result = []
+    for row in rows:
+        data = {name: getter(row) for name, getter in getters}
+        for name, (key, by_id) in nested.items():
+            data[name] = by_id.get(getattr(row, key))
+        result.append(data)
+    return result
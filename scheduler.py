@@ -0,0 +1,156 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from cache import FileLock
+
+# ============ Background Scheduler ============
+# A small in-process scheduler for periodic maintenance: cache warmup and
+# analytics reconciliation run at boot and then on an interval, so the first
+# user after a deploy or cold start does not pay for them.
+#
+# Gunicorn starts one copy of the app per worker. Every worker tries to take
+# a host-wide file lock when the scheduler starts; the one that gets it runs
+# the jobs for the life of the process and the others stay idle.
+
+
+class Job:
+    def __init__(self, name, fn, interval, jitter=0, run_at_boot=True):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.jitter = jitter
+        self.next_run = 0 if run_at_boot else None
+        self.runs = 0
+        self.failures = 0
+        self.last_run_at = None
+        self.last_duration_ms = None
+        self.total_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+        self.last_error = None
+
+    def schedule_next(self, now):
+        self.next_run = now + self.interval + random.uniform(0, self.jitter)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'interval_seconds': self.interval,
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+            'last_duration_ms': self.last_duration_ms,
+            'avg_duration_ms': round(self.total_duration_ms / self.runs, 2) if self.runs else None,
+            'max_duration_ms': self.max_duration_ms,
+            'last_error': self.last_error,
+            'next_run_in_seconds': round(max(0.0, self.next_run - time.monotonic()), 1)
+            if self.next_run is not None else None
+        }
+
+
+class Scheduler:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.jitter = 5
+        self.lock_path = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._leader_lock = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('SCHEDULER_ENABLED', True) and not app.config.get('TESTING')
+        self.jitter = app.config.get('SCHEDULER_JITTER_SECONDS', self.jitter)
+        self.lock_path = app.config.get('SCHEDULER_LOCK_FILE') or \
+            os.path.join(tempfile.gettempdir(), 'agridata-scheduler.lock')
+        app.extensions['scheduler'] = self
+
+    def add_job(self, name, fn, interval, run_at_boot=True):
+        """Run fn() inside an app context every `interval` seconds (plus jitter)."""
+        with self._lock:
+            self._jobs[name] = Job(name, fn, interval, self.jitter, run_at_boot)
+        self._wake.set()
+
+    # --- Lifecycle ---
+
+    @property
+    def is_leader(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if not self.enabled or self.is_leader:
+            return False
+        # `python app.py` / `flask run` in debug first import the app in the
+        # reloader's watcher process, which never serves requests; only its
+        # child (WERKZEUG_RUN_MAIN=true) should compete for the lock
+        if self.app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true' \
+                and os.path.basename(sys.argv[0]) in ('app.py', 'flask'):
+            return False
+
+        lock = FileLock(self.lock_path)
+        if not lock.acquire(blocking=False):
+            return False
+        self._leader_lock = lock
+        self._thread = threading.Thread(target=self._run, name='agridata-scheduler', daemon=True)
+        self._thread.start()
+        print(f"⏱️ Scheduler started in worker {os.getpid()} with {len(self._jobs)} jobs")
+        return True
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                due = [j for j in self._jobs.values() if j.next_run is not None and j.next_run <= now]
+                upcoming = [j.next_run for j in self._jobs.values() if j.next_run is not None]
+            for job in due:
+                self._execute(job)
+
+            if not due:
+                wait = min(upcoming) - now if upcoming else 60
+                self._wake.wait(max(0.1, min(wait, 60)))
+                self._wake.clear()
+
+    def _execute(self, job):
+        started = time.perf_counter()
+        job.last_run_at = datetime.utcnow()
+        try:
+            with self.app.app_context():
+                job.fn()
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            print(f"⚠️ Scheduled job {job.name} failed: {e}")
+            traceback.print_exc()
+        finally:
+            elapsed = round((time.perf_counter() - started) * 1000, 2)
+            job.runs += 1
+            job.last_duration_ms = elapsed
+            job.total_duration_ms += elapsed
+            job.max_duration_ms = max(job.max_duration_ms, elapsed)
+            job.schedule_next(time.monotonic())
+
+    # --- Metrics ---
+
+    def stats(self):
+        with self._lock:
+            jobs = [job.to_dict() for job in self._jobs.values()]
+        return {
+            'enabled': self.enabled,
+            'leader': self.is_leader,
+            'pid': os.getpid(),
+            'jobs': jobs
+        }
+
+
+scheduler = Scheduler()
@@ -0,0 +1,138 @@
+from sqlalchemy import inspect, select, update, bindparam
+from sqlalchemy.exc import DBAPIError
+
+from models import db, Farmer, AgriculturalProduct
+
+# ============ Schema Upgrades ============
+# db.create_all() only creates missing tables; it never touches tables that
+# already exist. Nullable columns and indexes declared on the models after a
+# table was created are added here at startup so existing deployments get
+# them too, and derived columns are backfilled.
+#
+# Every gunicorn worker runs this at boot, at the same time. Each statement
+# runs on its own, and one that fails because another worker just made the
+# same table, column or index ("already exists", "duplicate column/key
+# name") is skipped instead of failing the worker (and with it the arbiter).
+
+
+def _run_ddl(statement, done):
+    """Run one DDL statement; False when it failed because another worker already did it."""
+    try:
+        statement()
+    except DBAPIError:
+        if not done():
+            raise
+        return False
+    return True
+
+
+def create_tables():
+    """db.create_all(), one table at a time, tolerating workers that boot together."""
+    for table in db.metadata.sorted_tables:
+        _run_ddl(lambda: table.create(bind=db.engine, checkfirst=True),
+                 lambda: inspect(db.engine).has_table(table.name))
+
+
+def _column_exists(table, name):
+    return name in {c['name'] for c in inspect(db.engine).get_columns(table)}
+
+
+def _index_exists(table, name):
+    return name in {ix['name'] for ix in inspect(db.engine).get_indexes(table)}
+
+
+def ensure_columns():
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            col_type = column.type.compile(dialect=db.engine.dialect)
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'
+
+            def add_column():
+                with db.engine.begin() as conn:
+                    conn.exec_driver_sql(ddl)
+
+            if _run_ddl(add_column, lambda: _column_exists(table.name, column.name)):
+                added.append(f'{table.name}.{column.name}')
+    if added:
+        print(f"🗂️ Added columns: {', '.join(added)}")
+
+
+def ensure_indexes():
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if _run_ddl(lambda: index.create(bind=db.engine), lambda: _index_exists(table.name, index.name)):
+                created.append(index.name)
+    if created:
+        print(f"🗂️ Created indexes: {', '.join(created)}")
+
+
+def backfill_sort_names(batch_size=1000):
+    """Fill farmers.sort_name for rows written before the column existed."""
+    total = 0
+    while True:
+        rows = db.session.execute(
+            select(Farmer.id, Farmer.first_name, Farmer.middle_name, Farmer.last_name, Farmer.suffix)
+            .where(Farmer.sort_name.is_(None)).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        db.session.connection().execute(
+            update(Farmer.__table__).where(Farmer.__table__.c.id == bindparam('row_id')),
+            [{'row_id': r.id, 'sort_name': Farmer.make_sort_name(r.first_name, r.middle_name, r.last_name, r.suffix)}
+             for r in rows]
+        )
+        db.session.commit()
+        total += len(rows)
+    if total:
+        print(f"🗂️ Backfilled sort_name for {total} farmers")
+
+
+def backfill_product_name_keys():
+    """Fill agricultural_products.name_key; later case-variants of a name keep NULL (see name_key index)."""
+    rows = db.session.execute(
+        select(AgriculturalProduct.id, AgriculturalProduct.name, AgriculturalProduct.name_key)
+        .order_by(AgriculturalProduct.id)
+    ).all()
+    taken = {r.name_key for r in rows if r.name_key is not None}
+    updates, duplicates = [], []
+    for r in rows:
+        if r.name_key is not None:
+            continue
+        key = AgriculturalProduct.make_name_key(r.name)
+        if key in taken:
+            duplicates.append(r.name)
+            continue
+        taken.add(key)
+        updates.append({'row_id': r.id, 'name_key': key})
+    if updates:
+        T = AgriculturalProduct.__table__
+        db.session.connection().execute(update(T).where(T.c.id == bindparam('row_id')), updates)
+        db.session.commit()
+        print(f"🗂️ Backfilled name_key for {len(updates)} products")
+    if duplicates:
+        print(f"⚠️ Products differing only by case/spacing: {', '.join(duplicates)}")
+
+
+def backfill_row_versions():
+    """Start farmers written before optimistic locking at row_version 1."""
+    T = Farmer.__table__
+    updated = db.session.execute(update(T).where(T.c.row_version.is_(None)).values(row_version=1)).rowcount
+    db.session.commit()
+    if updated:
+        print(f"🗂️ Backfilled row_version for {updated} farmers")
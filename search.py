@@ -0,0 +1,341 @@
+import re
+import threading
+from bisect import bisect_left, insort
+import time
+import unicodedata
+
+from sqlalchemy import select, func, event
+from sqlalchemy.orm import Session
+
+from models import db, Farmer, ChangeLog
+from sync import current_seq
+from versions import current_versions
+
+# ============ Farmer Search Index ============
+# An in-process inverted index over farmer names, code, address and contact
+# number, replacing the leading-wildcard ILIKE scan. Documents are split into
+# normalized tokens; each distinct token is posted to the farmers containing
+# it, and a trigram map over the (much smaller) token vocabulary answers
+# substring lookups without scanning it.
+#
+# Queries are split the same way. Every query token must match some field
+# token (AND); an exact token match scores above a prefix match, which scores
+# above a substring match, each weighted by the field it hit.
+#
+# Sync: writes made by this worker are applied after their transaction
+# commits. Writes made by other workers show up as a new data_versions
+# counter for 'farmers'; at most every SEARCH_INDEX_SYNC_SECONDS the index
+# then re-reads the farmers in change_log after the seq it last synced to
+# (seq is allocated in commit order, see sync.py, so nothing committed at or
+# below the head is missed) and drops the ones that are gone. A watermark
+# older than the retained log rebuilds the index.
+#
+# The same documents feed the typeahead: a sorted array of (key, farmer id)
+# pairs over "first ... last", "last first ..." and the farmer code, answered
+# with a bisect and a short forward walk. Only ids and display strings are
+# kept, and suggestions are served from memory.
+
+FIELD_WEIGHTS = {
+    'farmer_code': 3.0,
+    'last_name': 2.0,
+    'first_name': 2.0,
+    'middle_name': 1.0,
+    'suffix': 1.0,
+    'contact_number': 1.0,
+    'address': 0.5,
+}
+EXACT, PREFIX, SUBSTRING = 3.0, 2.0, 1.0
+SYNC_BATCH_SIZE = 1000  # changed farmers re-read per SELECT ... IN
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase, strip accents (Peña -> pena)."""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode()
+    return text.lower()
+
+
+def tokenize(text):
+    if not text:
+        return []
+    tokens = []
+    for chunk in normalize(text).split():
+        parts = _TOKEN_RE.findall(chunk)
+        tokens.extend(parts)
+        # Codes and phone numbers are also searchable without separators (F-0012 -> f0012)
+        if len(parts) > 1 and any(c.isdigit() for c in chunk):
+            tokens.append(''.join(parts))
+    return tokens
+
+
+def trigrams(token):
+    """Trigrams of the token plus its 1-2 character prefixes (marked '^') for short queries."""
+    grams = {token[i:i + 3] for i in range(len(token) - 2)}
+    grams.update('^' + token[:n] for n in (1, 2) if len(token) >= n)
+    return grams
+
+
+class FarmerSearchIndex:
+    def __init__(self, app=None):
+        self.enabled = True
+        self.sync_interval = 0
+        self.suggest_sync_interval = 10
+        self._lock = threading.RLock()
+        self._reset()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SEARCH_INDEX_ENABLED', True)
+        self.sync_interval = app.config.get('SEARCH_INDEX_SYNC_SECONDS', self.sync_interval)
+        self.suggest_sync_interval = app.config.get('SUGGEST_SYNC_SECONDS', self.suggest_sync_interval)
+        app.extensions['search_index'] = self
+
+    def _reset(self):
+        self._docs = {}        # farmer id -> document (tokens, display name, code, prefix keys)
+        self._prefixes = []    # sorted (key, farmer id) pairs for suggestions
+        self._postings = {}    # token -> {farmer id: field weight}
+        self._grams = {}       # trigram -> {token}
+        self._loaded = False
+        self._version = None
+        self._seq = None           # change_log seq the index is synced to
+        self._checked_at = 0.0     # monotonic time of the last version check
+
+    # --- Documents ---
+
+    @staticmethod
+    def document(row):
+        tokens = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(row, field)):
+                tokens[token] = max(tokens.get(token, 0), weight)
+
+        names = [row.first_name, row.middle_name, row.last_name, row.suffix]
+        name = " ".join(p for p in names if p).strip()
+        keys = set()
+        for ordered in (names, [row.last_name, row.first_name, row.middle_name, row.suffix]):
+            key = ' '.join(normalize(' '.join(p for p in ordered if p)).split())
+            if key:
+                keys.add(key)
+        if row.farmer_code:
+            code = normalize(row.farmer_code).strip()
+            keys.update({code, ''.join(_TOKEN_RE.findall(code))} - {''})
+        return {'tokens': tokens, 'name': name, 'code': row.farmer_code, 'keys': sorted(keys)}
+
+    def _remove(self, farmer_id):
+        doc = self._docs.pop(farmer_id, None)
+        if doc is None:
+            return
+        for key in doc['keys']:
+            i = bisect_left(self._prefixes, (key, farmer_id))
+            if i < len(self._prefixes) and self._prefixes[i] == (key, farmer_id):
+                del self._prefixes[i]
+        for token in doc['tokens']:
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(farmer_id, None)
+            if not posting:
+                del self._postings[token]
+                for gram in trigrams(token):
+                    bucket = self._grams.get(gram)
+                    if bucket is not None:
+                        bucket.discard(token)
+                        if not bucket:
+                            del self._grams[gram]
+
+    def _add(self, farmer_id, doc, keep_sorted=True):
+        self._remove(farmer_id)
+        self._docs[farmer_id] = doc
+        for key in doc['keys']:
+            if keep_sorted:
+                insort(self._prefixes, (key, farmer_id))
+            else:
+                self._prefixes.append((key, farmer_id))
+        for token, weight in doc['tokens'].items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                for gram in trigrams(token):
+                    self._grams.setdefault(gram, set()).add(token)
+            posting[farmer_id] = weight
+
+    def apply(self, upserts=(), deletes=()):
+        """Apply committed changes: upserts maps farmer id -> document."""
+        with self._lock:
+            if not self._loaded:
+                return
+            for farmer_id in deletes:
+                self._remove(farmer_id)
+            for farmer_id, doc in dict(upserts).items():
+                self._add(farmer_id, doc)
+
+    # --- Loading & sync ---
+
+    @staticmethod
+    def _columns():
+        return [Farmer.id] + [getattr(Farmer, f) for f in FIELD_WEIGHTS]
+
+    def _load(self):
+        self._reset()
+        self._version = current_versions(['farmers'])['farmers']
+        self._seq = current_seq()
+        rows = db.session.execute(select(*self._columns()).execution_options(yield_per=2000))
+        for row in rows:
+            self._add(row.id, self.document(row), keep_sorted=False)
+        self._prefixes.sort()
+        self._loaded = True
+        self._checked_at = time.monotonic()
+        print(f"🔎 Farmer search index built: {len(self._docs)} farmers, {len(self._postings)} tokens")
+
+    def _catch_up(self):
+        """Pick up writes committed by other workers since the last sync."""
+        version = current_versions(['farmers'])['farmers']
+        self._checked_at = time.monotonic()
+        if version == self._version:
+            return
+        head = current_seq()
+        oldest = db.session.execute(select(func.min(ChangeLog.seq))).scalar()
+        if oldest is not None and oldest > self._seq + 1:
+            self._load()  # entries after our watermark were purged
+            return
+
+        changed = list(db.session.execute(
+            select(ChangeLog.row_id).distinct()
+            .where(ChangeLog.table_name == Farmer.__tablename__, ChangeLog.seq > self._seq, ChangeLog.seq <= head)
+        ).scalars())
+        self._version, self._seq = version, head
+        for i in range(0, len(changed), SYNC_BATCH_SIZE):
+            chunk = changed[i:i + SYNC_BATCH_SIZE]
+            rows = {row.id: row for row in db.session.execute(select(*self._columns()).where(Farmer.id.in_(chunk)))}
+            for farmer_id in chunk:
+                if farmer_id in rows:
+                    self._add(farmer_id, self.document(rows[farmer_id]))
+                else:
+                    self._remove(farmer_id)
+
+    def ensure_fresh(self, max_age=None):
+        """Load on first use; re-check the data version once it is older than max_age seconds."""
+        max_age = self.sync_interval if max_age is None else max_age
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            elif time.monotonic() - self._checked_at >= max_age:
+                self._catch_up()
+
+    def invalidate(self):
+        with self._lock:
+            self._reset()
+
+    # --- Queries ---
+
+    def _matching_tokens(self, term):
+        """Vocabulary tokens matching a query token, with their match score."""
+        matches = {}
+        if term in self._postings:
+            matches[term] = EXACT
+        if len(term) >= 3:
+            grams = sorted((self._grams.get(g, set()) for g in trigrams(term) if g[0] != '^'), key=len)
+            candidates = set.intersection(*grams) if grams[0] else set()
+        else:
+            candidates = self._grams.get('^' + term, set())  # short terms only match as prefixes
+        for token in candidates:
+            if token == term:
+                continue
+            if token.startswith(term):
+                matches[token] = PREFIX
+            elif term in token:
+                matches[token] = SUBSTRING
+        return matches
+
+    def search(self, query, limit=None):
+        """Farmer ids matching every token of query, best first (all of them unless limit is given)."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        self.ensure_fresh()
+        with self._lock:
+            scores = None
+            for term in dict.fromkeys(terms):
+                term_scores = {}
+                for token, match in self._matching_tokens(term).items():
+                    for farmer_id, weight in self._postings[token].items():
+                        score = match * weight
+                        if score > term_scores.get(farmer_id, 0):
+                            term_scores[farmer_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {fid: s + term_scores[fid] for fid, s in scores.items() if fid in term_scores}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [farmer_id for farmer_id, _ in ranked[:limit]]
+
+    def suggest(self, prefix, limit=10):
+        """Up to limit {id, name, farmer_code} whose name (either order) or code starts with prefix."""
+        prefix = ' '.join(normalize(prefix).split())
+        if not prefix:
+            return []
+        self.ensure_fresh(self.suggest_sync_interval)
+        results = []
+        seen = set()
+        with self._lock:
+            # "f-0012" also matches codes stored without separators
+            for candidate in dict.fromkeys([prefix, ''.join(_TOKEN_RE.findall(prefix))]):
+                i = bisect_left(self._prefixes, (candidate,))
+                while candidate and i < len(self._prefixes) and len(results) < limit:
+                    key, farmer_id = self._prefixes[i]
+                    if not key.startswith(candidate):
+                        break
+                    if farmer_id not in seen:
+                        seen.add(farmer_id)
+                        doc = self._docs[farmer_id]
+                        results.append({'id': farmer_id, 'name': doc['name'], 'farmer_code': doc['code']})
+                    i += 1
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self._loaded,
+                'farmers': len(self._docs),
+                'suggest_keys': len(self._prefixes),
+                'tokens': len(self._postings),
+                'trigrams': len(self._grams),
+                'version': self._version,
+                'seq': self._seq,
+            }
+
+
+search_index = FarmerSearchIndex()
+
+
+# --- Same-worker writes: collected per flush, applied after commit ---
+
+@event.listens_for(Session, 'after_flush')
+def _collect_farmer_changes(session, flush_context):
+    pending = session.info.setdefault('search_changes', {'upserts': {}, 'deletes': set()})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Farmer) and obj not in session.deleted:
+            pending['upserts'][obj.id] = FarmerSearchIndex.document(obj)
+            pending['deletes'].discard(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Farmer):
+            pending['upserts'].pop(obj.id, None)
+            pending['deletes'].add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_farmer_changes(session):
+    pending = session.info.pop('search_changes', None)
+    if pending and (pending['upserts'] or pending['deletes']):
+        search_index.apply(pending['upserts'], pending['deletes'])
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_farmer_changes(session, previous_transaction):
+    # A savepoint (or failed flush) rollback keeps the outer transaction's changes
+    if previous_transaction.parent is None:
+        session.info.pop('search_changes', None)
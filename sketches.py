@@ -0,0 +1,178 @@
+import math
+
+# ============ Mergeable Quantile Sketch ============
+# A small merging t-digest (Dunning & Ertl). Values are summarized as
+# weighted centroids, dense near the tails and coarse around the median, so
+# p10/p50/p90 stay accurate with a few hundred bytes per sketch. Two digests
+# merge by pooling their centroids and re-compressing, which is what lets the
+# dashboard keep one sketch per barangay and per month and combine any slice
+# at query time.
+
+
+class TDigest:
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.centroids = []   # sorted [mean, weight] pairs
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._buffer = []
+
+    # --- Building ---
+
+    def add(self, value, weight=1):
+        if value is None:
+            return
+        value = float(value)
+        self._buffer.append([value, weight])
+        self.count += weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self._buffer) >= 5 * self.compression:
+            self.compress()
+
+    def merge(self, other):
+        return self.merge_all([other])
+
+    def merge_all(self, others):
+        """Merge several digests, re-compressing once instead of after each one."""
+        for other in others:
+            if not other.count:
+                continue
+            other.compress()
+            self._buffer.extend([list(c) for c in other.centroids])
+            self.count += other.count
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self.compress()
+        return self
+
+    def compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self.centroids + self._buffer, key=lambda c: c[0])
+        self._buffer = []
+        total = float(sum(w for _, w in points))
+
+        merged = [list(points[0])]
+        seen = 0.0
+        for mean, weight in points[1:]:
+            current = merged[-1]
+            proposed = current[1] + weight
+            q = (seen + proposed / 2.0) / total
+            if proposed <= max(1.0, 4.0 * total * q * (1.0 - q) / self.compression):
+                current[0] += (mean - current[0]) * weight / proposed
+                current[1] = proposed
+            else:
+                seen += current[1]
+                merged.append([mean, weight])
+        self.centroids = merged
+
+    # --- Queries ---
+
+    def quantile(self, q):
+        """Interpolated value at quantile q (0..1), or None when empty."""
+        self.compress()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+        q = min(1.0, max(0.0, q))
+        target = q * self.count
+
+        cumulative = 0.0
+        prev_mean, prev_center = self.min, 0.0
+        for mean, weight in self.centroids:
+            center = cumulative + weight / 2.0
+            if target < center:
+                if center == prev_center:
+                    return mean
+                return prev_mean + (mean - prev_mean) * (target - prev_center) / (center - prev_center)
+            prev_mean, prev_center = mean, center
+            cumulative += weight
+
+        if self.count == prev_center:
+            return self.max
+        return prev_mean + (self.max - prev_mean) * (target - prev_center) / (self.count - prev_center)
+
+    def cdf(self, value):
+        """Fraction of the weight at or below value."""
+        self.compress()
+        if not self.centroids:
+            return 0.0
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+
+        cumulative = 0.0
+        prev_mean, prev_center = self.min, 0.0
+        for mean, weight in self.centroids:
+            center = cumulative + weight / 2.0
+            if value < mean:
+                if mean == prev_mean:
+                    return prev_center / self.count
+                return (prev_center + (center - prev_center) * (value - prev_mean) / (mean - prev_mean)) / self.count
+            prev_mean, prev_center = mean, center
+            cumulative += weight
+
+        if self.max == prev_mean:
+            return 1.0
+        return (prev_center + (self.count - prev_center) * (value - prev_mean) / (self.max - prev_mean)) / self.count
+
+    def histogram(self, bins=10):
+        """Equal-width bins between min and max with estimated counts."""
+        self.compress()
+        if not self.count:
+            return []
+        if self.max == self.min:
+            return [{'from': self.min, 'to': self.max, 'count': int(self.count)}]
+        width = (self.max - self.min) / bins
+        edges = [self.min + i * width for i in range(bins)] + [self.max]
+        cdfs = [0.0] + [self.cdf(e) for e in edges[1:-1]] + [1.0]
+        return [
+            {
+                'from': round(edges[i], 2),
+                'to': round(edges[i + 1], 2),
+                'count': int(round((cdfs[i + 1] - cdfs[i]) * self.count))
+            }
+            for i in range(bins)
+        ]
+
+    # --- Serialization ---
+
+    def to_dict(self):
+        self.compress()
+        return {
+            'c': [[round(m, 4), w] for m, w in self.centroids],
+            'n': self.count,
+            'min': self.min,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data, compression=100):
+        digest = cls(compression)
+        if data:
+            digest.centroids = [list(c) for c in data.get('c', [])]
+            digest.count = data.get('n', 0)
+            digest.min = data.get('min')
+            digest.max = data.get('max')
+        return digest
+
+    def summary(self, bins=10):
+        if not self.count:
+            return {'count': 0, 'min': None, 'p10': None, 'median': None, 'p90': None, 'max': None, 'histogram': []}
+
+        def rounded(v):
+            return None if v is None or math.isnan(v) else round(v, 2)
+
+        return {
+            'count': int(self.count),
+            'min': rounded(self.min),
+            'p10': rounded(self.quantile(0.10)),
+            'median': rounded(self.quantile(0.50)),
+            'p90': rounded(self.quantile(0.90)),
+            'max': rounded(self.max),
+            'histogram': self.histogram(bins)
+        }
@@ -0,0 +1,386 @@
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import select, update, insert, delete, func, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import (
+    db, DataVersion, ChangeLog, Barangay, Organization, AgriculturalProduct, Farmer, FarmerProduct, FarmerChild,
+    FarmerExperience,
+)
+from versions import bump_pending_versions
+
+# ============ Offline Delta Sync ============
+# Field encoders keep a local copy of the registry and sync it instead of
+# re-downloading every list. Each committed write to a synced table appends
+# (seq, table, row id) to change_log. seq comes from the data_versions
+# counter of change_log, taken right before COMMIT after every other
+# statement of the writing transaction (including the table counter bumps,
+# see versions.py), so its row lock is held only for the commit itself and
+# always taken last. Sequence numbers are gap-free and appear in commit order:
+# a client that has seen everything up to seq N misses nothing by asking for
+# seq > N next time.
+#
+# Rows are collected from every ORM flush and from bulk UPDATE/DELETE
+# statements (their WHERE clause is re-run as one SELECT of ids). The log
+# stores no payloads: a pull returns each changed row's current state, or a
+# delete when the row is gone, so several writes to a row cost one entry in
+# the response.
+#
+#   GET  /api/sync/pull?since=N   changes after N, in pages; since=0 (or a
+#                                 token older than the retained log) answers
+#                                 reset=true: re-download the lists first
+#   POST /api/sync/push           queued local creates/updates/deletes; an
+#                                 update/delete whose row changed after the
+#                                 client's base_seq is a conflict, not applied
+
+SYNC_MODELS = {
+    'barangays': Barangay,
+    'organizations': Organization,
+    'agricultural_products': AgriculturalProduct,
+    'farmers': Farmer,
+    'farmer_products': FarmerProduct,
+    'farmer_children': FarmerChild,
+    'farmer_experiences': FarmerExperience,
+}
+SEQUENCE = ChangeLog.__tablename__
+PENDING_KEY = 'sync_changes'
+
+# Columns a client may set through push (reference tables are pull-only)
+PUSH_FIELDS = {
+    'farmers': (
+        'farmer_code', 'first_name', 'middle_name', 'last_name', 'suffix', 'age', 'gender', 'birth_date',
+        'barangay_id', 'organization_id', 'address', 'contact_number', 'education_level', 'annual_income',
+        'income_source', 'number_of_children', 'children_farming_involvement', 'primary_occupation',
+        'secondary_occupation', 'farm_size_hectares', 'land_ownership', 'years_farming', 'civil_status',
+    ),
+    'farmer_products': ('farmer_id', 'product_id', 'production_volume', 'unit', 'is_primary', 'selling_price'),
+    'farmer_children': (
+        'farmer_id', 'name', 'age', 'gender', 'education_level', 'continues_farming', 'involvement_level',
+        'current_occupation', 'notes',
+    ),
+    'farmer_experiences': (
+        'farmer_id', 'experience_type', 'title', 'description', 'date_recorded', 'location', 'context',
+        'impact_level', 'comments_enabled',
+    ),
+}
+# Who may delete through push, mirroring the DELETE routes. Farmers are deleted
+# through DELETE /api/farmers/<id>, which also removes their profile image.
+PUSH_DELETE_ROLES = {
+    'farmer_products': ('admin', 'researcher', 'data_encoder'),
+    'farmer_children': ('admin', 'researcher'),
+    'farmer_experiences': ('admin',),
+}
+
+
+class SyncError(ValueError):
+    pass
+
+
+# --- Change capture ---
+
+def record_changes(session, table, ids):
+    """Queue rows written outside the ORM flush (e.g. Core INSERTs) for the change log."""
+    if table in SYNC_MODELS:
+        session.info.setdefault(PENDING_KEY, set()).update((table, row_id) for row_id in ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_rows(session, flush_context):
+    rows = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table not in SYNC_MODELS or (obj in session.dirty and not session.is_modified(obj)):
+            continue
+        rows.add((table, obj.id))
+    if rows:
+        session.info.setdefault(PENDING_KEY, set()).update(rows)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_rows(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = orm_execute_state.statement.table
+    if getattr(table, 'name', None) not in SYNC_MODELS:
+        return
+    # Before the statement runs, so deleted rows are still there to be found
+    query = select(table.c.id)
+    if orm_execute_state.statement.whereclause is not None:
+        query = query.where(orm_execute_state.statement.whereclause)
+    ids = orm_execute_state.session.connection().execute(query).scalars()
+    record_changes(orm_execute_state.session, table.name, ids)
+
+
+def _allocate(connection, count):
+    """Reserve `count` sequence numbers; the row lock orders writers until they commit."""
+    T = DataVersion.__table__
+    if not connection.execute(
+        update(T).where(T.c.table_name == SEQUENCE).values(version=T.c.version + count)
+    ).rowcount:
+        connection.execute(insert(T).values(table_name=SEQUENCE, version=count))
+    return connection.execute(select(T.c.version).where(T.c.table_name == SEQUENCE)).scalar() - count + 1
+
+
+def _log_order(row):
+    # Referenced tables first, so a client applying a pull in seq order meets parents before children
+    table, row_id = row
+    return _TABLE_ORDER[table], row_id
+
+
+_TABLE_ORDER = {table: i for i, table in enumerate(SYNC_MODELS)}
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_change_log(session):
+    if session.in_nested_transaction():
+        return  # savepoint release: the outer commit writes the log
+    # commit() would flush after this hook; flush now so its rows are logged too
+    session.flush()
+    rows = session.info.pop(PENDING_KEY, None)
+    if not rows:
+        return
+    # Table counters before the sequence, whichever before_commit hook runs first
+    bump_pending_versions(session)
+    connection = session.connection()
+    first = _allocate(connection, len(rows))
+    now = datetime.utcnow()
+    connection.execute(insert(ChangeLog.__table__), [
+        {'seq': first + i, 'table_name': table, 'row_id': row_id, 'changed_at': now}
+        for i, (table, row_id) in enumerate(sorted(rows, key=_log_order))
+    ])
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_change_rows(session, previous_transaction):
+    # A savepoint (or failed flush) rollback keeps the rest of the transaction;
+    # rows it touched are logged anyway and pulled as their current state
+    if previous_transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+
+# --- Pull ---
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def row_data(table, row):
+    """Column values of a row (ORM object or Core row mapping) as JSON-safe data."""
+    columns = SYNC_MODELS[table].__table__.columns
+    if isinstance(row, db.Model):
+        return {c.name: _json_value(getattr(row, c.key)) for c in columns}
+    return {c.name: _json_value(row[c]) for c in columns}
+
+
+def current_seq():
+    T = DataVersion.__table__
+    return db.session.execute(select(T.c.version).where(T.c.table_name == SEQUENCE)).scalar() or 0
+
+
+def pull_changes(since, limit, tables=None):
+    """Changes with seq > since, oldest first, at most `limit` log entries per page."""
+    tables = tables or list(SYNC_MODELS)
+    unknown = [t for t in tables if t not in SYNC_MODELS]
+    if unknown:
+        raise SyncError(f"Unknown tables: {', '.join(unknown)}. Available: {', '.join(SYNC_MODELS)}")
+
+    # Everything up to the committed counter is visible; later seqs belong to open transactions
+    head = current_seq()
+    oldest = db.session.execute(select(func.min(ChangeLog.seq))).scalar()
+    horizon = oldest - 1 if oldest is not None else head
+    if since <= 0 or since < horizon or since > head:
+        return {'reset': True, 'next_since': head, 'has_more': False, 'changes': []}
+
+    entries = db.session.execute(
+        select(ChangeLog.seq, ChangeLog.table_name, ChangeLog.row_id)
+        .where(ChangeLog.seq > since, ChangeLog.seq <= head, ChangeLog.table_name.in_(tables))
+        .order_by(ChangeLog.seq).limit(limit)
+    ).all()
+    has_more = len(entries) == limit
+    next_since = entries[-1].seq if has_more else head
+
+    latest = {}
+    for seq, table, row_id in entries:
+        latest[(table, row_id)] = seq
+    ids_by_table = defaultdict(set)
+    for table, row_id in latest:
+        ids_by_table[table].add(row_id)
+    found = {}
+    for table, ids in ids_by_table.items():
+        T = SYNC_MODELS[table].__table__
+        for row in db.session.execute(select(T).where(T.c.id.in_(ids))).mappings():
+            found[(table, row[T.c.id])] = row_data(table, row)
+
+    changes = []
+    for (table, row_id), seq in sorted(latest.items(), key=lambda item: item[1]):
+        data = found.get((table, row_id))
+        changes.append({'seq': seq, 'table': table, 'id': row_id,
+                        'op': 'upsert' if data is not None else 'delete', 'data': data})
+    return {'reset': False, 'next_since': next_since, 'has_more': has_more, 'changes': changes}
+
+
+def purge_change_log():
+    """Drop entries older than SYNC_RETENTION_DAYS; clients behind that get reset=true."""
+    days = current_app.config.get('SYNC_RETENTION_DAYS', 90)
+    T = ChangeLog.__table__
+    # A prefix of the log (seq follows commit time); Core so no listener treats it as a write
+    removed = db.session.connection().execute(
+        delete(T).where(T.c.changed_at < datetime.utcnow() - timedelta(days=days))
+    ).rowcount
+    db.session.commit()
+    if removed:
+        print(f"🧹 Purged {removed} change log entries")
+    return removed
+
+
+# --- Push ---
+
+def _coerce(column, value):
+    if value is None or (value == '' and column.type.python_type is not str):
+        return None
+    kind = column.type.python_type
+    try:
+        if kind is bool:
+            return value in (True, 1, '1', 'true', 'True')
+        if kind is int:
+            return int(value)
+        if kind is Decimal:
+            return Decimal(str(value))
+        if kind is float:
+            return float(value)
+        if kind is date:
+            return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+        return str(value)
+    except (ValueError, TypeError, InvalidOperation):
+        raise SyncError(f'{column.name} has an invalid value')
+
+
+def _values(table, data, refs):
+    if not isinstance(data, dict):
+        raise SyncError('data must be an object')
+    allowed = PUSH_FIELDS[table]
+    unknown = [k for k in data if k not in allowed]
+    if unknown:
+        raise SyncError(f"Cannot set: {', '.join(unknown)}")
+    columns = SYNC_MODELS[table].__table__.columns
+    values = {}
+    for name, value in data.items():
+        if isinstance(value, dict) and 'ref' in value:
+            # A row created earlier in the same push, e.g. a new farmer's children
+            if value['ref'] not in refs:
+                raise SyncError(f"{name} refers to unknown ref '{value['ref']}'")
+            value = refs[value['ref']]
+        values[name] = _coerce(columns[name], value)
+    for name, value in values.items():
+        for fk in columns[name].foreign_keys:
+            target = fk.column.table
+            if value is not None and db.session.execute(
+                select(target.c.id).where(target.c.id == value)
+            ).first() is None:
+                raise SyncError(f'{name} {value} does not exist')
+    return values
+
+
+def _last_seq(table, row_id):
+    return db.session.execute(
+        select(func.max(ChangeLog.seq)).where(ChangeLog.table_name == table, ChangeLog.row_id == row_id)
+    ).scalar() or 0
+
+
+def _apply(item, user, refs):
+    if not isinstance(item, dict):
+        raise SyncError('each change must be an object')
+    table, op = item.get('table'), item.get('op')
+    if table not in PUSH_FIELDS:
+        raise SyncError(f"table must be one of: {', '.join(PUSH_FIELDS)}")
+    model = SYNC_MODELS[table]
+
+    if op == 'create':
+        values = _values(table, item.get('data') or {}, refs)
+        row = model(**values)
+        if table == 'farmers':
+            row.data_encoder_id = user.id
+        elif table == 'farmer_experiences':
+            row.interviewer_id = user.id
+        with db.session.begin_nested():
+            db.session.add(row)
+        if item.get('ref') is not None:
+            refs[item['ref']] = row.id
+        return {'status': 'applied', 'id': row.id, 'data': row_data(table, row)}
+
+    if op not in ('update', 'delete'):
+        raise SyncError('op must be create, update or delete')
+    if op == 'delete' and user.role not in PUSH_DELETE_ROLES.get(table, ()):
+        raise SyncError(f'Not allowed to delete {table}')
+    try:
+        row_id, base_seq = int(item['id']), int(item['base_seq'])
+    except (KeyError, ValueError, TypeError):
+        raise SyncError('update and delete need an integer id and base_seq')
+
+    # Lock the row so nobody changes it between the conflict check and our write
+    row = db.session.get(model, row_id, with_for_update=True, populate_existing=True)
+    if row is None:
+        if op == 'delete':
+            return {'status': 'applied', 'id': row_id, 'data': None}
+        return {'status': 'conflict', 'id': row_id, 'data': None, 'seq': _last_seq(table, row_id)}
+    seq = _last_seq(table, row_id)
+    if seq > base_seq:
+        return {'status': 'conflict', 'id': row_id, 'data': row_data(table, row), 'seq': seq}
+
+    if op == 'delete':
+        with db.session.begin_nested():
+            db.session.delete(row)
+        return {'status': 'applied', 'id': row_id, 'data': None}
+    values = _values(table, item.get('data') or {}, refs)
+    with db.session.begin_nested():
+        for name, value in values.items():
+            setattr(row, name, value)
+    return {'status': 'applied', 'id': row_id, 'data': row_data(table, row)}
+
+
+def apply_push(items, user):
+    """
+    Apply queued client changes in order, each in its own savepoint; returns one
+    result per item. The caller commits, then calls fill_seqs(results).
+    """
+    refs = {}
+    results = []
+    for item in items:
+        ref = item.get('ref') if isinstance(item, dict) else None
+        try:
+            result = _apply(item, user, refs)
+        except SyncError as e:
+            result = {'status': 'error', 'error': str(e)}
+        except IntegrityError as e:
+            result = {'status': 'error', 'error': str(e.orig)}
+        result.update(ref=ref, table=item.get('table') if isinstance(item, dict) else None)
+        results.append(result)
+    return results
+
+
+def fill_seqs(results):
+    """After commit: the seq of each applied row, the client's base_seq for its next edit."""
+    ids_by_table = defaultdict(set)
+    for result in results:
+        if result['status'] == 'applied':
+            ids_by_table[result['table']].add(result['id'])
+    seqs = {}
+    for table, ids in ids_by_table.items():
+        seqs.update(((table, row_id), seq) for row_id, seq in db.session.execute(
+            select(ChangeLog.row_id, func.max(ChangeLog.seq))
+            .where(ChangeLog.table_name == table, ChangeLog.row_id.in_(ids))
+            .group_by(ChangeLog.row_id)
+        ))
+    for result in results:
+        if result['status'] == 'applied':
+            result['seq'] = seqs.get((result['table'], result['id']), 0)
+    return results
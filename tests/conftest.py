@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# A throwaway SQLite file unless TEST_DATABASE_URL points somewhere else;
+# no background jobs while the tests run
+os.environ.setdefault('TEST_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db'))
+os.environ.setdefault('SCHEDULER_ENABLED', 'false')
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from models import db, User, Barangay, Organization, Farmer
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        admin = User(username='admin', email='admin@example.com', full_name='Admin', role='admin')
+        admin.set_password('admin')
+        db.session.add(admin)
+        db.session.add_all([Barangay(name=f'Barangay {i}', municipality='San Pablo', province='Laguna',
+                                     region='IV-A') for i in range(5)])
+        db.session.add_all([Organization(name=f'Organization {i}', type='Cooperative') for i in range(3)])
+        db.session.commit()
+    return app
+
+
+@pytest.fixture(scope='session')
+def auth_headers(app):
+    with app.app_context():
+        admin = User.query.filter_by(username='admin').one()
+        return {'Authorization': 'Bearer ' + create_access_token(identity=str(admin.id))}
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_farmers(app):
+    """Create farmers spread over the seeded barangays and organizations; removed after the test."""
+    created = []
+
+    def make(count):
+        with app.app_context():
+            farmers = [Farmer(
+                first_name=f'Juan{i}', last_name=f'Dela Cruz{i}', farmer_code=f'T-{len(created) + i:05d}',
+                age=20 + i % 50, gender=['Male', 'Female'][i % 2], barangay_id=1 + i % 5,
+                organization_id=1 + i % 3, education_level=['College', 'Elementary'][i % 2],
+                annual_income=1000 * (i + 1), farm_size_hectares=1.5,
+            ) for i in range(count)]
+            db.session.add_all(farmers)
+            db.session.commit()
+            created.extend(f.id for f in farmers)
+        return created
+
+    yield make
+    with app.app_context():
+        # Through the session, so the dashboard aggregates follow
+        for farmer in Farmer.query.filter(Farmer.id.in_(created)):
+            db.session.delete(farmer)
+        db.session.commit()
@@ -0,0 +1,38 @@
+import bulk
+from models import db, ActivityLog, Farmer
+
+# Bulk updates commit chunk by chunk, each with its own audit entry. When a
+# chunk fails the response says which ids were already applied and which
+# were not, and the activity log records exactly the committed chunks.
+
+
+def test_failed_chunk_reports_committed_progress(app, client, auth_headers, make_farmers, monkeypatch):
+    ids = sorted(make_farmers(5)[-5:])
+    monkeypatch.setitem(app.config, 'BULK_CHUNK_SIZE', 2)
+    apply = bulk.apply_farmer_contributions
+    calls = []
+
+    def fail_second_chunk(*args):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError('lost connection')
+        return apply(*args)
+
+    monkeypatch.setattr(bulk, 'apply_farmer_contributions', fail_second_chunk)
+    with app.app_context():
+        logs_before = ActivityLog.query.filter_by(action='FARMERS BULK UPDATED').count()
+
+    res = client.post('/api/farmers/bulk-update', json={'ids': ids, 'set': {'land_ownership': 'Tenant'}},
+                      headers=auth_headers)
+    assert res.status_code == 500
+    body = res.get_json()
+    assert body['updated'] == 2
+    assert body['committed_ids'] == ids[:2]
+    assert body['remaining_ids'] == ids[2:]
+
+    with app.app_context():
+        ownership = dict(db.session.execute(db.select(Farmer.id, Farmer.land_ownership).where(Farmer.id.in_(ids))).all())
+        assert [ownership[i] == 'Tenant' for i in ids] == [True, True, False, False, False]
+        logs = ActivityLog.query.filter_by(action='FARMERS BULK UPDATED').order_by(ActivityLog.id).all()
+        assert len(logs) == logs_before + 1
+        assert logs[-1].details.startswith(f'Updated 2 farmers (ids {ids[0]}..{ids[1]})')
@@ -0,0 +1,67 @@
+import statistics
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import analytics
+from models import db, Farmer
+
+# Dashboard reads are served from the aggregate tables (dashboard_summary,
+# daily_rollups, farmer_metric_sketches) and never write: stale sketches are
+# recomputed in memory until the scheduler rebuilds them, and a barangay over
+# a month range is merged from its per-(barangay, month) sketches.
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+@contextmanager
+def record_statements(app):
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lstrip())
+
+    def commit(conn):
+        statements.append('COMMIT')
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'commit', commit)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        event.remove(engine, 'commit', commit)
+
+
+def test_dashboard_reads_never_write(app, client, auth_headers, make_farmers):
+    ids = make_farmers(20)
+    with app.app_context():
+        farmer = db.session.get(Farmer, ids[0])
+        farmer.annual_income = 123456  # marks its sketches stale
+        db.session.commit()
+
+    with record_statements(app) as statements:
+        for url in ('/api/dashboard/stats?range=all', '/api/dashboard/distributions',
+                    '/api/dashboard/distributions?barangay_id=1&from=2000-01&to=2999-12'):
+            res = client.get(url, headers=auth_headers)
+            assert res.status_code == 200, res.get_json()
+    assert not [s for s in statements if s.upper().startswith(WRITES + ('COMMIT',))]
+
+
+def test_barangay_month_distribution_matches_raw_rows(app, client, auth_headers, make_farmers):
+    make_farmers(25)
+    with app.app_context():
+        analytics.rebuild_stale_sketches()  # the scheduler's job; earlier tests deleted farmers
+    with record_statements(app) as statements:
+        res = client.get('/api/dashboard/distributions?barangay_id=2&from=2000-01&to=2999-12&metrics=annual_income',
+                         headers=auth_headers)
+    assert res.status_code == 200, res.get_json()
+    # Merged from sketch rows, not a scan of the farmers table
+    assert not [s for s in statements if 'FROM farmers' in s]
+    with app.app_context():
+        incomes = [f.annual_income for f in Farmer.query.filter_by(barangay_id=2)]
+    income = res.get_json()['distributions']['annual_income']
+    assert income['count'] == len(incomes)
+    assert income['median'] == statistics.median(incomes)
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import event
+
+from models import db
+
+# The farmer list filters and sorts should be answered from the indexes
+# declared on Farmer, FarmerProduct and FarmerChild (see filters.py). Each
+# case runs the real /api/farmers request, captures the statement that
+# fetches the page and checks SQLite's EXPLAIN QUERY PLAN for it.
+
+CASES = [
+    ('gender=Female&age_min=30&age_max=50', 'ix_farmers_gender_age'),
+    ('barangay_id=1&gender=Male', 'ix_farmers_barangay_gender'),
+    ('education_level=College', 'ix_farmers_education_level'),
+    ('civil_status=Married', 'ix_farmers_civil_status'),
+    ('land_ownership=Owner', 'ix_farmers_land_ownership'),
+    ('income_min=1000&sort_by=annual_income', 'ix_farmers_annual_income'),
+    ('farm_size_min=1&sort_by=farm_size_hectares', 'ix_farmers_farm_size'),
+    ('years_farming_min=5&sort_by=years_farming', 'ix_farmers_years_farming'),
+    ('product_id=1', 'ix_farmer_products_product_farmer'),
+    ('has_successor=true', 'ix_farmer_children_farmer_successor'),
+    ('sort_by=name&sort_order=asc', 'ix_farmers_sort_name'),
+    ('sort_by=created_at', 'ix_farmers_created_at'),
+]
+
+
+def page_statement(app, client, auth_headers, query):
+    """The SELECT ... FROM farmers ... LIMIT statement /api/farmers?query runs, with its parameters."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM farmers' in statement and 'LIMIT' in statement and 'count(' not in statement:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        res = client.get(f'/api/farmers?{query}&count=none', headers=auth_headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert res.status_code == 200, res.get_json()
+    assert statements, f'no page query captured for {query}'
+    return statements[-1]
+
+
+@pytest.mark.parametrize('query,index', CASES)
+def test_filtered_and_sorted_list_uses_index(app, client, auth_headers, make_farmers, query, index):
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            pytest.skip('EXPLAIN QUERY PLAN output is SQLite specific')
+    make_farmers(20)
+    statement, parameters = page_statement(app, client, auth_headers, query)
+    with app.app_context():
+        plan = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    details = [row[-1] for row in plan]
+    assert any(f'USING INDEX {index}' in d or f'USING COVERING INDEX {index}' in d for d in details), details
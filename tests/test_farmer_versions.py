@@ -0,0 +1,27 @@
+import json
+
+# Every farmer save moves row_version by exactly one, whether it changes the
+# farmer's own columns, only its products, or both, so the ETag a client
+# gets back is always the next version after the one it sent in If-Match.
+
+
+def save(client, auth_headers, farmer_id, etag, **form):
+    res = client.put(f'/api/farmers/{farmer_id}', data=form, headers={**auth_headers, 'If-Match': f'"{etag}"'})
+    assert res.status_code == 200, res.get_json()
+    return res.headers['ETag'].strip('"')
+
+
+def test_each_save_bumps_row_version_once(client, auth_headers, make_farmers):
+    farmer_id = make_farmers(1)[-1]
+    products = json.dumps([{'product_name': 'Rice', 'production_volume': 10}])
+
+    assert save(client, auth_headers, farmer_id, 'v1', first_name='Jose', products=products) == 'v2'
+    # Only the products change
+    products = json.dumps([{'product_name': 'Rice', 'production_volume': 25}, {'product_name': 'Corn'}])
+    assert save(client, auth_headers, farmer_id, 'v2', products=products) == 'v3'
+    # Nothing changes
+    assert save(client, auth_headers, farmer_id, 'v3', products=products) == 'v4'
+
+    res = client.put(f'/api/farmers/{farmer_id}', data={'first_name': 'Stale'},
+                     headers={**auth_headers, 'If-Match': '"v3"'})
+    assert res.status_code == 412
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from models import db, AgriculturalProduct, Farmer
+from product_names import product_names, ProductNameError
+
+# Farmer saves resolve product names through product_names.resolve(): known
+# names map to their rows whatever their case or spacing, unknown ones are
+# created once, and a name that can be neither created nor found fails the
+# save instead of being dropped from it.
+
+
+def farmer_form(code, *names):
+    return {
+        'first_name': 'Pedro', 'last_name': 'Santos', 'farmer_code': code, 'age': '40', 'gender': 'Male',
+        'barangay_id': '1', 'products': json.dumps([{'product_name': name} for name in names]),
+    }
+
+
+def test_resolve_matches_existing_names_and_creates_missing_ones(app):
+    with app.test_request_context():
+        db.session.add(AgriculturalProduct(name='Cacao', category='Crop'))
+        db.session.commit()
+        ids = product_names.resolve([(' cacao ', 'Crop'), ('Black  Pepper', 'Crop'), ('black pepper', 'Crop')])
+        db.session.commit()
+        products = AgriculturalProduct.query.filter(AgriculturalProduct.id.in_(ids.values())).all()
+        assert sorted(p.name for p in products) == ['Black Pepper', 'Cacao']
+        assert AgriculturalProduct.query.filter_by(name_key='black pepper').count() == 1
+
+
+def test_unresolvable_product_fails_the_save(app, client, auth_headers, monkeypatch):
+    # The INSERT skipped the name (as for a duplicate) but no row can be found for it
+    monkeypatch.setattr(product_names, '_insert_missing', lambda entries: None)
+    with app.test_request_context(), pytest.raises(ProductNameError):
+        product_names.resolve([('Vanilla', 'Crop')])
+
+    res = client.post('/api/farmers', data=farmer_form('PN-00001', 'Vanilla'), headers=auth_headers)
+    assert res.status_code == 400
+    assert 'Vanilla' in res.get_json()['error']
+    with app.app_context():
+        assert Farmer.query.filter_by(farmer_code='PN-00001').count() == 0
@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+from datetime import date
+
+from sqlalchemy import event
+
+from models import (
+    db, User, AgriculturalProduct, Farmer, FarmerProduct, FarmerChild, FarmerExperience, ExperienceComment,
+)
+
+# The farmer list and the farmer profile load their relations with a fixed
+# set of statements (joinedload/selectinload, see app.get_farmers and
+# farmer_detail.py). Bigger pages or bigger profiles must not add queries.
+
+
+@contextmanager
+def count_queries(app):
+    with app.app_context():
+        engine = db.engine
+    counter = {'n': 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['n'] += 1
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def list_queries(app, client, auth_headers, per_page):
+    url = f'/api/farmers?per_page={per_page}&sort_by=created_at'
+    client.get(url, headers=auth_headers)  # same caches warm for both sizes (count, JWT user)
+    with count_queries(app) as counter:
+        res = client.get(url, headers=auth_headers)
+    assert res.status_code == 200, res.get_json()
+    assert len(res.get_json()['farmers']) == per_page
+    return counter['n']
+
+
+def test_farmer_list_query_count_is_constant(app, client, auth_headers, make_farmers):
+    make_farmers(30)
+    assert list_queries(app, client, auth_headers, 2) == list_queries(app, client, auth_headers, 30)
+
+
+def make_profile(app, size):
+    """A farmer with size products, children and experiences, each experience with size comments and likes."""
+    with app.app_context():
+        admin = User.query.filter_by(username='admin').one()
+        products = AgriculturalProduct.query.order_by(AgriculturalProduct.id).limit(size).all()
+        for i in range(len(products), size):
+            products.append(AgriculturalProduct(name=f'Crop {i}', category='Crop'))
+        farmer = Farmer(first_name='Maria', last_name=f'Profile{size}', farmer_code=f'P-{Farmer.query.count():05d}', age=40,
+                        gender='Female', barangay_id=1, organization_id=1, education_level='College')
+        for i in range(size):
+            farmer.products.append(FarmerProduct(product=products[i]))
+            farmer.children.append(FarmerChild(name=f'Child {i}', age=10 + i, continues_farming=i % 2 == 0))
+            experience = FarmerExperience(experience_type='Success Story', title=f'Harvest {i}',
+                                          description='A good season', date_recorded=date(2024, 1, 1),
+                                          interviewer_id=admin.id)
+            experience.liked_by.append(admin)
+            for j in range(size):
+                comment = ExperienceComment(user_id=admin.id, text=f'Comment {j}')
+                comment.liked_by.append(admin)
+                experience.comments.append(comment)
+            farmer.experiences.append(experience)
+        db.session.add(farmer)
+        db.session.commit()
+        return farmer.id
+
+
+def detail_queries(app, client, auth_headers, farmer_id):
+    # First request for this farmer: a response-cache miss, so the profile is really loaded
+    with count_queries(app) as counter:
+        res = client.get(f'/api/farmers/{farmer_id}', headers=auth_headers)
+    assert res.status_code == 200, res.get_json()
+    assert res.headers.get('X-Cache') == 'MISS'
+    return counter['n']
+
+
+def test_farmer_detail_query_count_is_constant(app, client, auth_headers):
+    warmup, small, large = make_profile(app, 1), make_profile(app, 2), make_profile(app, 6)
+    client.get(f'/api/farmers/{warmup}', headers=auth_headers)  # one-off per-process work
+    try:
+        assert detail_queries(app, client, auth_headers, small) == detail_queries(app, client, auth_headers, large)
+    finally:
+        with app.app_context():
+            for farmer in Farmer.query.filter(Farmer.id.in_([warmup, small, large])):
+                db.session.delete(farmer)
+            db.session.commit()
@@ -0,0 +1,62 @@
+from sqlalchemy import event
+
+from models import db, Farmer, FarmerChild, DataVersion
+from versions import current_versions
+
+# The data_versions counters are shared by every writer of a table, and a
+# bump row-locks them until COMMIT. A transaction therefore bumps them only
+# once, just before COMMIT: one UPDATE over all the tables it touched (in
+# table-name order, so two writers always lock them in the same order),
+# followed by the change_log sequence as its very last statement.
+
+
+def test_counters_are_bumped_once_right_before_commit(app):
+    with app.app_context():
+        engine = db.engine
+        before = current_versions(['farmers', 'farmer_children', 'change_log'])
+        db.session.rollback()
+
+        statements = []
+        committed = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if not committed:  # after COMMIT only the response-cache invalidation runs
+                statements.append((statement.lstrip(), parameters))
+
+        def commit(conn):
+            committed.append(True)
+
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'commit', commit)
+        try:
+            # Two flushes touching the tables in opposite name order
+            farmer = Farmer(first_name='Ana', last_name='Reyes', farmer_code='VC-00001', age=30, gender='Female',
+                            barangay_id=1, education_level='College')
+            db.session.add(farmer)
+            db.session.flush()
+            db.session.add(FarmerChild(farmer_id=farmer.id, name='Ben', age=5))
+            db.session.flush()
+            db.session.commit()
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+            event.remove(engine, 'commit', commit)
+
+        writes = [(sql, params) for sql, params in statements if sql.upper().startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        counters = [i for i, (sql, params) in enumerate(writes) if sql.startswith('UPDATE data_versions')]
+        assert len(counters) == 2
+        bump, seq = counters
+        # Table counters: one UPDATE after every data write of both flushes
+        assert {'farmers', 'farmer_children'} <= set(writes[bump][1])
+        assert bump > max(i for i, (sql, params) in enumerate(writes) if 'data_versions' not in sql
+                          and not sql.startswith('INSERT INTO change_log'))
+        # Then the change_log sequence; only the log rows themselves follow it
+        assert 'change_log' in writes[seq][1]
+        assert all(sql.startswith('INSERT INTO change_log') for sql, params in writes[seq + 1:])
+
+        after = current_versions(['farmers', 'farmer_children', 'change_log'])
+        assert after['farmers'] == before['farmers'] + 1
+        assert after['farmer_children'] == before['farmer_children'] + 1
+        assert after['change_log'] == before['change_log'] + 2  # one seq per logged row
+
+        db.session.delete(farmer)
+        db.session.commit()
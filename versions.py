@@ -0,0 +1,230 @@
+import hashlib
+from functools import wraps
+from itertools import chain
+
+from flask import request, current_app
+from sqlalchemy import select, update, insert, event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from cache import ResponseCache
+from models import db, DataVersion
+
+# ============ Data Versions & Conditional GET ============
+# data_versions holds one counter per table. Every ORM flush and every bulk
+# Query.update()/delete() queues the tables it touched; the counters are
+# bumped inside the same transaction, so a rollback leaves them untouched.
+#
+# Concurrency: the bump row-locks the counters until COMMIT, and every
+# writer of a table needs its counter. So the bumps are not made as each
+# flush happens (which would hold the locks for the rest of the transaction
+# and take them in whatever order the flushes touched the tables, letting
+# two multi-flush transactions deadlock). They are made once, just before
+# COMMIT, by a single UPDATE over the counters in table-name order. The
+# change_log sequence (sync.py) is allocated after it, as the very last
+# statement.
+#
+# conditional_get(*tables) turns those counters into a strong ETag for a read
+# endpoint (versions + endpoint + normalized query args). A client sending the
+# same ETag back in If-None-Match gets a 304 after a single primary-key
+# lookup, before the endpoint's own queries or serialization run.
+
+# Derived tables maintained by listeners, and job/request bookkeeping; never read through an ETag
+UNVERSIONED_TABLES = {
+    'data_versions', 'dashboard_summary', 'daily_rollups', 'farmer_metric_sketches', 'background_jobs',
+    'idempotency_records',
+}
+
+
+# Response-cache tag versions (cache.py) live here too, as rows named
+# 'tag:<tag>', so an invalidation by one worker or instance reaches all of them.
+TAG_PREFIX = 'tag:'
+
+
+def bump_versions(connection, tables):
+    tables = sorted(set(tables) - UNVERSIONED_TABLES)
+    if not tables:
+        return
+    T = DataVersion.__table__
+    bumped = connection.execute(
+        update(T).where(T.c.table_name.in_(tables)).values(version=T.c.version + 1)
+    ).rowcount
+    if bumped < len(tables):
+        existing = set(connection.execute(select(T.c.table_name).where(T.c.table_name.in_(tables))).scalars())
+        for name in tables:
+            if name not in existing:
+                connection.execute(insert(T).values(table_name=name, version=1))
+
+
+PENDING_KEY = 'version_bumps'
+
+
+def queue_version_bumps(session, tables):
+    """Bump the counters of these tables when the session's transaction commits."""
+    session.info.setdefault(PENDING_KEY, set()).update(tables)
+
+
+def bump_pending_versions(session):
+    """Apply the queued bumps now (right before COMMIT); later calls find nothing to do."""
+    tables = session.info.pop(PENDING_KEY, None)
+    if tables:
+        bump_versions(session.connection(), tables)
+
+
+def ensure_version_rows():
+    """Create a counter for every table up front so bumps never race on the INSERT."""
+    T = DataVersion.__table__
+    existing = set(db.session.execute(select(T.c.table_name)).scalars())
+    missing = [name for name in db.metadata.tables if name not in existing and name not in UNVERSIONED_TABLES]
+    for name in missing:
+        # Workers boot together: another one may insert the same row first
+        try:
+            db.session.execute(insert(T).values(table_name=name, version=0))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+    db.session.commit()
+
+
+def current_versions(tables):
+    T = DataVersion.__table__
+    rows = db.session.execute(select(T.c.table_name, T.c.version).where(T.c.table_name.in_(tables)))
+    versions = dict.fromkeys(tables, 0)
+    versions.update({name: version for name, version in rows})
+    return versions
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_flushed_tables(session, flush_context):
+    tables = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        tables.update(t.name for t in inspect(obj).mapper.tables)
+    if tables:
+        queue_version_bumps(session, tables)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bump_bulk_tables(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = orm_execute_state.statement.table
+        queue_version_bumps(orm_execute_state.session, {getattr(table, 'name', None)} - {None})
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_committed_tables(session):
+    if session.in_nested_transaction():
+        return  # savepoint release: the outer commit bumps
+    # commit() would flush after this hook; flush now so its tables are bumped too
+    session.flush()
+    bump_pending_versions(session)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_version_bumps(session, previous_transaction):
+    # A savepoint (or failed flush) rollback keeps the outer transaction's
+    # changes; its tables stay queued (an extra bump only costs a cache miss)
+    if previous_transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+
+class SharedTagVersions:
+    """Tag store for ResponseCache: one read per lookup, one small transaction per invalidation."""
+
+    def versions(self, tags):
+        T = DataVersion.__table__
+        names = {TAG_PREFIX + tag: tag for tag in tags}
+        rows = dict(db.session.execute(
+            select(T.c.table_name, T.c.version).where(T.c.table_name.in_(names))
+        ).all())
+        return {tag: str(rows.get(name, 0)) for name, tag in names.items()}
+
+    def bump(self, tags):
+        # Its own connection: invalidations run after the writer's commit (even from after_commit hooks)
+        names = sorted({TAG_PREFIX + tag for tag in tags})
+        for attempt in range(2):
+            try:
+                with db.engine.begin() as connection:
+                    bump_versions(connection, names)
+                return
+            except IntegrityError:
+                if attempt:
+                    raise  # a first bump of a new tag raced with another; the row exists now
+
+
+def make_etag(tables):
+    versions = current_versions(tables)
+    key = ResponseCache.make_key(request.endpoint, request.args)
+    view_args = sorted((request.view_args or {}).items())
+    raw = f"{key}|{view_args}|" + ','.join(f"{t}:{versions[t]}" for t in sorted(versions))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def conditional_get(*tables):
+    """
+    ETag/304 support for a GET view whose body depends only on the given
+    tables and the request args. Place it below @jwt_required(); it may sit
+    above @response_cache.cached, whose entries are then keyed by the ETag.
+    """
+    def decorator(fn):
+        def prepare():
+            etag = make_etag(tables)
+            # A cached body is only reused under the ETag it was built at (cache.py)
+            request.environ[ResponseCache.ETAG_ENVIRON_KEY] = etag
+            return etag
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return fn(*args, **kwargs)
+
+            # Versions are read before the view runs, so the tag can only be older than the body
+            etag = prepare()
+            if request.if_none_match.contains_weak(etag):
+                res = current_app.response_class(status=304)
+            else:
+                res = current_app.make_response(fn(*args, **kwargs))
+                if res.status_code != 200:
+                    return res
+            res.set_etag(etag)
+            res.headers['Cache-Control'] = 'private, no-cache'
+            return res
+        wrapper.prepare_refresh = prepare
+        return wrapper
+    return decorator
+
+
+# ============ Row Versions & Conditional Writes ============
+# Farmer rows carry a row_version that SQLAlchemy checks and increments on
+# every UPDATE (version_id_col); bulk updates increment it themselves. GET of
+# a single farmer sends it as the ETag, and a client that sends it back in
+# If-Match on its PUT gets 412 Precondition Failed instead of silently
+# overwriting a save somebody else made in between.
+
+def row_etag(version):
+    return f"v{version}"
+
+
+def if_match_fails(version):
+    """True when the request has an If-Match that does not name this row version."""
+    if not request.if_match:
+        return False
+    return not request.if_match.contains(row_etag(version))
+
+
+def row_version_etag(fn):
+    """
+    Send the row_version in a GET view's JSON body as its ETag. Taken from the
+    body itself, so a cached (possibly older) body never carries a newer tag:
+    an If-Match built from it fails instead of overwriting the newer row.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        res = current_app.make_response(fn(*args, **kwargs))
+        if res.status_code == 200:
+            version = (res.get_json(silent=True) or {}).get('row_version')
+            if version is not None:
+                res.set_etag(row_etag(version))
+        return res
+    return wrapper